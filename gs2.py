@@ -3,10 +3,11 @@ gs2 interpreter (version 0.2)
 (c) nooodl 2014
 """
 
-import copy
+import bisect
+import cStringIO
 import doctest
-import inspect
 import itertools as it
+import json
 import math
 import operator
 import os
@@ -15,20 +16,46 @@ import re
 import string
 import struct
 import sys
+import time
 import traceback
+import weakref
 
-from collections import namedtuple
+from collections import deque, namedtuple, OrderedDict
 from fractions import gcd
 
-Block = namedtuple('Block', 'code')
+import gs2ops
+
+# the kinds of value analyze tells apart: numbers, lists, lazy sequences
+# and blocks
+KINDS = 'nlzb'
+
+class Block(namedtuple('Block', 'code')):
+    """
+    A block of code. What it does to the stack is worked out by analyze the
+    first time it's asked for, and kept with the block.
+
+    code is the block's tokens as written, which is what it shows, compares
+    and concatenates as. What the evaluators run is folded: the same, but
+    with any runs fold_constants worked out ahead of time replaced by
+    Constants.
+    """
+    @property
+    def folded(self):
+        return self.__dict__.get('folded', self.code)
+
+    def effect(self, top=KINDS):
+        effects = self.__dict__.setdefault('effects', {})
+        if top not in effects:
+            effects[top] = analyze(self, top)
+        return effects[top]
+
 STRING_ENDS = '\x05\x06' + ''.join(map(chr, range(0x9b, 0xa0)))
+PRINTABLE = ''.join(map(chr, range(32, 127)))
 
 DEBUG = False
 
-def log(x):
-    if not DEBUG: return
-    line, name = inspect.stack()[1][2:4]
-    sys.stderr.write('\x1b[36m%s:%d\x1b[34m: %r\x1b[0m\n' % (name, line, x))
+# line-mode programs with more input than this are run a line at a time
+STREAM_THRESHOLD = 1 << 20
 
 def lcm(a, b):
     """
@@ -52,26 +79,72 @@ def split(a, b, clean=False):
     """
     >>> [''.join(i) for i in split("this is an example", " ",)]
     ['this', 'is', 'an', 'example']
+    >>> split([1, 2, 1, 1, 2, 3, 1, 2], [1, 2])
+    [[], [1], [3], []]
+    >>> split([0, 0, 0, 1], [0, 0], clean=True)
+    [[0, 1]]
     """
-    res = [[]]
     lb = len(b)
+    if lb == 0:
+        raise ValueError('empty separator')
 
-    i = 0
-    while i < len(a):
-        if a[i:i + lb] == b:
-            res.append([])
-            i += lb
+    if isinstance(a, ByteString):
+        try:
+            sep = bytearray(b)
+        except (TypeError, ValueError):
+            pass
         else:
-            res[-1].append(a[i])
-            i += 1
+            res = map(ByteString, a.split(sep))
+            return filter(None, res) if clean else res
+
+    # find where the separators start, left to right and without overlap:
+    # by index() for single items, else by Knuth-Morris-Pratt.
+    starts = []
+    if lb == 1:
+        i = -1
+        try:
+            while True:
+                i = a.index(b[0], i + 1)
+                starts.append(i)
+        except ValueError:
+            pass
+    else:
+        fail = [0] * lb
+        k = 0
+        for i in xrange(1, lb):
+            while k and b[i] != b[k]:
+                k = fail[k - 1]
+            if b[i] == b[k]:
+                k += 1
+            fail[i] = k
+        k = 0
+        for i, x in enumerate(a):
+            while k and x != b[k]:
+                k = fail[k - 1]
+            if x == b[k]:
+                k += 1
+            if k == lb:
+                starts.append(i - lb + 1)
+                k = 0
 
+    res = []
+    i = 0
+    for j in starts:
+        res.append(a[i:j])
+        i = j + lb
+    res.append(a[i:])
     return filter(None, res) if clean else res
 
 def join(a, b):
     """
     >>> join(['this', 'is', 'an', 'example'], ' ')
     ['this', ' ', 'is', ' ', 'an', ' ', 'example']
+    >>> join([to_gs('ab'), to_gs('c')], to_gs(', '))
+    [97, 98, 44, 32, 99]
     """
+    if isinstance(b, ByteString) and all(isinstance(x, ByteString) for x in a):
+        return ByteString(b.join(a))
+
     res = []
     for i, x in enumerate(a):
         if i > 0:
@@ -79,27 +152,46 @@ def join(a, b):
         res.extend(x if is_list(x) else [x])
     return res
 
+def freeze(x):
+    """
+    Return a hashable key that's equal for equal values, or raise TypeError
+    if there isn't one (for blocks.)
+
+    >>> freeze([1, [2, to_gs('ab')]])
+    (1, (2, (97, 98)))
+    """
+    if is_num(x):
+        return x
+    elif isinstance(x, ByteString):
+        return tuple(x)
+    elif is_list(x):
+        return tuple(map(freeze, x))
+    else:
+        raise TypeError('unhashable value')
+
 def set_diff(a, b):
     """
     >>> set_diff([1, 3, 5, 6], [3, 5, 7])
     [1, 6]
+    >>> set_diff([[1], [2], [1]], [[2]])
+    [[1], [1]]
     """
-    res = []
-    for i in a:
-        if i not in b:
-            res.append(i)
-    return res
+    try:
+        keys = set(map(freeze, b))
+        return [i for i in a if freeze(i) not in keys]
+    except TypeError:
+        return [i for i in a if i not in b]
 
 def set_and(a, b):
     """
     >>> set_and([1, 3, 5, 6], [3, 5, 7])
     [3, 5]
     """
-    res = []
-    for i in a:
-        if i in b:
-            res.append(i)
-    return res
+    try:
+        keys = set(map(freeze, b))
+        return [i for i in a if freeze(i) in keys]
+    except TypeError:
+        return [i for i in a if i in b]
 
 def set_or(a, b):
     """
@@ -115,62 +207,201 @@ def set_xor(a, b):
     """
     return set_diff(a, b) + set_diff(b, a)
 
+def uniq(xs):
+    """
+    >>> uniq([3, 1, 3, [2], 1, [2]])
+    [3, 1, [2]]
+    """
+    res = []
+    try:
+        seen = set()
+        for x in xs:
+            k = freeze(x)
+            if k not in seen:
+                seen.add(k)
+                res.append(x)
+    except TypeError:
+        res = []
+        for x in xs:
+            if x not in res:
+                res.append(x)
+    return res
+
 # prime number functions
-prime_list = []
-sieved = 2
-composite = set([1])
+prime_list = [2, 3]
+sieved = 4
+sieve_bits = bytearray([0, 0, 1, 1])   # 1 iff the index is prime
+
+# is_prime sieves up to this bound, and uses Miller-Rabin past it
+SIEVE_LIMIT = 1 << 22
 
 def sieve(limit):
-    global prime_list
+    """
+    Extend the sieve so it covers every number below limit. Only the new
+    segment is sieved; the old one and prime_list are kept.
+
+    >>> sieve(50); prime_list[:10]
+    [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    """
     global sieved
-    global composite
     if limit <= sieved: return
-
-    prime_list = []
-    for i in range(2, limit):
-        if i in composite: continue
-        for j in range(i*i, limit, i):
-            composite.add(j)
-        prime_list.append(i)
+    # grow geometrically, so repeated small extensions stay cheap, and so
+    # the primes we need to sieve the new segment are already known
+    limit = max(limit, 2 * sieved)
+    root = int(math.sqrt(limit)) + 1
+    if root > sieved:
+        sieve(root)
+        if limit <= sieved: return
+
+    lo = sieved
+    seg = bytearray('\x01') * (limit - lo)
+    for p in prime_list:
+        if p * p >= limit: break
+        start = max(p * p, (lo + p - 1) // p * p) - lo
+        seg[start::p] = bytearray(len(xrange(start, len(seg), p)))
+    sieve_bits.extend(seg)
+    prime_list.extend(it.compress(xrange(lo, limit), seg))
     sieved = limit
 
 sieve(1000)
 
+MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+def miller_rabin(n):
+    """
+    Deterministic for every n below 3.3 * 10**24; beyond that it's a strong
+    probable prime test to thirteen bases.
+
+    >>> miller_rabin(2**61 - 1), miller_rabin(3215031751)
+    (True, False)
+    """
+    for p in MR_BASES:
+        if n % p == 0: return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MR_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1: continue
+        for _ in xrange(s - 1):
+            x = x * x % n
+            if x == n - 1: break
+        else:
+            return False
+    return True
+
 def is_prime(n):
-    global prime_list
-    sieve(n+1)
-    return n not in composite
+    """
+    (Zero and negative numbers count as prime, as they always have.)
+
+    >>> [n for n in range(-1, 12) if is_prime(n)]
+    [-1, 0, 2, 3, 5, 7, 11]
+    """
+    if n < sieved:
+        return n < 0 or sieve_bits[n] or n == 0
+    if n < SIEVE_LIMIT:
+        sieve(n+1)
+        return sieve_bits[n] == 1
+    return miller_rabin(n)
 
 def nth_prime(n):
-    global prime_list
     sieve(int(math.log(n) * n) + 100)
     return prime_list[n-1]
 
 def n_primes(n):
-    global prime_list
     sieve(int(math.log(n) * n) + 100)
     return prime_list[:n]
 
 def primes_below(n):
-    global prime_list
     sieve(n+1)
-    return list(it.takewhile(lambda x: x < n, prime_list))
+    return prime_list[:bisect.bisect_left(prime_list, n)]
 
 def next_prime(n):
     n += 1
     while not is_prime(n): n += 1
     return n
 
+def rho(n):
+    """
+    Find a nontrivial factor of the odd composite n, using Brent's variant of
+    Pollard's rho.
+
+    >>> rho(10403) in (101, 103)
+    True
+    """
+    for c in it.count(1):
+        y, m, g, r, q = 2, 128, 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in xrange(r): y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in xrange(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            # the batched product overshot; retrace one step at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+TRIAL_PRIMES = primes_below(1000)
+FACTOR_CACHE_SIZE = 1024
+factor_cache = OrderedDict()
+
+def prime_factors(n):
+    """
+    The prime factors of n in order, as a tuple. Recently used results
+    are kept in a small LRU cache.
+
+    >>> prime_factors(600851475143)
+    (71, 839, 1471, 6857)
+    """
+    if n in factor_cache:
+        res = factor_cache[n] = factor_cache.pop(n)
+        return res
+
+    res = []
+    m = n
+    for p in TRIAL_PRIMES:
+        if p * p > m: break
+        while m % p == 0:
+            res.append(p)
+            m //= p
+    todo = [m] if m > 1 else []
+    while todo:
+        m = todo.pop()
+        if m < TRIAL_PRIMES[-1] ** 2 or miller_rabin(m):
+            res.append(m)
+        else:
+            d = rho(m)
+            todo += [d, m // d]
+    res = tuple(sorted(map(int, res)))   # rho's arithmetic may leave longs
+
+    factor_cache[n] = res
+    if len(factor_cache) > FACTOR_CACHE_SIZE:
+        factor_cache.popitem(last=False)
+    return res
+
 def totient(n):
     """
     >>> totient(1000)
     400
     """
-    count = 0
-    for i in xrange(1, n+1):
-        if gcd(n, i) == 1: count += 1
-    return count
-    
+    if n < 1: return 0
+    res = 1
+    for p, g in it.groupby(prime_factors(n)):
+        res *= (p - 1) * p ** (len(list(g)) - 1)
+    return res
+
 def factor(n, exps=False):
     """
     >>> factor(120)
@@ -179,13 +410,7 @@ def factor(n, exps=False):
     [[2, 3], [3, 1], [5, 1]]
     """
     if is_num(n):
-        p = 2
-        res = []
-        while n > 1:
-            while n % p == 0:
-                res.append(p)
-                n //= p
-            p = next_prime(p)
+        res = list(prime_factors(n))
         if exps:
             res = [[k, len(list(g))] for k, g in it.groupby(res)]
         return res
@@ -202,78 +427,212 @@ def chunks(x, y):
     """
     >>> list(chunks(range(12), 3))
     [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
+    >>> list(chunks([], 0))
+    []
+    """
+    if not x:
+        return
+    if y <= 0:
+        raise ValueError('chunk size must be positive')
+    for i in xrange(0, len(x), y):
+        yield x[i:i+y]
+
+def copy_value(x, memo):
+    """
+    Copy a value like copy.deepcopy would: lists are copied all the way
+    down, and a list that's referred to twice is copied once. It's a lot
+    quicker, since numbers and blocks are never changed and can be shared.
+
+    >>> a = [1, to_gs('b')]
+    >>> b = copy_value([a, a], {})
+    >>> b == [a, a], b[0] is b[1], b[0] is a
+    (True, True, False)
+    """
+    if is_num(x) or is_block(x):
+        return x
+    i = id(x)
+    if i in memo:
+        return memo[i]
+    if isinstance(x, ByteString):
+        y = memo[i] = ByteString(x)
+    else:
+        y = memo[i] = []
+        y.extend(v if type(v) is int else copy_value(v, memo) for v in x)
+    return y
+
+NUMBERS = dict((chr(0x10 + i), i) for i in xrange(11))
+NUMBERS.update({'\x1b': 100, '\x1c': 1000, '\x1d': 16, '\x1e': 64, '\x1f': 256})
+
+class Literal(str):
+    """
+    A token that pushes a constant. It compares (and prints) like the raw
+    token it was read from, but carries its value decoded in advance, so
+    evaluate doesn't re-parse it every time it's visited. Regex literals also
+    carry their count and compiled pattern.
+    """
+    regex = None
+
+    def __new__(cls, token, value):
+        t = str.__new__(cls, token)
+        t.value = value
+        return t
+    def __getnewargs__(self):
+        return (str(self), self.value)
+
+class Constant(Literal):
     """
-    while x:
-        yield x[:y]
-        x = x[y:]
+    A run of tokens that tokenize evaluated ahead of time (see
+    fold_constants), pushing a copy of what they left behind. It's the
+    tokens with a \x08 in front, which no other token starts with, and
+    prints as the tokens it stands for. It's only ever found in a Block's
+    folded code, and isn't an op: the evaluators push it themselves.
+    """
+    def __new__(cls, tokens, value):
+        t = Literal.__new__(cls, '\x08' + ''.join(tokens), value)
+        t.tokens = tokens
+        return t
+    def __getnewargs__(self):
+        return (self.tokens, self.value)
+    def __str__(self):
+        return ''.join(self.tokens)
+    def __repr__(self):
+        return ', '.join(map(repr, self.tokens))
+
+def decode(t):
+    r"""
+    >>> decode('\x02\x00\x01').value
+    256
+    >>> decode('\x04ab\x07c\x05').value
+    [[97, 98], [99]]
+    >>> type(decode('\x30'))
+    <type 'str'>
+    """
+    if t in NUMBERS:
+        return Literal(t, NUMBERS[t])
+    elif t[0] == '\x01' and len(t) == 2:
+        return Literal(t, struct.unpack('<B', t[1:])[0])
+    elif t[0] == '\x02' and len(t) == 3:
+        return Literal(t, struct.unpack('<h', t[1:])[0])
+    elif t[0] == '\x03' and len(t) == 5:
+        return Literal(t, struct.unpack('<l', t[1:])[0])
+    elif t[0] == '\x04' and len(t) >= 2 and t[-1] in STRING_ENDS:
+        strings = t[1:-1].split('\x07')
+        lit = Literal(t, map(to_gs, strings))
+        if t[-1] in '\x9c\x9d\x9e\x9f':
+            try:
+                lit.regex = parse_regex(strings[-2 if t[-1] == '\x9d' else -1])
+            except Exception:
+                pass # leave the error for when it runs
+        return lit
+    elif t[0] == '\x07' and len(t) == 2:
+        return Literal(t, to_gs(t[1]))
+    else:
+        return t
+
+# folding constants changes what ends up in the junk; it's only done for
+# programs that can't look
+JUNK_REFS = re.compile('[\xa0-\xaf]')
+
+# tokens that take a fixed number of bytes (including the first)
+TOKEN_WIDTHS = {'\x01': 2, '\x02': 3, '\x03': 5, '\x07': 2}
+STRING_END = re.compile('[%s]' % STRING_ENDS)
+# every one-byte token, decoded once
+BYTE_TOKENS = dict((chr(i), decode(chr(i))) for i in xrange(256))
 
 def tokenize(prog):
-    # string hack
-    cs = STRING_ENDS
-    if re.match('^[^\x04]*[%s]' % cs, prog):
+    r"""
+    Scan the program into a tree of blocks in one pass.
+
+    >>> tokenize('\x01\x2a\x08\x04ab\x07c\x05\x09\x40\xe8')
+    Block(code=['\x01*', Block(code=['\x04ab\x07c\x05']), '\x00', Block(code=['@']), '4'])
+    """
+    # string hack: a string end with no string start before it
+    end = STRING_END.search(prog)
+    if end and prog.find('\x04', 0, end.start()) < 0:
         prog = '\x04' + prog
     
     mode = None
     if prog[0] in '\x30\x31\x32': # set mode
         mode = prog[0]
         prog = prog[1:]
-    
-    token_re = [
-        '\x04[^%s]*[%s]' % (cs, cs), # string (array)
-        '\x01.',                     # unsigned byte
-        '\x02..',                    # signed short
-        '\x03....',                  # signed long
-        '\x07.',                     # 1 char string
-        '.',                         # regular token
-    ]
-
-    tokens = re.findall('|'.join(token_re), prog, re.DOTALL)
 
+    widths = TOKEN_WIDTHS
+    literals = {} # repeated literals share one decoded token
+    byte_tokens = BYTE_TOKENS
     final = []
     blocks = [Block([])]
-    i = 0 
-    while i < len(tokens):
-        t = tokens[i]
-        log(tokens[i:])
-        if t == '\x08': #= {
+    nested = [] # every block but main, for fold_constants
+    code = blocks[-1].code
+    strings = True # False once there are no string ends left
+    n = len(prog)
+    i = 0
+    while i < n:
+        t = prog[i]
+        if t == '\x04' and strings:
+            end = STRING_END.search(prog, i + 1)
+            if end:
+                t = prog[i:end.end()]
+                code.append(literals.get(t) or literals.setdefault(t, decode(t)))
+                i = end.end()
+                continue
+            strings = False
+        elif t in widths and i + widths[t] <= n:
+            t = prog[i:i + widths[t]]
+            code.append(literals.get(t) or literals.setdefault(t, decode(t)))
+            i += len(t)
+            continue
+        i += 1
+
+        if '\x09' < t < '\xe0' or t < '\x08':
+            code.append(byte_tokens[t])
+        elif t == '\x08': #= {
             blocks.append(Block([]))
+            nested.append(blocks[-1])
+            code = blocks[-1].code
             final.append('\x00')
         elif t == '\x09': #= }
             blocks[-2].code.append(blocks.pop())
-            blocks[-1].code.append(final.pop())
-        elif '\xe0' <= t <= '\xff' and ord(t) & 7 < 6:
+            code = blocks[-1].code
+            code.append(final.pop())
+        elif ord(t) & 7 < 6:
             # quick block
             # 0b111XXYYY -- Y+1 is number of tokens, X is end token:
             #   0 = nop (0x00)  2 = filter (0x35)
             #   1 = map (0x34)  3 = both (0x38)
             # but 0xfe and 0xff are special (see below.)
             num = (ord(t) & 7) + 1
-            ts = blocks[-1].code[-num:]
-            del blocks[-1].code[-num:]
-            blocks[-1].code.append(Block(ts))
-            blocks[-1].code.append('\x00\x34\x35\x38'[(ord(t) >> 3) & 3])
+            ts = code[-num:]
+            del code[-num:]
+            nested.append(Block(ts))
+            code.append(nested[-1])
+            code.append('\x00\x34\x35\x38'[(ord(t) >> 3) & 3])
         elif t in '\xee\xef': #= z1 zipwith1, z2 zipwith2
             # zipwith (1/2 tokens)
             num = (ord(t) & 1) + 1
-            ts = blocks[-1].code[-num:]
-            del blocks[-1].code[-num:]
-            blocks[-1].code.append(Block(ts))
-            blocks[-1].code.append('\xb1')
+            ts = code[-num:]
+            del code[-num:]
+            nested.append(Block(ts))
+            code.append(nested[-1])
+            code.append('\xb1')
         elif t in '\xf6\xf7': #= dm1 dump-map1, df1 dump-filter1
             # like m1/f1 with dump prepended to block
             # useful with transpose, pairwise, cartesian-product, etc.
             f = {'\xf6': '\x34', '\xf7': '\x35'}[t]
-            x = blocks[-1].code.pop()
-            blocks[-1].code.extend([Block(['\x0e', x]), f])
+            x = code.pop()
+            nested.append(Block(['\x0e', x]))
+            code.extend([nested[-1], f])
         elif t == '\xfe': #= m:
             blocks.append(Block([]))
+            nested.append(blocks[-1])
+            code = blocks[-1].code
             final.append('\x34')
         elif t == '\xff': #= f:
             blocks.append(Block([]))
+            nested.append(blocks[-1])
+            code = blocks[-1].code
             final.append('\x35')
         else:
-            blocks[-1].code.append(t)
-        i += 1
+            code.append(byte_tokens[t])
 
     while final:
         blocks[-2].code.append(blocks.pop())
@@ -281,6 +640,8 @@ def tokenize(prog):
     
     assert len(blocks) == 1
     main = blocks[0]
+    if mode:
+        nested.append(main)
     
     if mode == '\x30': #= line-mode
         main = Block(['\x2a', main, '\x34', '\x54'])
@@ -290,16 +651,237 @@ def tokenize(prog):
         main = Block(['\x2a', '\x22', main, '\x34', '\x54'])
     
     main.code.extend(final)
+    if nested and not JUNK_REFS.search(prog):
+        fold_constants(nested)
     return main
 
+class ByteString(bytearray):
+    """
+    A string whose characters all fit in a byte. It's stored compactly, but
+    behaves like the equivalent list of ints wherever a list is expected;
+    operations that would put anything else into it return a plain list.
+
+    >>> s = to_gs('abc')
+    >>> s == [97, 98, 99], s[1:], s[0], 98 in s, [98] in s
+    (True, [98, 99], 97, True, False)
+    >>> s + [100], [1000] + s, s < [97, 99], s < 5
+    ([97, 98, 99, 100], [1000, 97, 98, 99], True, False)
+    >>> type(s + [100]).__name__, type([1000] + s).__name__
+    ('ByteString', 'list')
+    """
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getitem__(self, i):
+        x = bytearray.__getitem__(self, i)
+        return ByteString(x) if isinstance(x, bytearray) else x
+
+    def __add__(self, other):
+        if not is_list(other):
+            return NotImplemented
+        res = ByteString(self)
+        try:
+            res.extend(other)
+        except (TypeError, ValueError):
+            return list(self) + list(other)
+        return res
+
+    def __radd__(self, other):
+        if not is_list(other):
+            return NotImplemented
+        try:
+            res = ByteString(other)
+        except (TypeError, ValueError):
+            return list(other) + list(self)
+        res.extend(self)
+        return res
+
+    def __mul__(self, n):
+        return ByteString(bytearray.__mul__(self, n))
+
+    def __contains__(self, x):
+        return is_num(x) and 0 <= x < 256 and bytearray.__contains__(self, x)
+
+    def index(self, x, start=0):
+        i = self.find(chr(x), start) if x in self else -1
+        if i < 0:
+            raise ValueError('%r is not in list' % x)
+        return i
+
+    # compare like lists: ints compare below any list, everything else
+    # element by element.
+    def __eq__(self, other):
+        if isinstance(other, bytearray):
+            return bytearray.__eq__(self, other)
+        return is_list(other) and list(self) == other
+    def __ne__(self, other):
+        return not self == other
+    def __lt__(self, other):
+        if isinstance(other, bytearray):
+            return bytearray.__lt__(self, other)
+        return list(self) < other
+    def __le__(self, other):
+        if isinstance(other, bytearray):
+            return bytearray.__le__(self, other)
+        return list(self) <= other
+    def __gt__(self, other):
+        if isinstance(other, bytearray):
+            return bytearray.__gt__(self, other)
+        return list(self) > other
+    def __ge__(self, other):
+        if isinstance(other, bytearray):
+            return bytearray.__ge__(self, other)
+        return list(self) >= other
+
+class LazySeq(object):
+    r"""
+    A list of lists that hasn't been built yet, because it's likely to be
+    huge: f(*args, **kwargs) iterates over its items as tuples. Only ops that
+    walk a list once pop these as they are; everywhere else Stack.pop turns
+    them into a plain list first. That list is made once and kept, so
+    that, as with any other list, every copy on the stack shares it.
+
+    >>> xs = LazySeq(it.permutations, range(3), 2)
+    >>> len(xs), [0, 2] in xs, force(xs)[:2]
+    (6, True, [[0, 1], [0, 2]])
+
+    The ops that build them copy the lists they're built from, which may
+    be changed in place later (here by scan):
+
+    >>> code = '\x13\x2e\x40\x12\x96\x42\x08\x30\x09\x6d\x50\x2e\x52'
+    >>> g = GS2(code)   # 3 range dup 2 combinations swap { + } scan pop length show
+    >>> g.evaluate(tokenize(code))
+    >>> show(g.stack[-1])
+    '3'
+    >>> code = '\x13\x2e\x12\x96\x40\x08\x30\x09\x6d\x50\x2e'
+    >>> g = GS2(code)   # 3 range 2 combinations dup { + } scan pop length
+    >>> g.evaluate(tokenize(code))
+    >>> g.stack         # scan emptied the list both copies share
+    [[], 0]
+    """
+    def __init__(self, f, *args, **kwargs):
+        f(*args, **kwargs) # complain about bad arguments right away
+        self.f, self.args, self.kwargs = f, args, kwargs
+        self.list = None
+
+    def __iter__(self):
+        if self.list is not None:
+            return iter(self.list)
+        return it.imap(list, self.f(*self.args, **self.kwargs))
+
+    def __len__(self):
+        if self.list is not None:
+            return len(self.list)
+        return sum(1 for _ in self.f(*self.args, **self.kwargs))
+
+    def force(self):
+        if self.list is None:
+            self.list = list(self)
+        return self.list
+
+# the Slices taken of each list, by id, so that the ops that change a list
+# in place can have them copy it first (see detach)
+slices = {}
+
+# cut copies anything shorter than this rather than making a Slice of it
+SLICE_MIN = 1024
+
+class Slice(LazySeq):
+    r"""
+    source[start:stop], for a long list source, without the copy. Ops that
+    only take part of a list or its length -- tail, init, the uncons ops,
+    take, drop, head, length -- work on it as it is; anything else gets
+    the list the slice would have been, made the first time it's needed
+    and kept, so that every copy of the Slice on the stack shares it.
+
+    >>> xs = range(5000)
+    >>> s = cut(cut(xs, 1), 2, -1)
+    >>> type(s).__name__, len(s), s[0], s.source is xs
+    ('Slice', 4996, 3, True)
+    >>> detach(xs)      # as lines or scan would, before changing xs
+    >>> del xs[:]
+    >>> len(s.force()), s.force()[-1]
+    (4996, 4998)
+    >>> type(cut(to_gs('abc') * 1000, 1, 5)).__name__
+    'ByteString'
+    """
+    def __init__(self, source, start, stop):
+        self.source, self.start, self.stop = source, start, stop
+        self.list = None
+        key = id(source)
+        refs = slices.setdefault(key, [])
+        def forget(ref):
+            refs.remove(ref)
+            if not refs and slices.get(key) is refs:
+                del slices[key]
+        refs.append(weakref.ref(self, forget))
+
+    def force(self):
+        if self.list is None:
+            self.list = self.source[self.start:self.stop]
+            self.source = None
+        return self.list
+
+    def __iter__(self):
+        return iter(self.force())
+
+    def __len__(self):
+        if self.list is None:
+            return self.stop - self.start
+        return len(self.list)
+
+    def __contains__(self, x):
+        return x in self.force()
+
+    def __getitem__(self, i):
+        if self.list is not None:
+            return self.list[i]
+        n = self.stop - self.start
+        if not -n <= i < n:
+            raise IndexError('list index out of range')
+        return self.source[self.start + i % n]
+
+LAZY_TYPES = frozenset([LazySeq, Slice])
+
 is_num   = lambda v: isinstance(v, (int, long))
-is_list  = lambda v: isinstance(v, list)
+is_list  = lambda v: isinstance(v, (list, ByteString))
 is_block = lambda v: isinstance(v, Block)
+is_lazy  = lambda v: isinstance(v, LazySeq)
+is_seq   = lambda v: is_list(v) or is_lazy(v)
+
+def force(x):
+    return x.force() if is_lazy(x) else x
+
+def cut(x, i=None, j=None):
+    """
+    x[i:j], for x a list or a Slice; a Slice itself if it'd be long.
+    """
+    if type(x) is Slice and x.list is None:
+        source, base, n = x.source, x.start, len(x)
+    else:
+        x = force(x)
+        source, base, n = x, 0, len(x)
+    i, j, _ = slice(i, j).indices(n)
+    if j - i < SLICE_MIN:
+        return source[base + i:base + max(i, j)]
+    return Slice(source, base + i, base + j)
+
+def detach(x):
+    """
+    Have every Slice of list x copy its part, before x is changed in place.
+    """
+    for ref in slices.pop(id(x), ()):
+        s = ref()
+        if s is not None:
+            s.force()
 
-def to_gs(ps): return map(ord, ps)
+def to_gs(ps):
+    if isinstance(ps, str): return ByteString(ps)
+    else: return map(ord, ps)
 
 def to_ps(gs):
-    if is_list(gs): return ''.join(map(chr, gs))
+    if isinstance(gs, ByteString): return str(gs)
+    elif is_list(gs): return ''.join(map(chr, gs))
     else: return chr(gs)
     
 def regex_count(pattern):
@@ -312,20 +894,128 @@ def regex_count(pattern):
         pattern = pattern[2:]
     return (c, pattern)
 
+def parse_regex(pattern):
+    """
+    >>> c, p = parse_regex('}\x03a+'); c, p.pattern
+    (3, 'a+')
+    """
+    c, pattern = regex_count(pattern)
+    return c, re.compile(pattern)
+
 def show(value, nest=False):
-    if is_list(value):
+    if isinstance(value, ByteString):
+        return str(value)
+    elif is_seq(value):
         return ''.join(show(x, nest=True) for x in value)
     elif nest and is_num(value):
         return chr(value)
     else:
         return str(value)
 
+# tokens that can look past the values pushed for the current line, or at
+# the input as a whole (registers A and B.) line-mode programs that use any
+# of these aren't streamed.
+UNSTREAMABLE = set('\x0e\x47\x49\x4a\x4b\x4c\x68\xd0\xd1\xd8\xd9\xdc\xdd' +
+                   ''.join(map(chr, range(0xa0, 0xb0))))
+
+def streamable(block):
+    for t in block.code:
+        if is_block(t):
+            if not streamable(t): return False
+        elif t in UNSTREAMABLE or (t[0] == '\x04' and t[-1] == '\x9b'):
+            return False
+    return True
+
+def stream_mode(code):
+    r"""
+    If `code` is a line-mode or word-mode program whose body can be run on
+    one line (or word) at a time, return (body, words, skip_first), else
+    None.
+
+    >>> stream_mode('\x30\x2e')
+    (Block(code=['.']), False, False)
+    >>> stream_mode('\x32\x08\x2e\x09')[1:]
+    (False, True)
+    >>> stream_mode('\x31\x20')[1:]
+    (True, False)
+    >>> stream_mode('\x30\xd0'), stream_mode('\x2e')
+    (None, None)
+    """
+    try:
+        main = tokenize(code)
+    except Exception:
+        return None
+    shape = [None if is_block(t) else t for t in main.code]
+    body = [t for t in main.code if is_block(t)]
+    if shape == ['\x2a', None, '\x34', '\x54']:
+        mode = (False, False)
+    elif shape == ['\x2a', '\x22', None, '\x34', '\x54']:
+        mode = (False, True)
+    elif shape == ['\x2c', None, '\x34', '\x55']:
+        mode = (True, False)
+    else:
+        return None
+    if not streamable(body[0]):
+        return None
+    return (body[0],) + mode
+
+def stream_input(lines, words, skip_first):
+    """
+    Given an iterable of input lines, yield the strings lines (or words)
+    would split the whole input into.
+    """
+    n = 0
+    for line in lines:
+        if words:
+            for w in line.split():
+                yield to_gs(w)
+            continue
+        if line.endswith('\n'):
+            line = line[:-1]
+        if n or not skip_first:
+            yield to_gs(line)
+        n += 1
+    if n == 0 and not words and not skip_first:
+        yield to_gs('')
+
+# opcode handlers, indexed by the first byte of a token and filled in by the
+# @op decorators on GS2 below. a handler returning True stops evaluation of
+# the current block (see exit.)
+#
+# each @op line lists its mnemonics in a #= comment, and the def line under
+# it the stack effect of each overload in a #: comment: 'ln>l' pops a list
+# and a number (on top) and pushes a list. n is a number, l a list, s a list
+# or lazy sequence, b a block and a anything; * means it depends, and at the
+# start of the popped side, that values further down are used too. handlers
+# shared by several tokens give one list per token, separated by commas.
+# gs2c.py reads both to generate gs2ops.py.
+OPS = {}
+
+def op(*tokens):
+    """
+    Register the decorated method as the handler for the given bytes.
+    Changes to the comments above must be carried over to gs2ops.py:
+
+    >>> import gs2c
+    >>> gs2c.generate_ops() == open(gs2c.OPS_FILE).read()
+    True
+    """
+    def register(f):
+        for t in tokens:
+            OPS[t] = f
+        return f
+    return register
+
 class Stack(list):
     def __init__(self, *args):
         list.__init__(self, *args)
-        self.junk = []
-    def pop(self, i=-1, junk=True):
+        # only the last 16 popped values can be reached by the junk ops
+        self.junk = deque(maxlen=16)
+    def pop(self, i=-1, junk=True, lazy=False, views=False):
+        # lazy leaves LazySeqs and Slices as they are, views just Slices
         x = list.pop(self, i)
+        if not lazy and type(x) in LAZY_TYPES:
+            if type(x) is LazySeq or not views: x = x.force()
         if junk: self.junk.append(x)
         return x
 
@@ -343,9 +1033,15 @@ class GS2(object):
         self.counter = 1
 
     def run(self):
+        """
+        Run the program and print the stack. Returns False if it failed.
+        """
         try:
             self.evaluate(tokenize(self.code))
             sys.stdout.write(''.join(map(show, self.stack)))
+            return True
+        except ResourceLimit:
+            raise
         except Exception:
             # If the code fails, print something meaningful to stderr,
             # but quine on stdout: this allows GS2 to good at simple
@@ -353,921 +1049,2008 @@ class GS2(object):
             # file, it's unlikely to be valid GS2 code.
             traceback.print_exc()
             if not DEBUG: sys.stdout.write(self.code)
+            return False
+
+    def stream(self, lines, mode):
+        """
+        Run a program accepted by stream_mode on an iterable of input lines,
+        writing output as it goes rather than holding all of the input or
+        output in memory. Each line is evaluated on an otherwise empty
+        stack, so programs that reach back to values left by earlier lines
+        fail here, and a failure comes after whatever was already printed.
+        """
+        body, words, skip_first = mode
+        sep = ' ' if words else '\n'
+        first = True
+        del self.stack[:]
+        try:
+            for x in stream_input(lines, words, skip_first):
+                self.stack.append(x)
+                self.evaluate(body)
+                for y in self.stack:
+                    if not first: sys.stdout.write(sep)
+                    sys.stdout.write(show(y))
+                    first = False
+                del self.stack[:]
+        except ResourceLimit:
+            raise
+        except Exception:
+            traceback.print_exc()
+            if not DEBUG: sys.stdout.write(self.code)
 
     def evaluate(self, block):
-        log(block)
-        for t in block.code:
-            if is_block(t):
+        ops = OPS
+        for t in block.folded:
+            if isinstance(t, Block):
                 self.stack.append(t)
-            elif t[0] == '\x00': #= nop
-                pass
-            elif t[0] == '\x01': # push unsigned byte
-                self.stack.append(struct.unpack('<B', t[1:])[0])
-            elif t[0] == '\x02': # push signed short
-                self.stack.append(struct.unpack('<h', t[1:])[0])
-            elif t[0] == '\x03': # push signed long
-                self.stack.append(struct.unpack('<l', t[1:])[0])
-
-            elif t[0] == '\x04': # string
-                assert len(t) >= 2
-                assert t[-1] in STRING_ENDS
-                strings = t[1:-1].split('\x07')
-                strings = map(to_gs, strings)
-                if t[-1] == '\x05': # regular
-                    self.stack += strings
-                elif t[-1] == '\x06': # array
-                    self.stack.append(strings)
-                elif t[-1] == '\x9b': # printf
-                    f = to_ps(strings.pop())
-                    n = f.count('%') - f.count('%%') * 2
-                    x = tuple(map(to_ps, self.stack[-n:]))
-                    del self.stack[-n:]
-                    self.stack.append(to_gs(f % x))
-                elif t[-1] == '\x9c': # regex match
-                    pattern = to_ps(strings.pop())
-                    c, pattern = regex_count(pattern)
-                    s = to_ps(self.stack.pop())
-                    f = re.match if c else re.search
-                    self.stack.append(1 if f(pattern, s) else 0)
-                elif t[-1] == '\x9d': # regex sub
-                    repl = to_ps(strings.pop())
-                    pattern = to_ps(strings.pop())
-                    c, pattern = regex_count(pattern)
-                    s = to_ps(self.stack.pop())
-                    m = re.sub(pattern, repl, s, count=c)
-                    self.stack.append(to_gs(m))
-                elif t[-1] == '\x9e': # regex find
-                    pattern = to_ps(strings.pop())
-                    c, pattern = regex_count(pattern)
-                    s = to_ps(self.stack.pop())
-                    ms = re.findall(pattern, s)
-                    if c > 0: ms = ms[0] if ms else []
-                    self.stack.append(map(to_gs, ms))
-                elif t[-1] == '\x9f': # regex split
-                    pattern = to_ps(strings.pop())
-                    c, pattern = regex_count(pattern)
-                    s = to_ps(self.stack.pop())
-                    m = re.split(pattern, s, maxsplit=c)
-                    self.stack.append(map(to_gs, m))
-                
-            elif t[0] == '\x07': # single char string
-                self.stack.append([ord(t[1])])
-
-            # \x08 and \x09 are block syntax
-            elif t == '\x0a': #= new-line
-                self.stack.append([ord('\n')])
-            elif t == '\x0b': #= empty-list
-                self.stack.append([])
-            elif t == '\x0c': #= empty-block
-                self.stack.append(Block([]))
-            elif t == '\x0d': #= space
-                self.stack.append([ord(' ')])
-            elif t == '\x0e': #= make-array extract-array dump
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack[-x:] = [self.stack[-x:]]
-                elif is_list(x):
-                    for i in x:
-                        self.stack.append(i)
-                else:
-                    raise TypeError('make-array / extract-array')
-
-            elif t == '\x0f': #= exit
+            elif t.__class__ is Constant: # cheaper than isinstance, per token
+                self.stack.append(copy_value(t.value, {}))
+            elif ops[t[0]](self, t):
                 break
 
-            elif 0x10 <= ord(t[0]) <= 0x1a: # push small number
-                self.stack.append(ord(t[0]) - 0x10)
-            elif t == '\x1b': self.stack.append(100)
-            elif t == '\x1c': self.stack.append(1000)
-            elif t == '\x1d': self.stack.append(16)
-            elif t == '\x1e': self.stack.append(64)
-            elif t == '\x1f': self.stack.append(256)
-
-            elif t == '\x20': #= negate reverse eval
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(-x)
-                elif is_list(x):
-                    self.stack.append(x[::-1])
-                elif is_block(x):
-                    self.evaluate(x)
-                else:
-                    raise TypeError('negate / reverse')
-
-            elif t == '\x21': #= bnot head
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(~x)
-                elif is_list(x):
-                    self.stack.append(x[0])
-                else:
-                    raise TypeError('bitwise not / head')
-
-            elif t == '\x22': #= not tail
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(0 if x else 1)
-                elif is_list(x):
-                    self.stack.append(x[1:])
-                else:
-                    raise TypeError('not / tail')
-
-            elif t == '\x23': #= abs init
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(abs(x))
-                elif is_list(x):
-                    self.stack.append(x[:-1])
-                else:
-                    raise TypeError('abs / init')
-
-            elif t == '\x24': #= digits last
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(map(int, str(abs(x))))
-                elif is_list(x):
-                    self.stack.append(x[-1])
-                else:
-                    raise ValueError('digits / last')
-
-            elif t == '\x25': #= random
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(random.randrange(x))
-                elif is_list(x):
-                    self.stack.append(random.choice(x))
-                else:
-                    raise TypeError('random')
-
-            elif t == '\x26': #= dec left-uncons
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x - 1)
-                elif is_list(x):
-                    self.stack.append(x[1:])
-                    self.stack.append(x[0])
-                else:
-                    raise TypeError('deincrement / left uncons')
-
-            elif t == '\x27': #= inc right-uncons
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x + 1)
-                elif is_list(x):
-                    self.stack.append(x[:-1])
-                    self.stack.append(x[-1])
-                else:
-                    raise TypeError('increment / right uncons')
-
-            elif t == '\x28': #= sign min
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(cmp(x, 0))
-                elif is_list(x):
-                    self.stack.append(min(x))
-                else:
-                    raise TypeError('sign / min')
-
-            elif t == '\x29': #= thousand max
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x * 1000)
-                elif is_list(x):
-                    self.stack.append(max(x))
-                else:
-                    raise TypeError('thousand / max')
-
-            elif t == '\x2a': #= double lines
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x * 2)
-                elif is_list(x):
-                    if x and x[-1] == ord('\n'):
-                        x.pop()
-                    self.stack.append(split(x, to_gs('\n')))
-                else:
-                    raise TypeError('double / line')
-
-            elif t == '\x2b': #= half unlines
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x // 2)
-                elif is_list(x):
-                    x = [to_gs(show(i)) for i in x]
-                    self.stack.append(join(x, to_gs('\n')))
-                else:
-                    raise TypeError('half / unlines')
-
-            elif t == '\x2c': #= square words
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(x * x)
-                elif is_list(x):
-                    self.stack.append(map(to_gs, to_ps(x).split()))
-                else:
-                    raise TypeError('square / words')
-
-            elif t == '\x2d': #= sqrt unwords
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(int(math.sqrt(x)))
-                elif is_list(x):
-                    x = [to_gs(show(i)) for i in x]
-                    self.stack.append(join(x, to_gs(' ')))
-                else:
-                    raise TypeError('sqrt / unwords')
-
-            elif t == '\x2e': #= range length
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(range(x))
-                elif is_list(x):
-                    self.stack.append(len(x))
-                else:
-                    raise TypeError('range / length')
-
-            elif t == '\x2f': #= range1 sort
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(range(1, x + 1))
-                elif is_list(x):
-                    self.stack.append(list(sorted(x)))
-                elif is_block(x):
-                    l = self.stack.pop()
-                    def f(z):
-                        self.stack.append(z)
-                        self.evaluate(x)
-                        return self.stack.pop(junk=False)
-                    self.stack.append(list(sorted(l, key=f)))
-                else:
-                    raise TypeError('range1 / sort')
-
-            elif t == '\x30': #= + add catenate
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x) and is_num(y):
-                    self.stack.append(x + y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(x + y)
-                elif is_block(x) and is_block(y):
-                    self.stack.append(Block(x.code + y.code))
-                elif is_list(x) and not is_list(y):
-                    self.stack.append(x + [y])
-                elif not is_list(x) and is_list(y):
-                    self.stack.append([x] + y)
-                else:
-                    raise TypeError('add / catenate')
-
-            elif t == '\x31': #= - sub diff
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x) and is_num(y):
-                    self.stack.append(x - y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(set_diff(x, y))
-                elif is_list(x) and not is_list(y):
-                    self.stack.append(set_diff(x, [y]))
-                elif not is_list(x) and is_list(y):
-                    self.stack.append(set_diff(y, [x]))
-                else:
-                    raise TypeError('subtract / set diff')
-
-            elif t == '\x32': #= * mul join times fold
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x) and (is_block(y) or is_list(y)):
-                    x, y = y, x
-                if is_block(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(x * y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(join(x, y))
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x * y)
-                elif is_block(x) and is_num(y):
-                    for i in xrange(y):
-                        self.evaluate(x)
-                elif is_list(x) and is_block(y):
-                    self.stack.append(x[0])
-                    for i in x[1:]:
-                        self.stack.append(i)
-                        self.evaluate(y)
-                else:
-                    raise TypeError('multiply / join / times / fold')
-
-            elif t == '\x33': #= / div chunks split each
-                y = self.stack.pop()
-                x = self.stack.pop()
-
-                if not is_list(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(x // y)
-                elif is_list(x) and is_num(y):
-                    self.stack.append(list(chunks(x, y)))
-                elif is_list(x) and is_list(y):
-                    self.stack.append(split(x, y))
-                elif is_list(x) and is_block(y):
-                    for i in x:
-                        self.stack.append(i)
-                        self.evaluate(y)
-                else:
-                    raise TypeError('divide / chunks / split / each')
-
-            elif t == '\x34': #= % mod step clean-split map
-                y = self.stack.pop()
-                x = self.stack.pop()
-
-                if not is_list(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(x % y)
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x[::y])
-                elif is_list(x) and is_list(y):
-                    self.stack.append(split(x, y, clean=True))
-                elif is_list(x) and is_block(y):
-                    self.eval_map(y, x)
-                else:
-                    raise TypeError('modulo / step / split\' / map')
-
-            elif t == '\x35': #= & and get when filter
-                y = self.stack.pop()
-                x = self.stack.pop()
-
-                if is_block(x) and is_num(y):
-                    x, y = y, x
-                if is_num(x) and is_list(y):
-                    x, y = y, x
-                if is_block(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(x & y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(set_and(x, y))
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x[y])
-                elif is_num(x) and is_block(y):
-                    if x: self.evaluate(y)
-                elif is_list(x) and is_block(y):
-                    self.eval_filter(y, x)
-                else:
-                    raise TypeError('and / get / when / filter')
+    def evaluator(self, block):
+        """
+        Return a pair (f, arg) such that f(arg) evaluates `block`. Loops that
+        run the same block many times fetch this once, so that backends can
+        substitute something faster than going through evaluate each time.
+        """
+        return self.evaluate, block
+
+    def pop_for_block(self):
+        """
+        Pop y, then x, like two plain pops would, except that a LazySeq
+        stays lazy if the other value is a block, so that it can be walked
+        once instead of built.
+        """
+        y = self.stack.pop(lazy=True)
+        x = self.stack.pop(lazy=True)
+        if not (is_block(x) or is_block(y)):
+            x, y = force(x), force(y)
+        return x, y
 
-            elif t == '\x36': #= | or unless
-                y = self.stack.pop()
-                x = self.stack.pop()
+    def eval_map(self, f, x):
+        e = f.effect('l' if type(x) is LazySeq else kinds(x))
+        f, arg = self.evaluator(f)
+        l0 = len(self.stack)
+        for i in x:
+            self.stack.append(i)
+            f(arg)
+        if e.needs == 1 and not any('z' in k for k in e.leaves):
+            # every item became values that can't be lazy
+            self.stack[l0:] = [self.stack[l0:]]
+        else:
+            self.stack[l0:] = [map(force, self.stack[l0:])]
+
+    def eval_filter(self, f, x):
+        r"""
+        Keep the items of x that f leaves something truthy for. The fast
+        path below trusts f's effect, so every op's #: comment has to hold
+        whatever it's given. primes pushes nothing for a selector it doesn't
+        know, so its effect is marked as depending (nn>*):
+
+        >>> code = '\x11\x12\x13\x14\x15\x2e\x08\x16\x6c\x09\x35'
+        >>> g = GS2(code)   # 1 2 3 4 5 range { 6 primes } filter
+        >>> g.evaluate(tokenize(code))
+        >>> g.stack
+        [[], 1, 2, 4, []]
+        """
+        e = f.effect('l' if type(x) is LazySeq else kinds(x))
+        f, arg = self.evaluator(f)
+        if e.needs == 1 and len(e.leaves) == 1:
+            # the body only turns each item into its verdict, so the items
+            # kept (never lazy) needn't wait on the stack
+            kept = []
+            for i in x:
+                self.stack.append(i)
+                f(arg)
+                if self.stack.pop():
+                    kept.append(i)
+            self.stack.append(kept)
+            return
+        l0 = len(self.stack)
+        for i in x:
+            self.stack.append(i)
+            f(arg)
+            if self.stack.pop():
+                self.stack.append(i)
+        self.stack[l0:] = [map(force, self.stack[l0:])]
+
+    @op('\x00') #= nop
+    def op_nop(self, t): #: >
+        pass
+
+    @op('\x01', '\x02', '\x03', *map(chr, range(0x10, 0x20))) # push number
+    def op_push_num(self, t): #: >n
+        self.stack.append(t.value)
+
+    @op('\x04') # string
+    def op_string(self, t): #: *>*
+        strings = t.value
+        end = t[-1]
+        if end == '\x05': # regular
+            self.stack += map(ByteString, strings)
+        elif end == '\x06': # array
+            self.stack.append(map(ByteString, strings))
+        elif end == '\x9b': # printf
+            f = to_ps(strings[-1])
+            n = f.count('%') - f.count('%%') * 2
+            x = tuple(to_ps(force(v)) for v in self.stack[-n:])
+            del self.stack[-n:]
+            self.stack.append(to_gs(f % x))
+        elif end == '\x9c': # regex match
+            c, p = t.regex or parse_regex(to_ps(strings[-1]))
+            s = to_ps(self.stack.pop())
+            f = p.match if c else p.search
+            self.stack.append(1 if f(s) else 0)
+        elif end == '\x9d': # regex sub
+            repl = to_ps(strings[-1])
+            c, p = t.regex or parse_regex(to_ps(strings[-2]))
+            s = to_ps(self.stack.pop())
+            m = p.sub(repl, s, count=c)
+            self.stack.append(to_gs(m))
+        elif end == '\x9e': # regex find
+            c, p = t.regex or parse_regex(to_ps(strings[-1]))
+            s = to_ps(self.stack.pop())
+            ms = p.findall(s)
+            if c > 0: ms = ms[0] if ms else []
+            self.stack.append(map(to_gs, ms))
+        elif end == '\x9f': # regex split
+            c, p = t.regex or parse_regex(to_ps(strings[-1]))
+            s = to_ps(self.stack.pop())
+            m = p.split(s, maxsplit=c)
+            self.stack.append(map(to_gs, m))
+
+    @op('\x07') # single char string
+    def op_push_char(self, t): #: >l
+        self.stack.append(ByteString(t.value))
+
+    # \x08 and \x09 are block syntax
+
+    @op('\x0a') #= new-line
+    def op_new_line(self, t): #: >l
+        self.stack.append(to_gs('\n'))
+
+    @op('\x0b') #= empty-list
+    def op_empty_list(self, t): #: >l
+        self.stack.append([])
+
+    @op('\x0c') #= empty-block
+    def op_empty_block(self, t): #: >b
+        self.stack.append(Block([]))
+
+    @op('\x0d') #= space
+    def op_space(self, t): #: >l
+        self.stack.append(to_gs(' '))
+
+    @op('\x0e') #= make-array extract-array dump
+    def op_make_array(self, t): #: *n>l l>*
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack[-x:] = [map(force, self.stack[-x:])]
+        elif is_list(x):
+            for i in x:
+                self.stack.append(i)
+        else:
+            raise TypeError('make-array / extract-array')
+
+    @op('\x0f') #= exit
+    def op_exit(self, t): #: >
+        return True
+
+    @op('\x20') #= negate reverse eval
+    def op_negate(self, t): #: n>n l>l b>*
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(-x)
+        elif is_list(x):
+            self.stack.append(x[::-1])
+        elif is_block(x):
+            self.evaluate(x)
+        else:
+            raise TypeError('negate / reverse')
+
+    @op('\x21') #= bnot head
+    def op_bnot(self, t): #: n>n s>a
+        x = self.stack.pop(lazy=True)
+        if is_num(x):
+            self.stack.append(~x)
+        elif is_list(x) or type(x) is Slice:
+            self.stack.append(x[0])
+        elif is_lazy(x):
+            for i in x: break
+            else: raise IndexError('head of empty list')
+            self.stack.append(i)
+        else:
+            raise TypeError('bitwise not / head')
+
+    @op('\x22') #= not tail
+    def op_not(self, t): #: n>n s>s
+        x = self.stack.pop(views=True)
+        if is_num(x):
+            self.stack.append(0 if x else 1)
+        elif is_seq(x):
+            self.stack.append(cut(x, 1))
+        else:
+            raise TypeError('not / tail')
+
+    @op('\x23') #= abs init
+    def op_abs(self, t): #: n>n s>s
+        x = self.stack.pop(views=True)
+        if is_num(x):
+            self.stack.append(abs(x))
+        elif is_seq(x):
+            self.stack.append(cut(x, None, -1))
+        else:
+            raise TypeError('abs / init')
+
+    @op('\x24') #= digits last
+    def op_digits(self, t): #: n>l l>a
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(map(int, str(abs(x))))
+        elif is_list(x):
+            self.stack.append(x[-1])
+        else:
+            raise ValueError('digits / last')
+
+    @op('\x25') #= random
+    def op_random(self, t): #: n>n l>a
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(random.randrange(x))
+        elif is_list(x):
+            self.stack.append(random.choice(x))
+        else:
+            raise TypeError('random')
+
+    @op('\x26') #= dec left-uncons
+    def op_dec(self, t): #: n>n s>sa
+        x = self.stack.pop(views=True)
+        if is_num(x):
+            self.stack.append(x - 1)
+        elif is_seq(x):
+            self.stack.append(cut(x, 1))
+            self.stack.append(x[0])
+        else:
+            raise TypeError('deincrement / left uncons')
+
+    @op('\x27') #= inc right-uncons
+    def op_inc(self, t): #: n>n s>sa
+        x = self.stack.pop(views=True)
+        if is_num(x):
+            self.stack.append(x + 1)
+        elif is_seq(x):
+            self.stack.append(cut(x, None, -1))
+            self.stack.append(x[-1])
+        else:
+            raise TypeError('increment / right uncons')
+
+    @op('\x28') #= sign min
+    def op_sign(self, t): #: n>n l>a
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(cmp(x, 0))
+        elif is_list(x):
+            self.stack.append(min(x))
+        else:
+            raise TypeError('sign / min')
+
+    @op('\x29') #= thousand max
+    def op_thousand(self, t): #: n>n l>a
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(x * 1000)
+        elif is_list(x):
+            self.stack.append(max(x))
+        else:
+            raise TypeError('thousand / max')
+
+    @op('\x2a') #= double lines
+    def op_double(self, t): #: n>n l>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(x * 2)
+        elif is_list(x):
+            if x and x[-1] == ord('\n'):
+                detach(x)
+                x.pop()
+            self.stack.append(split(x, to_gs('\n')))
+        else:
+            raise TypeError('double / line')
+
+    @op('\x2b') #= half unlines
+    def op_half(self, t): #: n>n l>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(x // 2)
+        elif is_list(x):
+            x = [to_gs(show(i)) for i in x]
+            self.stack.append(join(x, to_gs('\n')))
+        else:
+            raise TypeError('half / unlines')
+
+    @op('\x2c') #= square words
+    def op_square(self, t): #: n>n l>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(x * x)
+        elif is_list(x):
+            if isinstance(x, ByteString):
+                self.stack.append(map(ByteString, x.split()))
+            else:
+                self.stack.append(map(to_gs, to_ps(x).split()))
+        else:
+            raise TypeError('square / words')
+
+    @op('\x2d') #= sqrt unwords
+    def op_sqrt(self, t): #: n>n l>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(int(math.sqrt(x)))
+        elif is_list(x):
+            x = [to_gs(show(i)) for i in x]
+            self.stack.append(join(x, to_gs(' ')))
+        else:
+            raise TypeError('sqrt / unwords')
+
+    @op('\x2e') #= range length
+    def op_range(self, t): #: n>l s>n
+        x = self.stack.pop(lazy=True)
+        if is_num(x):
+            self.stack.append(range(x))
+        elif is_seq(x):
+            self.stack.append(len(x))
+        else:
+            raise TypeError('range / length')
+
+    @op('\x2f') #= range1 sort
+    def op_range1(self, t): #: n>l l>l lb>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(range(1, x + 1))
+        elif is_list(x):
+            self.stack.append(list(sorted(x)))
+        elif is_block(x):
+            l = self.stack.pop()
+            g, arg = self.evaluator(x)
+            def f(z):
+                self.stack.append(z)
+                g(arg)
+                return self.stack.pop(junk=False)
+            self.stack.append(list(sorted(l, key=f)))
+        else:
+            raise TypeError('range1 / sort')
+
+    @op('\x30') #= + add catenate
+    def op_add(self, t): #: nn>n ll>l bb>b ln>l lb>l nl>l bl>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x) and is_num(y):
+            self.stack.append(x + y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(x + y)
+        elif is_block(x) and is_block(y):
+            self.stack.append(Block(x.code + y.code))
+        elif is_list(x) and not is_list(y):
+            self.stack.append(x + [y])
+        elif not is_list(x) and is_list(y):
+            self.stack.append([x] + y)
+        else:
+            raise TypeError('add / catenate')
+
+    @op('\x31') #= - sub diff
+    def op_sub(self, t): #: nn>n ll>l ln>l lb>l nl>l bl>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x) and is_num(y):
+            self.stack.append(x - y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(set_diff(x, y))
+        elif is_list(x) and not is_list(y):
+            self.stack.append(set_diff(x, [y]))
+        elif not is_list(x) and is_list(y):
+            self.stack.append(set_diff(y, [x]))
+        else:
+            raise TypeError('subtract / set diff')
+
+    @op('\x32') #= * mul join times fold
+    def op_mul(self, t): #: nn>n ll>l ln>l nl>l bn>* nb>* lb>* bl>*
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x) and (is_block(y) or is_list(y)):
+            x, y = y, x
+        if is_block(x) and is_list(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x * y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(join(x, y))
+        elif is_list(x) and is_num(y):
+            self.stack.append(x * y)
+        elif is_block(x) and is_num(y):
+            f, arg = self.evaluator(x)
+            for i in xrange(y):
+                f(arg)
+        elif is_list(x) and is_block(y):
+            f, arg = self.evaluator(y)
+            self.stack.append(x[0])
+            for i in x[1:]:
+                self.stack.append(i)
+                f(arg)
+        else:
+            raise TypeError('multiply / join / times / fold')
+
+    @op('\x33') #= / div chunks split each
+    def op_div(self, t): #: nn>n ln>l nl>l ll>l sb>* bs>*
+        x, y = self.pop_for_block()
+
+        if not is_seq(x) and is_seq(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x // y)
+        elif is_list(x) and is_num(y):
+            self.stack.append(list(chunks(x, y)))
+        elif is_list(x) and is_list(y):
+            self.stack.append(split(x, y))
+        elif is_seq(x) and is_block(y):
+            f, arg = self.evaluator(y)
+            for i in x:
+                self.stack.append(i)
+                f(arg)
+        else:
+            raise TypeError('divide / chunks / split / each')
+
+    @op('\x34') #= % mod step clean-split map
+    def op_mod(self, t): #: nn>n ln>l nl>l ll>l sb>l bs>l
+        x, y = self.pop_for_block()
+
+        if not is_seq(x) and is_seq(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x % y)
+        elif is_list(x) and is_num(y):
+            self.stack.append(x[::y])
+        elif is_list(x) and is_list(y):
+            self.stack.append(split(x, y, clean=True))
+        elif is_seq(x) and is_block(y):
+            self.eval_map(y, x)
+        else:
+            raise TypeError('modulo / step / split\' / map')
+
+    @op('\x35') #= & and get when filter
+    def op_and(self, t): #: nn>n ll>l ln>a nl>a nb>* bn>* sb>l bs>l
+        x, y = self.pop_for_block()
+
+        if is_block(x) and is_num(y):
+            x, y = y, x
+        if is_num(x) and is_list(y):
+            x, y = y, x
+        if is_block(x) and is_seq(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x & y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(set_and(x, y))
+        elif is_list(x) and is_num(y):
+            self.stack.append(x[y])
+        elif is_num(x) and is_block(y):
+            if x: self.evaluate(y)
+        elif is_seq(x) and is_block(y):
+            self.eval_filter(y, x)
+        else:
+            raise TypeError('and / get / when / filter')
+
+    @op('\x36') #= | or unless
+    def op_or(self, t): #: nn>n ll>l nb>* bn>*
+        y = self.stack.pop()
+        x = self.stack.pop()
+
+        if is_block(x) and is_num(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x | y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(set_or(x, y))
+        elif is_num(x) and is_block(y):
+            if not x: self.evaluate(y)
+        else:
+            raise TypeError('bor / unless')
+
+    @op('\x37') #= ^ xor concatmap
+    def op_xor(self, t): #: nn>n ll>l lb>l bl>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+
+        if is_block(x) and is_list(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(x ^ y)
+        elif is_list(x) and is_list(y):
+            self.stack.append(set_xor(x, y))
+        elif is_list(x) and is_block(y):
+            f, arg = self.evaluator(y)
+            res = []
+            for i in x:
+                self.stack.append(i)
+                f(arg)
+                res.extend(self.stack.pop(junk=False))
+            self.stack.append(res)
+        else:
+            raise TypeError('xor / concatmap')
+
+    @op('\x38') #= smallest both
+    def op_smallest(self, t): #: aa>a aab>*
+        y = self.stack.pop()
+        if is_block(y):
+            x = self.stack.pop()
+            self.evaluate(y)
+            self.stack.append(x)
+            self.evaluate(y)
+        else:
+            x = self.stack.pop()
+            self.stack.append(min(x, y))
+
+    @op('\x39') #= biggest
+    def op_biggest(self, t): #: aa>a
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(max(x, y))
+
+    @op('\x3a') #= clamp
+    def op_clamp(self, t): #: aaa>a
+        z = self.stack.pop()
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(min(max(x, y), z))
+
+    @op('\x3c') #= gcd take
+    def op_gcd(self, t): #: nn>n sn>s ns>s
+        y = self.stack.pop(lazy=True)
+        x = self.stack.pop(lazy=True)
+
+        if is_num(x) and is_seq(y):
+            x, y = y, x
+
+        if is_num(x) and is_num(y):
+            self.stack.append(gcd(x, y))
+        elif (is_list(x) or type(x) is Slice) and is_num(y):
+            self.stack.append(cut(x, None, y))
+        elif is_lazy(x) and is_num(y):
+            self.stack.append(list(it.islice(x, y)) if y >= 0 else list(x)[:y])
+        else:
+            raise TypeError('gcd / take')
 
-                if is_block(x) and is_num(y):
-                    x, y = y, x
+    @op('\x3d') #= lcm drop
+    def op_lcm(self, t): #: nn>n sn>s ns>s
+        y = self.stack.pop(views=True)
+        x = self.stack.pop(views=True)
 
-                if is_num(x) and is_num(y):
-                    self.stack.append(x | y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(set_or(x, y))
-                elif is_num(x) and is_block(y):
-                    if not x: self.evaluate(y)
-                else:
-                    raise TypeError('bor / unless')
-
-            elif t == '\x37': #= ^ xor concatmap
-                y = self.stack.pop()
-                x = self.stack.pop()
-
-                if is_block(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(x ^ y)
-                elif is_list(x) and is_list(y):
-                    self.stack.append(set_xor(x, y))
-                elif is_list(x) and is_block(y):
-                    res = []
-                    for i in x:
-                        self.stack.append(i)
-                        self.evaluate(y)
-                        res.extend(self.stack.pop(junk=False))
-                    self.stack.append(res)
-                else:
-                    raise TypeError('xor / concatmap')
-
-            elif t == '\x38': #= smallest both
-                y = self.stack.pop()
-                if is_block(y):
-                    x = self.stack.pop()
-                    self.evaluate(y)
-                    self.stack.append(x)
-                    self.evaluate(y)
-                else:
-                    x = self.stack.pop()
-                    self.stack.append(min(x, y))
-
-            elif t == '\x39': #= biggest
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(max(x, y))
-
-            elif t == '\x3a': #= clamp
-                z = self.stack.pop()
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(min(max(x, y), z))
-
-            elif t == '\x3c': #= gcd take
-                y = self.stack.pop()
-                x = self.stack.pop()
-
-                if is_num(x) and is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(gcd(x, y))
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x[:y])
-                else:
-                    raise TypeError('gcd / take')
+        if is_num(x) and is_seq(y):
+            x, y = y, x
 
-            elif t == '\x3d': #= lcm drop
-                y = self.stack.pop()
-                x = self.stack.pop()
+        if is_num(x) and is_num(y):
+            self.stack.append(lcm(x, y))
+        elif is_seq(x) and is_num(y):
+            self.stack.append(cut(x, y))
+        else:
+            raise TypeError('lcm / drop')
 
-                if is_num(x) and is_list(y):
-                    x, y = y, x
+    @op('\x3e') #= pow index
+    def op_pow(self, t): #: nn>n ln>n nl>n
+        y = self.stack.pop()
+        x = self.stack.pop()
 
-                if is_num(x) and is_num(y):
-                    self.stack.append(lcm(x, y))
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x[y:])
-                else:
-                    raise TypeError('lcm / drop')
+        if is_num(x) and is_list(y):
+            x, y = y, x
 
-            elif t == '\x3e': #= pow index
-                y = self.stack.pop()
-                x = self.stack.pop()
+        if is_num(x) and is_num(y):
+            self.stack.append(x ** y)
+        elif is_list(x) and is_num(y):
+            self.stack.append(x.index(y) if y in x else -1)
+        else:
+            raise TypeError('power / index')
 
-                if is_num(x) and is_list(y):
-                    x, y = y, x
+    @op('\x3f') #= log member
+    def op_log(self, t): #: nn>n sa>n as>n
+        y = self.stack.pop(lazy=True)
+        x = self.stack.pop(lazy=True)
 
-                if is_num(x) and is_num(y):
-                    self.stack.append(x ** y)
-                elif is_list(x) and is_num(y):
-                    self.stack.append(x.index(y) if y in x else -1)
-                else:
-                    raise TypeError('power / index')
-
-            elif t == '\x3f': #= log member
-                y = self.stack.pop()
-                x = self.stack.pop()
-                
-                if is_list(y):
-                    x, y = y, x
-
-                if is_num(x) and is_num(y):
-                    self.stack.append(int(math.log(x, y)))
-                elif is_list(x):
-                    self.stack.append(1 if y in x else 0)
-                else:
-                    raise TypeError('log / member')
-
-            elif t == '\x40': #= dup
-                self.stack.append(self.stack[-1])
-            elif t == '\x41': #= dup2
-                self.stack.append(self.stack[-1])
-                self.stack.append(self.stack[-1])
-            elif t == '\x42': #= swap
-                self.stack.append(self.stack.pop(-2))
-            elif t == '\x43': #= rot
-                self.stack.append(self.stack.pop(-3))
-            elif t == '\x44': #= rrot
-                self.stack.append(self.stack.pop(-3))
-                self.stack.append(self.stack.pop(-3))
-            elif t == '\x45': #= over
-                self.stack.append(self.stack[-2])
-            elif t == '\x46': #= nip
-                self.stack.pop(-2)
-            elif t == '\x47': #= tuck
-                self.stack.insert(-2, self.stack[-1])
-            elif t == '\x48': #= 2dup
-                self.stack.append(self.stack[-2])
-                self.stack.append(self.stack[-2])
-            elif t == '\x49': #= pick
-                n = self.stack.pop()
-                self.stack.append(self.stack[-n])
-            elif t == '\x4a': #= roll
-                n = self.stack.pop()
-                self.stack.append(self.stack.pop(-n))
-            elif t == '\x4b': #= wrap-stack
-                self.stack = [copy.deepcopy(self.stack)]
-            elif t == '\x4c': #= leave-top
-                del self.stack[:-1]
-            elif t == '\x4d': #= itemize
-                self.stack.append([self.stack.pop()])
-            elif t == '\x4e': #= rrange
-                x = self.stack.pop()
-                self.stack.append(range(x)[::-1])
-            elif t == '\x4f': #= crange
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if x > y: x, y = y, x
-                self.stack.append(range(x, y))
-            elif t == '\x50': #= pop
-                self.stack.pop()
-            elif t == '\x51': #= pop2
-                self.stack.pop()
-                self.stack.pop()
-            elif t == '\x52': #= show
-                x = self.stack.pop()
-                self.stack.append(to_gs(show(x)))
-            elif t == '\x53': #= map-show
-                x = self.stack.pop()
-                self.stack.append(map(to_gs, map(show, x)))
-            elif t == '\x54': #= show-lines
-                x = self.stack.pop()
-                self.stack.append(to_gs('\n'.join(map(show, x))))
-            elif t == '\x55': #= show-words
-                x = self.stack.pop()
-                self.stack.append(to_gs(' '.join(map(show, x))))
-            elif t in '\x56\x57': #= read-num, read-nums
-                x = to_ps(self.stack.pop())
-                nums = map(int, re.findall(r'-?\d+', x))
-                self.stack.append(nums[0] if t == '\x56' else nums)
-            elif t == '\x58': #= show-line
-                x = self.stack.pop()
-                self.stack.append(to_gs(show(x) + '\n'))
-            elif t == '\x59': #= show-space
-                x = self.stack.pop()
-                self.stack.append(to_gs(show(x) + ' '))
-            elif t == '\x5a': #= show-comma
-                x = self.stack.pop()
-                self.stack.append(to_gs(', '.join(map(show, x))))
-            elif t == '\x5b': #= show-python
-                x = self.stack.pop()
-                self.stack.append(to_gs(', '.join(map(show, x)).join('[]')))
-            elif t in '\x5c\x5d\x5e': #= ljust, center, rjust
-                fill = ' ' 
-                if is_num(self.stack[-2]):
-                    fill = chr(self.stack.pop())
-                width = self.stack.pop()
-                s = self.stack.pop()
-                if t == '\x5c': g = show(s).ljust(width, fill)
-                if t == '\x5d': g = show(s).center(width, fill)
-                if t == '\x5e': g = show(s).rjust(width, fill)
-                self.stack.append(to_gs(g))
-            elif t == '\x5f': #= inspect
-                self.stack.append(to_gs(repr(self.stack.pop())))
-            elif t == '\x60': #= logical-and
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(x and y)
-            elif t == '\x61': #= logical-or
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(x or y)
-            elif t == '\x62': #= divides left-cons
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(0 if x % y else 1)
-                elif is_list(x):
-                    self.stack.append([y] + x)
-                else:
-                    raise TypeError('divides / left-cons')
-            elif t == '\x63': #= divmod group
-                y = self.stack.pop()
-                if is_num(y):
-                    x = self.stack.pop()
-                    self.stack.append(x // y)
-                    self.stack.append(x % y)
-                elif is_list(y):
-                    gb = [list(g) for k, g in it.groupby(y)]
-                    self.stack.append(list(gb))
-                else:
-                    raise TypeError('divmod / group')
-            elif t == '\x64': #= sum even
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(1 if x % 2 == 0 else 0)
-                elif is_list(x):
-                    self.stack.append(sum(x))
-            elif t == '\x65': #= product odd
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(1 if x % 2 == 1 else 0)
-                elif is_list(x):
-                    self.stack.append(product(x))
-            elif t == '\x66': #= fizzbuzz
-                fizzbuzz = []
-                for i in range(1, 101):
-                    s = ("Fizz" if i % 3 == 0 else "") + \
-                        ("Buzz" if i % 5 == 0 else "")
-                    fizzbuzz.append(s or str(i))
-                self.stack.append(to_gs('\n'.join(fizzbuzz)))
-            elif t == '\x67': #= popcnt right-cons
-                x = self.stack.pop()
-                if is_num(x):
-                    x = abs(x)
-                    p = 0
-                    while x:
-                        p += (x & 1)
-                        x >>= 1
-                    self.stack.append(p)
-                elif is_list(x):
-                    y = self.stack.pop()
-                    self.stack.append(x + [y])
-            elif t == '\x68': #= hello
-                x = 0
-                if len(self.stack) >= 1 and is_num(self.stack[-1]):
-                    x = self.stack.pop()
-                    x = (range(0, 11) + [100, 1000, 16, 64, 256]).index(x)
-                s1 = 'h' if x & 1 else 'H'
-                s2 = 'W' if x & 2 else 'w'
-                s3 = ['!', '', '.', '...'][((x & 4) >> 2) | ((x & 16) >> 3)]
-                s4 = '' if x & 8 else ','
-                f = '%sello%s %sorld%s' % (s1, s4, s2, s3)
-                self.stack.append(to_gs(f))
-            elif t in '\x69\x6a': #= base, binary
-                b = 2 if t == '\x6a' else self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x):
-                    x = abs(x)
-                    res = []
-                    while x:
-                        res.append(x % b)
-                        x //= b
-                    self.stack.append(res[::-1])
-                elif is_list(x):
-                    res = 0
-                    for i in x:
-                        res = res * b + i
-                    self.stack.append(res)
-                else:
-                    raise TypeError('base / binary')
-            elif t == '\x6b': #= is-prime
-                x = self.stack.pop()
-                if is_num(x):
-                    self.stack.append(1 if is_prime(x) else 0)
-                elif is_list(x):
-                    self.stack.append(filter(is_prime, x))
-                else:
-                    raise TypeError('is-prime')
-            elif t == '\x6c': #= primes
-                op = self.stack.pop()
-                x = self.stack.pop()
-                if op == 0:   self.stack.append(n_primes(x))
-                elif op == 1: self.stack.append(primes_below(x))
-                elif op == 2: self.stack.append(next_prime(x))
-                elif op == 3: self.stack.append(totient(x))
-                elif op == 4: self.stack.append(factor(x, exps=False))
-                elif op == 5: self.stack.append(factor(x, exps=True))
-            elif t == '\x6d': #= scan
-                f = self.stack.pop()
-                def call_f(x, y):
-                    self.stack.append(x)
-                    self.stack.append(y)
-                    self.evaluate(f)
-                    return self.stack.pop()
-                xs = self.stack.pop()
-                res = [xs.pop(0)]
-                while xs:
-                    res.append(call_f(res[-1], xs.pop(0)))
-                self.stack.append(res)
-            elif t in '\x70\x71\x72\x73\x74\x75': #= lt <, eq =, gt >, ge >=, ne !=, le <=
-                y = self.stack.pop()
-                x = self.stack.pop()
-                ops = {
-                    '\x70': operator.lt,
-                    '\x71': operator.eq,
-                    '\x72': operator.gt,
-                    '\x73': operator.ge,
-                    '\x74': operator.ne,
-                    '\x75': operator.le,
-                }
-                self.stack.append(1 if ops[t](x, y) else 0)
-            elif t == '\x76': #= cmp
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(cmp(x, y))
-            elif t == '\x77': #= is-sorted
-                x = self.stack.pop()
+        if is_seq(y):
+            x, y = y, x
+        y = force(y)
+
+        if is_num(x) and is_num(y):
+            self.stack.append(int(math.log(x, y)))
+        elif is_seq(x):
+            self.stack.append(1 if y in x else 0)
+        else:
+            raise TypeError('log / member')
+
+    @op('\x40') #= dup
+    def op_dup(self, t): #: a>aa
+        self.stack.append(self.stack[-1])
+
+    @op('\x41') #= dup2
+    def op_dup2(self, t): #: a>aaa
+        self.stack.append(self.stack[-1])
+        self.stack.append(self.stack[-1])
+
+    @op('\x42') #= swap
+    def op_swap(self, t): #: aa>aa
+        self.stack.append(self.stack.pop(-2, lazy=True))
+
+    @op('\x43') #= rot
+    def op_rot(self, t): #: aaa>aaa
+        self.stack.append(self.stack.pop(-3, lazy=True))
+
+    @op('\x44') #= rrot
+    def op_rrot(self, t): #: aaa>aaa
+        self.stack.append(self.stack.pop(-3, lazy=True))
+        self.stack.append(self.stack.pop(-3, lazy=True))
+
+    @op('\x45') #= over
+    def op_over(self, t): #: aa>aaa
+        self.stack.append(self.stack[-2])
+
+    @op('\x46') #= nip
+    def op_nip(self, t): #: aa>a
+        self.stack.pop(-2, lazy=True)
+
+    @op('\x47') #= tuck
+    def op_tuck(self, t): #: aa>aaa
+        self.stack.insert(-2, self.stack[-1])
+
+    @op('\x48') #= 2dup
+    def op_2dup(self, t): #: aa>aaaa
+        self.stack.append(self.stack[-2])
+        self.stack.append(self.stack[-2])
+
+    @op('\x49') #= pick
+    def op_pick(self, t): #: *n>*
+        n = self.stack.pop()
+        self.stack.append(self.stack[-n])
+
+    @op('\x4a') #= roll
+    def op_roll(self, t): #: *n>*
+        n = self.stack.pop()
+        self.stack.append(self.stack.pop(-n, lazy=True))
+
+    @op('\x4b') #= wrap-stack
+    def op_wrap_stack(self, t): #: *>l
+        stack = Stack([copy_value(map(force, self.stack), {})])
+        stack.junk = self.stack.junk
+        self.stack = stack
+
+    @op('\x4c') #= leave-top
+    def op_leave_top(self, t): #: *a>a
+        del self.stack[:-1]
+
+    @op('\x4d') #= itemize
+    def op_itemize(self, t): #: a>l
+        self.stack.append([self.stack.pop()])
+
+    @op('\x4e') #= rrange
+    def op_rrange(self, t): #: n>l
+        x = self.stack.pop()
+        self.stack.append(range(x)[::-1])
+
+    @op('\x4f') #= crange
+    def op_crange(self, t): #: nn>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if x > y: x, y = y, x
+        self.stack.append(range(x, y))
+
+    @op('\x50') #= pop
+    def op_pop(self, t): #: a>
+        self.stack.pop(lazy=True)
+
+    @op('\x51') #= pop2
+    def op_pop2(self, t): #: aa>
+        self.stack.pop(lazy=True)
+        self.stack.pop(lazy=True)
+
+    @op('\x52') #= show
+    def op_show(self, t): #: a>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(show(x)))
+
+    @op('\x53') #= map-show
+    def op_map_show(self, t): #: l>l
+        x = self.stack.pop()
+        self.stack.append(map(to_gs, map(show, x)))
+
+    @op('\x54') #= show-lines
+    def op_show_lines(self, t): #: l>l
+        x = self.stack.pop()
+        self.stack.append(to_gs('\n'.join(map(show, x))))
+
+    @op('\x55') #= show-words
+    def op_show_words(self, t): #: l>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(' '.join(map(show, x))))
+
+    @op('\x56', '\x57') #= read-num, read-nums
+    def op_read_num(self, t): #: l>n, l>l
+        x = to_ps(self.stack.pop())
+        nums = map(int, re.findall(r'-?\d+', x))
+        self.stack.append(nums[0] if t == '\x56' else nums)
+
+    @op('\x58') #= show-line
+    def op_show_line(self, t): #: a>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(show(x) + '\n'))
+
+    @op('\x59') #= show-space
+    def op_show_space(self, t): #: a>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(show(x) + ' '))
+
+    @op('\x5a') #= show-comma
+    def op_show_comma(self, t): #: l>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(', '.join(map(show, x))))
+
+    @op('\x5b') #= show-python
+    def op_show_python(self, t): #: l>l
+        x = self.stack.pop()
+        self.stack.append(to_gs(', '.join(map(show, x)).join('[]')))
+
+    @op('\x5c', '\x5d', '\x5e') #= ljust, center, rjust
+    def op_ljust(self, t): #: ln>l bn>l ann>l
+        fill = ' ' 
+        if is_num(self.stack[-2]):
+            fill = chr(self.stack.pop())
+        width = self.stack.pop()
+        s = self.stack.pop()
+        if t == '\x5c': g = show(s).ljust(width, fill)
+        if t == '\x5d': g = show(s).center(width, fill)
+        if t == '\x5e': g = show(s).rjust(width, fill)
+        self.stack.append(to_gs(g))
+
+    @op('\x5f') #= inspect
+    def op_inspect(self, t): #: a>l
+        self.stack.append(to_gs(repr(self.stack.pop())))
+
+    @op('\x60') #= logical-and
+    def op_logical_and(self, t): #: aa>a
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(x and y)
+
+    @op('\x61') #= logical-or
+    def op_logical_or(self, t): #: aa>a
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(x or y)
+
+    @op('\x62') #= divides left-cons
+    def op_divides(self, t): #: nn>n la>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(0 if x % y else 1)
+        elif is_list(x):
+            self.stack.append([y] + x)
+        else:
+            raise TypeError('divides / left-cons')
+
+    @op('\x63') #= divmod group
+    def op_divmod(self, t): #: nn>nn l>l
+        y = self.stack.pop()
+        if is_num(y):
+            x = self.stack.pop()
+            self.stack.append(x // y)
+            self.stack.append(x % y)
+        elif is_list(y):
+            gb = [list(g) for k, g in it.groupby(y)]
+            self.stack.append(list(gb))
+        else:
+            raise TypeError('divmod / group')
+
+    @op('\x64') #= sum even
+    def op_sum(self, t): #: n>n l>n
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(1 if x % 2 == 0 else 0)
+        elif is_list(x):
+            self.stack.append(sum(x))
+
+    @op('\x65') #= product odd
+    def op_product(self, t): #: n>n l>n
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(1 if x % 2 == 1 else 0)
+        elif is_list(x):
+            self.stack.append(product(x))
+
+    @op('\x66') #= fizzbuzz
+    def op_fizzbuzz(self, t): #: >l
+        fizzbuzz = []
+        for i in range(1, 101):
+            s = ("Fizz" if i % 3 == 0 else "") + \
+                ("Buzz" if i % 5 == 0 else "")
+            fizzbuzz.append(s or str(i))
+        self.stack.append(to_gs('\n'.join(fizzbuzz)))
+
+    @op('\x67') #= popcnt right-cons
+    def op_popcnt(self, t): #: n>n al>l
+        x = self.stack.pop()
+        if is_num(x):
+            x = abs(x)
+            p = 0
+            while x:
+                p += (x & 1)
+                x >>= 1
+            self.stack.append(p)
+        elif is_list(x):
+            y = self.stack.pop()
+            self.stack.append(x + [y])
+
+    @op('\x68') #= hello
+    def op_hello(self, t): #: >l n>l
+        x = 0
+        if len(self.stack) >= 1 and is_num(self.stack[-1]):
+            x = self.stack.pop()
+            x = (range(0, 11) + [100, 1000, 16, 64, 256]).index(x)
+        s1 = 'h' if x & 1 else 'H'
+        s2 = 'W' if x & 2 else 'w'
+        s3 = ['!', '', '.', '...'][((x & 4) >> 2) | ((x & 16) >> 3)]
+        s4 = '' if x & 8 else ','
+        f = '%sello%s %sorld%s' % (s1, s4, s2, s3)
+        self.stack.append(to_gs(f))
+
+    @op('\x69', '\x6a') #= base, binary
+    def op_base(self, t): #: nn>l ln>n, n>l l>n
+        b = 2 if t == '\x6a' else self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x):
+            x = abs(x)
+            res = []
+            while x:
+                res.append(x % b)
+                x //= b
+            self.stack.append(res[::-1])
+        elif is_list(x):
+            res = 0
+            for i in x:
+                res = res * b + i
+            self.stack.append(res)
+        else:
+            raise TypeError('base / binary')
+
+    @op('\x6b') #= is-prime
+    def op_is_prime(self, t): #: n>n l>l
+        x = self.stack.pop()
+        if is_num(x):
+            self.stack.append(1 if is_prime(x) else 0)
+        elif is_list(x):
+            self.stack.append(filter(is_prime, x))
+        else:
+            raise TypeError('is-prime')
+
+    @op('\x6c') #= primes
+    def op_primes(self, t): #: nn>*
+        op = self.stack.pop()
+        x = self.stack.pop()
+        if op == 0:   self.stack.append(n_primes(x))
+        elif op == 1: self.stack.append(primes_below(x))
+        elif op == 2: self.stack.append(next_prime(x))
+        elif op == 3: self.stack.append(totient(x))
+        elif op == 4: self.stack.append(factor(x, exps=False))
+        elif op == 5: self.stack.append(factor(x, exps=True))
+
+    @op('\x6d') #= scan
+    def op_scan(self, t): #: lb>l
+        f, arg = self.evaluator(self.stack.pop())
+        def call_f(x, y):
+            self.stack.append(x)
+            self.stack.append(y)
+            f(arg)
+            return self.stack.pop()
+        xs = self.stack.pop()
+        detach(xs)
+        res = [xs.pop(0)]
+        while xs:
+            res.append(call_f(res[-1], xs.pop(0)))
+        self.stack.append(res)
+
+    @op('\x70', '\x71', '\x72', '\x73', '\x74', '\x75') #= lt <, eq =, gt >, ge >=, ne !=, le <=
+    def op_lt(self, t): #: aa>n
+        y = self.stack.pop()
+        x = self.stack.pop()
+        ops = {
+            '\x70': operator.lt,
+            '\x71': operator.eq,
+            '\x72': operator.gt,
+            '\x73': operator.ge,
+            '\x74': operator.ne,
+            '\x75': operator.le,
+        }
+        self.stack.append(1 if ops[t](x, y) else 0)
+
+    @op('\x76') #= cmp
+    def op_cmp(self, t): #: aa>n
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(cmp(x, y))
+
+    @op('\x77') #= is-sorted
+    def op_is_sorted(self, t): #: l>n lb>n
+        x = self.stack.pop()
+        if is_list(x):
+            self.stack.append(1 if x == list(sorted(x)) else 0)
+        elif is_block(x):
+            l = self.stack.pop()
+            def f(z):
+                self.stack.append(z)
+                self.evaluate(x)
+                return self.stack.pop()
+            sorted_l = list(sorted(l, key=f))
+            self.stack.append(1 if l == sorted_l else 0)
+        else:
+            raise TypeError('sorted')
+
+    @op('\x78') #= shift-left inits
+    def op_shift_left(self, t): #: nn>n l>l
+        y = self.stack.pop()
+        if is_list(y):
+            inits = []
+            for i in xrange(len(y) + 1):
+                inits.append(y[:i])
+            self.stack.append(inits)
+        else:
+            x = self.stack.pop()
+            self.stack.append(x << y)
+
+    @op('\x79') #= shift-right tails
+    def op_shift_right(self, t): #: nn>n l>l
+        y = self.stack.pop()
+        if is_list(y):
+            tails = []
+            for i in xrange(len(y) + 1):
+                tails.append(y[len(y)-i:])
+            self.stack.append(tails)
+        else:
+            x = self.stack.pop()
+            self.stack.append(x >> y)
+
+    @op('\x7a') #= digit-left enumerate
+    def op_digit_left(self, t): #: nn>n l>l
+        y = self.stack.pop()
+        if is_list(y):
+            self.stack.append(list(map(list, enumerate(y))))
+        else:
+            x = self.stack.pop()
+            self.stack.append(x * (10 ** y))
+
+    @op('\x7b') #= digit-right
+    def op_digit_right(self, t): #: nn>n
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(x // (10 ** y))
+
+    @op('\x7c') #= power-of-2
+    def op_power_of_2(self, t): #: n>n
+        self.stack.append(2 ** self.stack.pop())
+
+    @op('\x7d') #= power-of-10
+    def op_power_of_10(self, t): #: n>n
+        self.stack.append(10 ** self.stack.pop())
+
+    @op('\x7e') #= sub-power-of-2
+    def op_sub_power_of_2(self, t): #: n>n
+        self.stack.append(2 ** self.stack.pop() - 1)
+
+    @op('\x7f') #= sub-power-of-10
+    def op_sub_power_of_10(self, t): #: n>n
+        self.stack.append(10 ** self.stack.pop() - 1)
+
+    @op('\x80') #= pair
+    def op_pair(self, t): #: aa>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append([x, y])
+
+    @op('\x81') #= copies
+    def op_copies(self, t): #: an>l
+        n = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append([x for _ in xrange(n)])
+
+    @op('\x82') #= take-end
+    def op_take_end(self, t): #: ln>l nl>l
+        y = self.stack.pop()
+        x = self.stack.pop()
+        if is_num(x) and is_list(y):
+            x, y = y, x
+        self.stack.append(x[-y:])
+
+    @op('\x83') #= cartesian-product
+    def op_cartesian_product(self, t): #: ll>s
+        y = self.stack.pop()
+        x = self.stack.pop()
+        self.stack.append(LazySeq(it.product, list(x), list(y)))
+
+    @op('\x84') #= uppercase-alphabet
+    def op_uppercase_alphabet(self, t): #: >l
+        self.stack.append(to_gs(string.ascii_uppercase))
+
+    @op('\x85') #= lowercase-alphabet
+    def op_lowercase_alphabet(self, t): #: >l
+        self.stack.append(to_gs(string.ascii_lowercase))
+
+    @op('\x86') #= ascii-digits
+    def op_ascii_digits(self, t): #: >l
+        self.stack.append(to_gs(string.digits))
+
+    @op('\x87') #= printable-ascii
+    def op_printable_ascii(self, t): #: >l
+        self.stack.append(to_gs(PRINTABLE))
+
+    @op('\x88', '\x89', '\x8a', '\x8b', '\x8c', '\x8d', '\x8e', '\x8f') #= is-alnum, is-alpha, is-digit, is-lower, is-space, is-upper, is-printable, is-hexdigit
+    def op_is_alnum(self, t): #: l>n
+        m = [str.isalnum, str.isalpha, str.isdigit,
+             str.islower, str.isspace, str.isupper,
+             lambda x: all(32 <= ord(c) <= 126 for c in x),
+             lambda x: x in '0123456789abcdefABCDEF']
+        p = m[ord(t) - 0x88]
+        x = to_ps(self.stack.pop())
+        self.stack.append(1 if p(x) else 0)
+
+    @op('\x90') #= uniq nub
+    def op_uniq(self, t): #: l>l
+        self.stack.append(uniq(self.stack.pop()))
+
+    @op('\x91') #= compress
+    def op_compress(self, t): #: ll>l
+        ns = self.stack.pop()
+        xs = self.stack.pop()
+        new = []
+        for n, x in zip(ns, xs):
+            new += [x for _ in xrange(n)]
+        self.stack.append(new)
+
+    @op('\x92') #= select
+    def op_select(self, t): #: ll>l
+        xs = self.stack.pop()
+        iis = self.stack.pop()
+        new = []
+        for i in iis:
+            new.append(xs[i])
+        self.stack.append(new)
+
+    @op('\x93') #= permutations
+    def op_permutations(self, t): #: l>s ln>s
+        xs = self.stack.pop()
+        if is_num(xs):
+            n = xs
+            xs = self.stack.pop()
+        else:
+            n = None
+        self.stack.append(LazySeq(it.permutations, list(xs), n))
+
+    @op('\x94') #= fold-product
+    def op_fold_product(self, t): #: l>s
+        xss = self.stack.pop()
+        self.stack.append(LazySeq(it.product, *map(list, xss)))
+
+    @op('\x95') #= repeat-product
+    def op_repeat_product(self, t): #: ln>s
+        n = self.stack.pop()
+        xs = self.stack.pop()
+        self.stack.append(LazySeq(it.product, list(xs), repeat=n))
+
+    @op('\x96') #= combinations
+    def op_combinations(self, t): #: ln>s
+        n = self.stack.pop()
+        xs = self.stack.pop()
+        self.stack.append(LazySeq(it.combinations, list(xs), n))
+
+    @op('\x97') #= combinations-with-replacement
+    def op_combinations_with_replacement(self, t): #: ln>s
+        n = self.stack.pop()
+        xs = self.stack.pop()
+        self.stack.append(LazySeq(it.combinations_with_replacement,
+                                  list(xs), n))
+
+    @op('\x98') #= pairwise
+    def op_pairwise(self, t): #: l>l
+        xs = self.stack.pop()
+        ys = map(list, zip(xs, xs[1:]))
+        self.stack.append(ys)
+
+    @op('\x99') #= flatten
+    def op_flatten(self, t): #: l>l
+        def flatten(xs):
+            acc = []
+            for x in xs:
                 if is_list(x):
-                    self.stack.append(1 if x == list(sorted(x)) else 0)
-                elif is_block(x):
-                    l = self.stack.pop()
-                    def f(z):
-                        self.stack.append(z)
-                        self.evaluate(x)
-                        return self.stack.pop()
-                    sorted_l = list(sorted(l, key=f))
-                    self.stack.append(1 if l == sorted_l else 0)
-                else:
-                    raise TypeError('sorted')
-            elif t == '\x78': #= shift-left inits
-                y = self.stack.pop()
-                if is_list(y):
-                    inits = []
-                    for i in xrange(len(y) + 1):
-                        inits.append(y[:i])
-                    self.stack.append(inits)
-                else:
-                    x = self.stack.pop()
-                    self.stack.append(x << y)
-            elif t == '\x79': #= shift-right tails
-                y = self.stack.pop()
-                if is_list(y):
-                    tails = []
-                    for i in xrange(len(y) + 1):
-                        tails.append(y[len(y)-i:])
-                    self.stack.append(tails)
-                else:
-                    x = self.stack.pop()
-                    self.stack.append(x >> y)
-            elif t == '\x7a': #= digit-left enumerate
-                y = self.stack.pop()
-                if is_list(y):
-                    self.stack.append(list(map(list, enumerate(y))))
+                    acc += flatten(x)
                 else:
-                    x = self.stack.pop()
-                    self.stack.append(x * (10 ** y))
-            elif t == '\x7b': #= digit-right
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append(x // (10 ** y))
-            elif t == '\x7c': #= power-of-2
-                self.stack.append(2 ** self.stack.pop())
-            elif t == '\x7d': #= power-of-10
-                self.stack.append(10 ** self.stack.pop())
-            elif t == '\x7e': #= sub-power-of-2
-                self.stack.append(2 ** self.stack.pop() - 1)
-            elif t == '\x7f': #= sub-power-of-10
-                self.stack.append(10 ** self.stack.pop() - 1)
-
-            elif t == '\x80': #= pair
-                y = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append([x, y])
-            elif t == '\x81': #= copies
-                n = self.stack.pop()
-                x = self.stack.pop()
-                self.stack.append([x for _ in xrange(n)])
-            elif t == '\x82': #= take-end
-                y = self.stack.pop()
-                x = self.stack.pop()
-                if is_num(x) and is_list(y):
-                    x, y = y, x
-                self.stack.append(x[-y:])
-            elif t == '\x83': #= cartesian-product
-                y = self.stack.pop()
-                x = self.stack.pop()
-                p = it.product(x, y)
-                self.stack.append(list(map(list, p)))
-            elif t == '\x84': #= uppercase-alphabet
-                self.stack.append(range(ord('A'), ord('Z') + 1))
-            elif t == '\x85': #= lowercase-alphabet
-                self.stack.append(range(ord('a'), ord('z') + 1))
-            elif t == '\x86': #= ascii-digits
-                self.stack.append(range(ord('0'), ord('9') + 1))
-            elif t == '\x87': #= printable-ascii
-                self.stack.append(range(32, 127))
-            elif t in '\x88\x89\x8a\x8b\x8c\x8d\x8e\x8f': #= is-alnum, is-alpha, is-digit, is-lower, is-space, is-upper, is-printable, is-hexdigit
-                m = [str.isalnum, str.isalpha, str.isdigit,
-                     str.islower, str.isspace, str.isupper,
-                     lambda x: all(32 <= ord(c) <= 126 for c in x),
-                     lambda x: x in '0123456789abcdefABCDEF']
-                p = m[ord(t) - 0x88]
-                x = to_ps(self.stack.pop())
-                self.stack.append(1 if p(x) else 0)
-            elif t == '\x90': #= uniq nub
-                xs = self.stack.pop()
-                uniq = []
-                for x in xs:
-                    if x not in uniq:
-                        uniq.append(x)
-                self.stack.append(uniq)
-            elif t == '\x91': #= compress
-                ns = self.stack.pop()
-                xs = self.stack.pop()
-                new = []
-                for n, x in zip(ns, xs):
-                    new += [x for _ in xrange(n)]
-                self.stack.append(new)
-            elif t == '\x92': #= select
-                xs = self.stack.pop()
-                iis = self.stack.pop()
-                new = []
-                for i in iis:
-                    new.append(xs[i])
-                self.stack.append(new)
-            elif t == '\x93': #= permutations
-                xs = self.stack.pop()
-                if is_num(xs):
-                    n = xs
-                    xs = self.stack.pop()
-                else:
-                    n = None
-                ps = list(map(list, it.permutations(xs, n)))
-                self.stack.append(ps)
-            elif t == '\x94': #= fold-product
-                xss = self.stack.pop()
-                ys = list(map(list, it.product(*xss)))
-                self.stack.append(ys)
-            elif t == '\x95': #= repeat-product
-                n = self.stack.pop()
-                xs = self.stack.pop()
-                ys = list(map(list, it.product(xs, repeat=n)))
-                self.stack.append(ys)
-            elif t == '\x96': #= combinations
-                n = self.stack.pop()
-                xs = self.stack.pop()
-                ys = list(map(list, it.combinations(xs, n)))
-                self.stack.append(ys)
-            elif t == '\x97': #= combinations-with-replacement
-                n = self.stack.pop()
-                xs = self.stack.pop()
-                ys = list(map(list, it.combinations_with_replacement(xs, n)))
-                self.stack.append(ys)
-            elif t == '\x98': #= pairwise
-                xs = self.stack.pop()
-                ys = map(list, zip(xs, xs[1:]))
-                self.stack.append(ys)
-            elif t == '\x99': #= flatten
-                def flatten(xs):
-                    acc = []
-                    for x in xs:
-                        if is_list(x):
-                            acc += flatten(x)
-                        else:
-                            acc.append(x)
-                    return acc
-                xs = self.stack.pop()
-                self.stack.append(flatten(xs))
-            elif t == '\x9a': #= transpose
-                xs = self.stack.pop()
-                self.stack.append(map(list, zip(*xs)))
-            elif '\xa0' <= t <= '\xaf': # junk (recently popped items)
-                self.stack.append(self.stack.junk[-1 - (ord(t) & 15)])
-            elif t == '\xb0': #= zip
-                ys = self.stack.pop()
-                xs = self.stack.pop()
-                self.stack.append(map(list, zip(xs, ys)))
-            elif t == '\xb1': #= zipwith
-                f = self.stack.pop()
-                ys = self.stack.pop()
-                xs = self.stack.pop()
-                l0 = len(self.stack)
-                for x, y in zip(xs, ys):
-                    self.stack.append(x)
-                    self.stack.append(y)
-                    self.evaluate(f)
-                self.stack[l0:] = [self.stack[l0:]]
-            elif t == '\xb2': #= counter
-                self.stack.append(self.counter)
-                self.counter += 1
-            elif '\xc8' <= t <= '\xcb': # save
-                self.regs[ord(t) & 3] = self.stack[-1]
-            elif '\xcc' <= t <= '\xcf': # put
-                self.regs[ord(t) & 3] = self.stack.pop()
-            elif '\xd0' <= t <= '\xd3': # get
-                self.stack.append(self.regs[ord(t) & 3])
-            elif '\xd4' <= t <= '\xd7': # nip
-                self.regs[ord(t) & 3] = self.stack.pop(-2)
-            elif '\xd8' <= t <= '\xdb': # tuck
-                self.stack.insert(-1, self.regs[ord(t) & 3])
-            elif '\xdc' <= t <= '\xdf': # show
-                self.stack.append(to_gs(show(self.regs[ord(t) & 3])))
+                    acc.append(x)
+            return acc
+        xs = self.stack.pop()
+        self.stack.append(flatten(xs))
+
+    @op('\x9a') #= transpose
+    def op_transpose(self, t): #: l>l
+        xs = self.stack.pop()
+        self.stack.append(map(list, zip(*xs)))
+
+    @op(*map(chr, range(0xa0, 0xb0))) # junk (recently popped items)
+    def op_junk(self, t): #: >a
+        self.stack.append(self.stack.junk[-1 - (ord(t) & 15)])
+
+    @op('\xb0') #= zip
+    def op_zip(self, t): #: ll>l
+        ys = self.stack.pop()
+        xs = self.stack.pop()
+        self.stack.append(map(list, zip(xs, ys)))
+
+    @op('\xb1') #= zipwith
+    def op_zipwith(self, t): #: llb>l
+        f = self.stack.pop()
+        ys = self.stack.pop()
+        xs = self.stack.pop()
+        f, arg = self.evaluator(f)
+        l0 = len(self.stack)
+        for x, y in zip(xs, ys):
+            self.stack.append(x)
+            self.stack.append(y)
+            f(arg)
+        self.stack[l0:] = [map(force, self.stack[l0:])]
+
+    @op('\xb2') #= counter
+    def op_counter(self, t): #: >n
+        self.stack.append(self.counter)
+        self.counter += 1
+
+    @op('\xc8', '\xc9', '\xca', '\xcb') # save
+    def op_save(self, t): #: a>a
+        self.regs[ord(t) & 3] = self.stack[-1]
+
+    @op('\xcc', '\xcd', '\xce', '\xcf') # put
+    def op_put(self, t): #: a>
+        self.regs[ord(t) & 3] = self.stack.pop()
+
+    @op('\xd0', '\xd1', '\xd2', '\xd3') # get
+    def op_get(self, t): #: >a
+        self.stack.append(self.regs[ord(t) & 3])
+
+    @op('\xd4', '\xd5', '\xd6', '\xd7') # nip
+    def op_nip_reg(self, t): #: aa>a
+        self.regs[ord(t) & 3] = self.stack.pop(-2)
+
+    @op('\xd8', '\xd9', '\xda', '\xdb') # tuck
+    def op_tuck_reg(self, t): #: a>aa
+        self.stack.insert(-1, self.regs[ord(t) & 3])
+
+    @op('\xdc', '\xdd', '\xde', '\xdf') # show
+    def op_show_reg(self, t): #: >l
+        self.stack.append(to_gs(show(self.regs[ord(t) & 3])))
+
+    def op_invalid(self, t):
+        raise ValueError('invalid token %r' % t)
+
+for i in xrange(256):
+    OPS.setdefault(chr(i), GS2.op_invalid.im_func)
+
+# stack shuffling compiled to inline code by CompiledGS2.
+INLINE = {
+    '\x00': 'pass',
+    '\x40': 'stack.append(stack[-1])',
+    '\x42': 'stack.append(stack.pop(-2, lazy=True))',
+    '\x45': 'stack.append(stack[-2])',
+    '\x50': 'stack.pop(lazy=True)',
+}
+
+class CompiledGS2(GS2):
+    r"""
+    Alternative backend that turns each block into a Python function the
+    first time it's evaluated: number literals and simple stack shuffles
+    become inline code, everything else a direct call to its handler, and
+    map/filter/each/etc. call the compiled body in a loop.
+
+    It should behave exactly like the interpreter:
+
+    >>> def result(cls, code, stdin=''):
+    ...     random.seed(0)
+    ...     g = cls(code, stdin)
+    ...     g.evaluate(tokenize(code))
+    ...     return g.stack, g.stack.junk, g.regs, g.counter
+    >>> cases = [
+    ...     ('\x01\x0e\x2f\x08\x40\x32\x09\x34', ''),   # 14 range1 { dup * } map
+    ...     ('\x56\x2f\xfe\x07*\x32\x0a', '7'),          # the stars example
+    ...     ('\x30\x2c\x08\x24\x09\x35', 'a bc def'),    # line-mode filter
+    ...     ('\x15\x2e\x08\x40\x42\x50\x0f\x27\x09\x33', ''),
+    ...     ('\x1a\x2e\x15\x2f\xe1\xb1\xb2\xa2', ''),   # zipwith, counter, junk
+    ...     ('\x13\x2e\x08\x14\x2e\x09\x37\x08\x27\x09\x2f', ''),
+    ...     ('\x2c\x08\x2e\x09\x2f\xc8\x4c', 'bb a ccc'), # sort by length
+    ... ]
+    >>> [result(GS2, c, s) == result(CompiledGS2, c, s) for c, s in cases]
+    [True, True, True, True, True, True, True]
+    """
+    def __init__(self, *args):
+        GS2.__init__(self, *args)
+        self.compiled = {}
+
+    def compile(self, block):
+        entry = self.compiled.get(id(block))
+        if entry is not None and entry[0] is block:
+            return entry[1]
+
+        ns = {'copy_value': copy_value}
+        lines = ['def f(self):', '    stack = self.stack']
+        for i, t in enumerate(block.folded):
+            if isinstance(t, Block):
+                ns['k%d' % i] = t
+                lines.append('    stack.append(k%d)' % i)
+            elif isinstance(t, Constant) and not is_num(t.value):
+                ns['k%d' % i] = t.value
+                lines.append('    stack.append(copy_value(k%d, {}))' % i)
+            elif isinstance(t, Literal) and is_num(t.value):
+                lines.append('    stack.append(%r)' % t.value)
+            elif t in INLINE:
+                lines.append('    ' + INLINE[t])
+            elif t == '\x0f': # exit
+                lines.append('    return')
+                break
             else:
-                raise ValueError('invalid token %r' % t) 
+                # handlers may evaluate blocks that replace self.stack
+                # (wrap-stack), so fetch it again afterwards.
+                ns['h%d' % i] = OPS[t[0]]
+                ns['t%d' % i] = t
+                lines.append('    h%d(self, t%d)' % (i, i))
+                lines.append('    stack = self.stack')
+        exec '\n'.join(lines) in ns
+
+        f = ns['f']
+        self.compiled[id(block)] = (block, f)
+        return f
 
-    def eval_map(self, f, x):
-        l0 = len(self.stack)
-        for i in x:
-            self.stack.append(i)
-            self.evaluate(f)
-        self.stack[l0:] = [self.stack[l0:]]
+    def evaluate(self, block):
+        self.compile(block)(self)
 
-    def eval_filter(self, f, x):
-        l0 = len(self.stack)
-        for i in x:
-            self.stack.append(i)
-            self.evaluate(f)
-            if self.stack.pop():
-                self.stack.append(i)
-        self.stack[l0:] = [self.stack[l0:]]
+    def evaluator(self, block):
+        if not is_block(block):
+            return GS2.evaluator(self, block)
+        return self.compile(block), self
+
+class ResourceLimit(Exception):
+    """
+    Raised by SandboxGS2 when a program goes over one of its limits. Unlike
+    other errors, GS2.run lets it through instead of quining.
+    """
+    def __init__(self, kind, limit):
+        if limit is None:
+            Exception.__init__(self, 'resource limit exceeded: %s' % kind)
+        else:
+            Exception.__init__(self, 'resource limit exceeded: %s > %s' % (kind, limit))
+        self.kind = kind
+        self.limit = limit
+
+def memory_limit():
+    """
+    How many bytes of address space this process may use, or None if
+    there's no limit (or no way to tell.)
+    """
+    try:
+        import resource
+    except ImportError: # not on Windows
+        return None
+    soft = resource.getrlimit(resource.RLIMIT_AS)[0]
+    return None if soft == resource.RLIM_INFINITY else soft
+
+def num(x):
+    return x if is_num(x) else 0
+
+def bits(x):
+    return abs(x).bit_length() if is_num(x) else 0
+
+def size(x):
+    return len(x) if is_seq(x) else 0
+
+def arrange(n, k, cap):
+    """
+    The number of k-permutations of n things, or something over cap if
+    that's bigger.
+
+    >>> arrange(10, 3, 10**6), arrange(10, 10, 100) > 100
+    (720, True)
+    """
+    if not 0 <= k <= n: return 0
+    c = 1
+    for i in xrange(k):
+        c *= n - i
+        if c > cap: break
+    return c
+
+def choose(n, k, cap):
+    """
+    >>> choose(10, 3, 10**6), choose(10**6, 10, 100) > 100
+    (120, True)
+    """
+    if not 0 <= k <= n: return 0
+    c = 1
+    for i in xrange(min(k, n - k)):
+        c = c * (n - i) // (i + 1)
+        if c > cap: break
+    return c
+
+def power(b, e, cap):
+    if b <= 1 or e <= 0: return 1
+    return b ** e if e * math.log(b, 2) < cap.bit_length() else cap + 1
+
+def guard_mul(s, t, cap):
+    x, y = s[-2], s[-1]
+    if is_num(x) and is_num(y):
+        return 'bits', bits(x) + bits(y)
+    return 'length', size(x) * num(y) + size(y) * num(x)
+
+def guard_permutations(s, t, cap):
+    if is_num(s[-1]):
+        n = s[-1]
+        return 'length', arrange(size(s[-2]), n, cap) * n
+    n = size(s[-1])
+    return 'length', arrange(n, n, cap) * n
+
+def guard_fold_product(s, t, cap):
+    c = 1
+    for xs in s[-1]:
+        c *= size(xs)
+        if c > cap: break
+    return 'length', c * size(s[-1])
+
+def guard_base(s, t, cap):
+    b, x = s[-1], s[-2]
+    if is_num(x):
+        # the digits of a number in base 1 or -1 never run out
+        return 'length', cap + 1 if x and b in (1, -1) else 0
+    return 'bits', size(x) * bits(b)
+
+def guard_is_prime(s, t, cap):
+    x = s[-1]
+    if is_num(x):
+        return 'prime', bits(x)
+    return 'prime', max([bits(n) for n in x] or [0])
+
+def guard_primes(s, t, cap):
+    op, x = s[-1], num(s[-2])
+    if op == 0: return 'length', int(math.log(x) * x) if x > 1 else 0
+    if op == 1: return 'length', x
+    if op == 2: return 'prime', bits(x)
+    if op in (3, 4, 5): return 'factor', bits(x)
+    return 'length', 0
+
+def guard_printf(s, t, cap):
+    if t[-1] != '\x9b': return 'length', 0
+    f = to_ps(t.value[-1])
+    widths = re.findall(r'%[-+ #0]*(\d*)(?:\.(\d*))?', f)
+    return 'length', sum(int(w or 0) + int(p or 0) for w, p in widths)
+
+# SandboxGS2 runs these on the stack before the op with the same first
+# byte, to find out how big its result would be before building it. Each
+# returns a (limit, size) pair; stacks the op would reject anyway may make
+# them raise, in which case the op goes ahead and fails on its own.
+GUARDS = {
+    '\x04': guard_printf,
+    '\x2e': lambda s, t, cap: ('length', num(s[-1])),
+    '\x2f': lambda s, t, cap: ('length', num(s[-1])),
+    '\x32': guard_mul,
+    '\x3e': lambda s, t, cap: ('bits', bits(s[-2]) * num(s[-1])),
+    '\x4e': lambda s, t, cap: ('length', num(s[-1])),
+    '\x4f': lambda s, t, cap: ('length', abs(num(s[-1]) - num(s[-2]))),
+    '\x69': guard_base,
+    '\x6b': guard_is_prime,
+    '\x6c': guard_primes,
+    '\x78': lambda s, t, cap: ('length', size(s[-1]) ** 2 // 2) if is_seq(s[-1])
+                              else ('bits', bits(s[-2]) + num(s[-1])),
+    '\x79': lambda s, t, cap: ('length', size(s[-1]) ** 2 // 2),
+    '\x7a': lambda s, t, cap: ('bits', bits(s[-2]) + 4 * num(s[-1])),
+    '\x7b': lambda s, t, cap: ('bits', 4 * num(s[-1])),
+    '\x7c': lambda s, t, cap: ('bits', num(s[-1])),
+    '\x7d': lambda s, t, cap: ('bits', 4 * num(s[-1])),
+    '\x7e': lambda s, t, cap: ('bits', num(s[-1])),
+    '\x7f': lambda s, t, cap: ('bits', 4 * num(s[-1])),
+    '\x81': lambda s, t, cap: ('length', num(s[-1])),
+    '\x83': lambda s, t, cap: ('length', size(s[-2]) * size(s[-1]) * 2),
+    '\x91': lambda s, t, cap: ('length', sum(n for n in s[-1] if is_num(n) and n > 0)),
+    '\x93': guard_permutations,
+    '\x94': guard_fold_product,
+    '\x95': lambda s, t, cap: ('length', power(size(s[-2]), num(s[-1]), cap) * num(s[-1])),
+    '\x96': lambda s, t, cap: ('length', choose(size(s[-2]), num(s[-1]), cap) * num(s[-1])),
+    '\x97': lambda s, t, cap: ('length', choose(size(s[-2]) + num(s[-1]) - 1, num(s[-1]), cap) * num(s[-1])),
+}
+
+class SandboxGS2(GS2):
+    r"""
+    An interpreter for untrusted programs. It counts the tokens it evaluates
+    and how deeply blocks nest, checks the size of what the expensive ops
+    are about to build (see GUARDS) and of every op's result, and keeps to a
+    wall-clock limit, raising ResourceLimit for whichever runs out first.
+    Running out of memory is reported as a ResourceLimit too.
+
+    The clock is only checked between tokens; the size limits are what keep
+    any single op short. Running out of memory reports the process's
+    address-space limit (see gs2batch.py), if it has one. Catastrophic
+    regexes aren't caught.
+
+    >>> def limit(code, **limits):
+    ...     try: SandboxGS2(code, '', **limits).evaluate(tokenize(code))
+    ...     except ResourceLimit as e: return e.kind
+    >>> limit('\x08\x09\x1c\x1c\x32\x1c\x32\x32', steps=10**5) # {} 10**9 times
+    'steps'
+    >>> limit('\x1c\x1c\x32\x7c'), limit('\x19\x2e\x93'), limit('\x1c\x40\x32\x1a\x32\x2e')
+    ('bits', 'length', 'length')
+    >>> limit('\x08\x40\x20\x09\x40\x20'), limit('\x1c\x2e\x08\x18\x09\x34\x2e')
+    ('depth', None)
+    >>> limit('\x11\x11\x69'), limit('\x12\x02\x80\x3e\x3e\x12\x6c')  # 1 1 base, 2 16000 pow 2 primes
+    ('length', 'prime')
+    """
+    LIMITS = {
+        'steps': 10**7,   # tokens and blocks evaluated
+        'depth': 100,     # blocks being evaluated inside one another
+        'length': 10**6,  # elements in a list built by one op
+        'bits': 1 << 16,  # size of an integer
+        'factor': 64,     # size of an integer to factor
+        'prime': 1 << 10, # size of an integer to test, or find the next prime
+        'time': 10.0,     # seconds
+    }
+
+    def __init__(self, code, stdin='', **limits):
+        GS2.__init__(self, code, stdin)
+        self.limits = dict(self.LIMITS, **limits)
+        self.steps = 0
+        self.depth = 0
+        self.deadline = time.time() + self.limits['time']
+
+    def evaluate(self, block):
+        limits = self.limits
+        if self.depth >= limits['depth']:
+            raise ResourceLimit('depth', limits['depth'])
+        self.depth += 1
+        ops = OPS
+        try:
+            self.tick()
+            for t in block.folded:
+                self.tick()
+                if isinstance(t, Block):
+                    self.stack.append(t)
+                    continue
+                guard = GUARDS.get(t[0])
+                if guard:
+                    self.guard(guard, t)
+                if t.__class__ is Constant:
+                    self.stack.append(copy_value(t.value, {}))
+                elif ops[t[0]](self, t):
+                    break
+                self.check_top()
+        except MemoryError:
+            raise ResourceLimit('memory', memory_limit())
+        finally:
+            self.depth -= 1
+
+    def tick(self):
+        self.steps += 1
+        if self.steps > self.limits['steps']:
+            raise ResourceLimit('steps', self.limits['steps'])
+        if not self.steps & 1023 and time.time() > self.deadline:
+            raise ResourceLimit('time', self.limits['time'])
+
+    def guard(self, guard, t):
+        cap = self.limits['length']
+        try:
+            kind, n = guard(self.stack, t, cap)
+        except Exception:
+            return
+        if n > self.limits[kind]:
+            raise ResourceLimit(kind, self.limits[kind])
+
+    def check_top(self):
+        if not self.stack: return
+        x = self.stack[-1]
+        if is_num(x) and x.bit_length() > self.limits['bits']:
+            raise ResourceLimit('bits', self.limits['bits'])
+        elif is_list(x) and len(x) > self.limits['length']:
+            raise ResourceLimit('length', self.limits['length'])
+
+# one-byte ops that fold_constants won't run ahead of time, because they
+# read the registers, the counter or random numbers, make blocks, or exit
+IMPURE = set('\x0c\x0f\x25\xb2' + ''.join(map(chr, range(0xc8, 0xe0))))
+
+# one-byte ops that can run for a long time in a single step, out of reach
+# of the sandbox's clock: base loops forever on a base of 1 or -1, and
+# primes may search a long way for the next prime. The sandbox's guards
+# stop them, but fold_constants runs for every program, so it leaves them
+# alone, like regexes, which can backtrack for ages.
+UNBOUNDED = set('\x69\x6c')
+
+# how many values each other op pops: the most any of its overloads does.
+# overloads that pop blocks don't count, since folded runs have no blocks;
+# ops with any other overload whose effect depends (*) don't fold at all.
+PURE_ARITY = {}
+for t, o in gs2ops.OPCODES.iteritems():
+    effects = [(p, q) for p, q in o.effects or () if 'b' not in p]
+    if (effects and t not in IMPURE | UNBOUNDED and not JUNK_REFS.match(t) and
+            not any('*' in p + q for p, q in effects)):
+        PURE_ARITY[t] = max(len(p) for p, q in effects)
+
+# limits on what fold_constants will evaluate and keep
+FOLD_LIMITS = {'steps': 10**4, 'length': 1 << 12, 'bits': 1 << 12,
+               'factor': 32, 'time': 1.0}
+
+# the most tokens fold_constants runs from any one start. Each run is
+# evaluated from scratch, so without this a long block of pure ops would
+# take time quadratic in its length.
+FOLD_RUN = 64
+
+def arity(t):
+    """
+    How many values a token pops, if fold_constants may run it; else None.
+    """
+    if isinstance(t, Block):
+        return None
+    elif len(t) == 1 or t[0] in '\x01\x02\x03\x07':
+        return PURE_ARITY.get(t[0])
+    elif t[0] == '\x04' and isinstance(t, Literal):
+        return {'\x05': 0, '\x06': 0}.get(t[-1])
+    return None
+
+def elements(x):
+    """
+    The size of a value fold_constants could keep: numbers, and lists of
+    them. Anything else (a float, say) raises TypeError.
+    """
+    if is_num(x):
+        return 1
+    elif is_list(x):
+        return 1 + sum(elements(y) for y in x)
+    raise TypeError('not a constant')
+
+def fold_constants(blocks):
+    r"""
+    Replace runs of tokens in blocks that only work on constants they push
+    themselves -- 3 range, uppercase-alphabet, 10 power-of-10 -- with
+    Constants, so that a block evaluated over and over doesn't recompute
+    them every time. The runs are evaluated in a SandboxGS2, and any that
+    fail or build something big are left alone. tokenize folds every block
+    but the main one, which is run once anyway. The folded code is kept
+    apart from the block's own, so the block still equals one with the
+    same tokens:
+
+    >>> b = tokenize('\x08\x1a\x7d\x30\x09\x34')   # { 10 power-of-10 + } map
+    >>> b.code[0].folded
+    ['\x1a', '}', '0']
+    >>> b.code[0].folded[0].tokens, b.code[0].folded[0].value
+    (('\x1a', '}'), 10000000000)
+    >>> b.code[0] == Block(['\x1a', '\x7d', '\x30'])
+    True
+    >>> b = tokenize('\x08' + '\x11\x11\x30' * 3000 + '\x09').code[0]
+    >>> len(b.code), len(b.folded)     # { 1 1 + 1 1 + ... }, 2 at a time
+    (9000, 3000)
+    >>> tokenize('\x08\x11\x12\x30\xa0\x09').code[0].folded     # junk
+    ['\x11', '\x12', '0', '\xa0']
+
+    Ops that a single step could spend forever in, like regexes, are
+    never run:
+
+    >>> code = '\x08\x04' + 'a' * 28 + '!\x05\x04(a+)+$\x9c\x09\x50'
+    >>> tokenize(code).code[0].folded   # { "aaa...a!" m( "(a+)+$" ) } pop
+    ['\x04aaaaaaaaaaaaaaaaaaaaaaaaaaaa!\x05', '\x04(a+)+$\x9c']
+    """
+    folded = {} # run -> fold_run's result
+    sandbox = None
+    for block in blocks:
+        code = list(block.code)
+        i = 0
+        while i < len(code):
+            t = code[i]
+            if arity(t) != 0:
+                i += 1
+                continue
+            # a lone literal is as quick as a Constant
+            end = i + 1
+            while (end < len(code) and end - i < FOLD_RUN and
+                   arity(code[end]) is not None):
+                end += 1
+            if end == i + 1 and isinstance(t, Literal):
+                i += 1
+                continue
+
+            run = tuple(code[i:end])
+            if run not in folded:
+                if sandbox is None:
+                    state = random.getstate() # GS2() takes a random number
+                    sandbox = SandboxGS2('', '', **FOLD_LIMITS)
+                    random.setstate(state)
+                folded[run] = fold_run(sandbox, run)
+            n, value = folded[run]
+            if n > 1 or (n == 1 and not isinstance(t, Literal)):
+                code[i:i + n] = [Constant(run[:n], value)]
+            i += 1
+        if len(code) < len(block.code):
+            block.__dict__['folded'] = code
+
+def fold_run(sandbox, run):
+    """
+    Evaluate as much of run as pops only what it pushed, and return (n,
+    value) for the longest part of it, run[:n], that leaves one value;
+    (0, None) if none does.
+    """
+    sandbox.steps = 0
+    sandbox.deadline = time.time() + sandbox.limits['time']
+    sandbox.stack = Stack()
+    best = 0
+    for n, t in enumerate(run):
+        if arity(t) > len(sandbox.stack):
+            break
+        try:
+            sandbox.evaluate(Block([t]))
+        except Exception:
+            break
+        if len(sandbox.stack) == 1:
+            best = n + 1
+    if not best:
+        return 0, None
+
+    # again, as later tokens may have changed the value in place
+    sandbox.steps = 0
+    sandbox.deadline = time.time() + sandbox.limits['time']
+    sandbox.stack = Stack()
+    try:
+        sandbox.evaluate(Block(list(run[:best])))
+    except Exception:
+        return 0, None
+    value = force(sandbox.stack[-1])
+    try:
+        if elements(value) <= sandbox.limits['length']:
+            return best, value
+    except TypeError:
+        pass
+    return 0, None
+
+# tokens whose result depends on more than the values they pop: the
+# registers, the counter, random numbers and the junk
+SIDE_EFFECTS = (IMPURE - set('\x0c\x0f')) | set(map(chr, range(0xa0, 0xb0)))
+
+# the kinds of value an overload taking each type could be popping, and
+# the kinds one giving each type could push (popping forces lazy values)
+ACCEPTS = {'n': 'n', 'l': 'lz', 's': 'lz', 'b': 'b', 'a': KINDS}
+GIVES = {'n': 'n', 'l': 'l', 's': 'lz', 'b': 'b', 'a': KINDS}
+KIND_OF = {int: 'n', long: 'n', bool: 'n', list: 'l', ByteString: 'l',
+           LazySeq: 'z', Slice: 'z', Block: 'b'}
+
+Effect = namedtuple('Effect', 'needs leaves pure overloads')
+
+def kinds(values):
+    """
+    The kinds of the values in a list, as a string in KINDS order.
+    """
+    found = ''.join(KIND_OF.get(t, KINDS) for t in set(map(type, values)))
+    return ''.join(k for k in KINDS if k in found)
+
+def token_effects(t):
+    r"""
+    The overloads a token (not a block) might run, as (popped, pushed)
+    pairs like those in gs2ops; None if the token alone doesn't tell.
+    Literals, Constants among them, aren't in gs2ops: they just push.
+
+    >>> token_effects(Constant(('\x13', '\x2e'), [0, 1, 2]))  # 3 range
+    (('', 'l'),)
+    """
+    if not isinstance(t, Literal):
+        o = gs2ops.OPCODES.get(t)
+        return o and o.effects
+    elif t[0] != '\x04':
+        return (('', 'n' if is_num(t.value) else 'l'),)
+    return {'\x05': (('', 'l' * len(t.value)),), '\x06': (('', 'l'),),
+            '\x9c': (('a', 'n'),), '\x9d': (('a', 'l'),),
+            '\x9e': (('a', 'l'),), '\x9f': (('a', 'l'),)}.get(t[-1])
+
+def analyze(block, top=KINDS):
+    r"""
+    Work out what evaluating block does to the stack from the #: comments
+    of the ops in it, given the kinds of the value on top when it starts
+    (the values under that could be anything.) Returns an Effect:
+
+        needs      how many of the values it started with it takes
+        leaves     the kinds of each value it leaves in their place
+        pure       whether it, and every block in it, depends only on the
+                   values it takes: no registers, counter, random numbers
+                   or junk, and no evaluating blocks it was handed
+        overloads  (index, token, overloads) for each of \x30 to \x3f it
+                   reaches, with the overloads that might run there
+
+    needs and leaves are None if a token might exit, evaluate a block, or
+    do something that depends on more than the kinds of its values.
+
+    >>> analyze(tokenize('\x08\x13\x30\x09').code[0])     # { 3 + }
+    Effect(needs=1, leaves=('nl',), pure=True, overloads=((1, '0', (('nn', 'n'), ('ln', 'l'))),))
+    >>> analyze(tokenize('\x08\x12\x32\x09').code[0]).needs   # { 2 * }
+    >>> analyze(tokenize('\x08\x12\x32\x09').code[0], 'n')[:3]
+    (1, ('n',), True)
+    >>> analyze(tokenize('\x08\x40\xb2\x30\x09').code[0])[:3] # { dup counter + }
+    (1, ('nlzb', 'nl'), False)
+    >>> analyze(tokenize('\x08\x08\x40\x09\x34\x09').code[0]).pure
+    True
+    """
+    stack = [] # (kinds, whether it might hold a block it was handed)
+    taken = [0]
+    def peek(k):
+        if k < len(stack):
+            return stack[-1 - k]
+        return (top if k - len(stack) + taken[0] == 0 else KINDS, True)
+
+    pure = True
+    known = True
+    overloads = []
+    for i, t in enumerate(block.folded):
+        if isinstance(t, Block):
+            pure = pure and t.effect().pure
+            stack.append(('b', False))
+            continue
+        if t in SIDE_EFFECTS:
+            pure = False
+        effects = token_effects(t)
+        if not known:
+            if any('b' in p for p, q in effects or ()):
+                pure = False
+            continue
+
+        matched = []
+        for p, q in effects or ():
+            types = p.lstrip('*')[::-1]
+            if all(set(ACCEPTS[c]) & set(peek(k)[0])
+                   for k, c in enumerate(types)):
+                matched.append((p, q))
+        if '\x30' <= t <= '\x3f':
+            overloads.append((i, t, tuple(matched)))
+        for p, q in matched:
+            for k, c in enumerate(p.lstrip('*')[::-1]):
+                if c == 'b' and peek(k)[1]:
+                    pure = False
+        if (not matched or t == '\x0f' or
+                any('b' in p or '*' in p + q for p, q in matched) or
+                len(set((len(p), len(q)) for p, q in matched)) > 1):
+            known = False
+            continue
+
+        n, m = len(matched[0][0]), len(matched[0][1])
+        tainted = any(peek(k)[1] for k in xrange(n))
+        below = max(0, n - len(stack))
+        del stack[len(stack) - n + below:]
+        taken[0] += below
+        for k in xrange(m):
+            given = ''.join(GIVES[q[k]] for p, q in matched)
+            stack.append((''.join(c for c in KINDS if c in given), tainted))
+
+    if not known:
+        return Effect(None, None, pure, tuple(overloads))
+    return Effect(taken[0], tuple(k for k, _ in stack), pure, tuple(overloads))
+
+class TraceSink(object):
+    r"""
+    Collects trace events, and writes them to a file as JSON lines a batch
+    at a time. The token in an op event is kept as it is until then, and
+    written in hex.
+
+    >>> f = cStringIO.StringIO()
+    >>> g = TraceGS2('\xb2\xb2\x30\x50', '', TraceSink(f, size=2))
+    >>> ok = g.run()      # counter counter + pop
+    >>> print f.getvalue(),
+    ["block", 1, 4]
+    ["op", 1, "b2", 1]
+    ["op", 1, "b2", 2]
+    ["op", 1, "30", 3]
+    ["op", 1, "50", 2]
+    """
+    def __init__(self, f, size=4096):
+        self.f = f
+        self.size = size
+        self.events = []
+
+    def add(self, event):
+        self.events.append(event)
+        if len(self.events) >= self.size:
+            self.flush()
+
+    def flush(self):
+        for e in self.events:
+            if e[0] == 'op':
+                e[2] = e[2].encode('hex')
+        self.f.write(''.join(json.dumps(e) + '\n' for e in self.events))
+        del self.events[:]
+
+class TraceGS2(GS2):
+    r"""
+    An interpreter that reports what it does to a TraceSink: a
+    ["block", depth, length] event for every block it evaluates and an
+    ["op", depth, token, stack size] event for every op, tokens in hex.
+    The plain interpreter has no tracing in it at all, so leaving this off
+    costs nothing; turning it on costs a tuple per op.
+
+    >>> f = cStringIO.StringIO()
+    >>> g = TraceGS2('\x12\x2e\x08\x40\x09\x34\x50', '', TraceSink(f))
+    >>> ok = g.run()      # 2 range { dup } map pop
+    >>> print f.getvalue(),
+    ["block", 1, 6]
+    ["op", 1, "12", 1]
+    ["op", 1, "2e", 2]
+    ["op", 1, "00", 3]
+    ["op", 1, "34", 3]
+    ["block", 2, 1]
+    ["op", 2, "40", 2]
+    ["block", 2, 1]
+    ["op", 2, "40", 4]
+    ["op", 1, "50", 2]
+    """
+    def __init__(self, code, stdin='', sink=None):
+        GS2.__init__(self, code, stdin)
+        self.sink = sink or TraceSink(sys.stderr)
+        self.depth = 0
+
+    def run(self):
+        try:
+            return GS2.run(self)
+        finally:
+            self.sink.flush()
+
+    def stream(self, lines, mode):
+        try:
+            GS2.stream(self, lines, mode)
+        finally:
+            self.sink.flush()
+
+    def evaluate(self, block):
+        add = self.sink.add
+        self.depth += 1
+        add(['block', self.depth, len(block.folded)])
+        ops = OPS
+        try:
+            for t in block.folded:
+                if isinstance(t, Block):
+                    self.stack.append(t)
+                    continue
+                add(['op', self.depth, t, len(self.stack)])
+                if t.__class__ is Constant:
+                    self.stack.append(copy_value(t.value, {}))
+                elif ops[t[0]](self, t):
+                    break
+        finally:
+            self.depth -= 1
+
+def source(block):
+    """
+    The code of a block, with nested blocks written out in full.
+    """
+    return ''.join('\x08' + source(t) + '\x09' if is_block(t) else t
+                   for t in block.code)
+
+class ProfileGS2(GS2):
+    r"""
+    An interpreter that records, for every opcode byte, how often it ran, the
+    time spent in it (total, and excluding blocks it evaluated) and how many
+    elements the lists it left on top of the stack had; and for every block,
+    how often it was evaluated and for how long. report() sums it up.
+
+    >>> g = ProfileGS2('\x1a\x2e\x08\x40\x32\x09\x34')    # 10 range { dup * } map
+    >>> g.evaluate(tokenize(g.code))
+    >>> r = g.report()
+    >>> sorted((o['op'], o['name'], o['count'], o['elements'])
+    ...        for o in r['ops'] if o['op'] in ('32', '34'))
+    [('32', 'mul', 10, 0), ('34', 'mod', 1, 10)]
+    >>> sorted((b['code'], b['count']) for b in r['blocks'])
+    [('1a2e084032090034', 1), ('4032', 10)]
+    """
+    def __init__(self, *args):
+        GS2.__init__(self, *args)
+        self.ops = {}      # first byte -> [count, total, self time, elements]
+        self.blocks = {}   # id -> [block, count, total]
+        self.inner = 0.0   # time spent in ops nested in the current one
+
+    def evaluate(self, block):
+        clock = time.time
+        t_block = clock()
+        ops = OPS
+        for t in block.folded:
+            if isinstance(t, Block):
+                self.stack.append(t)
+                continue
+            elif t.__class__ is Constant: # paid for by tokenize
+                self.stack.append(copy_value(t.value, {}))
+                continue
+            outer, self.inner = self.inner, 0.0
+            t0 = clock()
+            stop = ops[t[0]](self, t)
+            dt = clock() - t0
+
+            stats = self.ops.get(t[0])
+            if stats is None:
+                stats = self.ops[t[0]] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += dt
+            stats[2] += dt - self.inner
+            if self.stack and is_list(self.stack[-1]):
+                stats[3] += len(self.stack[-1])
+            self.inner = outer + dt
+            if stop: break
+
+        stats = self.blocks.get(id(block))
+        if stats is None:
+            stats = self.blocks[id(block)] = [block, 0, 0.0]
+        stats[1] += 1
+        stats[2] += clock() - t_block
+
+    def report(self):
+        """
+        The profile as a dict of lists, hottest first, ready for json.dump.
+        Opcodes are in hex, and named after their handlers.
+        """
+        ops = [{'op': b.encode('hex'), 'name': gs2ops.OPCODES[b].name,
+                'count': n, 'time': total, 'self_time': own, 'elements': e}
+               for b, (n, total, own, e) in self.ops.iteritems()]
+        ops.sort(key=lambda o: -o['self_time'])
+
+        merged = {}
+        for block, n, total in self.blocks.itervalues():
+            stats = merged.setdefault(source(block), [0, 0.0])
+            stats[0] += n
+            stats[1] += total
+        blocks = [{'code': code.encode('hex'), 'count': n, 'time': total}
+                  for code, (n, total) in merged.iteritems()]
+        blocks.sort(key=lambda b: -b['time'])
+        return {'ops': ops, 'blocks': blocks}
 
 if __name__ == '__main__':
     ## doctest.testmod() ## <- Uncomment to run tests.
+    usage = ('usage: python %s [-d] [-c] [-s] [--profile <json file>] '
+             '<code file>' % sys.argv[0])
     if len(sys.argv) <= 1:
-        print >> sys.stderr, 'usage: python %s [-d] <code file>' % sys.argv[0]
+        print >> sys.stderr, usage
         sys.exit(1)
 
-    if sys.argv[1] == '-d':
-        DEBUG = True
-        sys.argv.pop(1)
+    backend = GS2
+    profile = None
+    while len(sys.argv) > 2 and sys.argv[1].startswith('-'):
+        flag = sys.argv.pop(1)
+        if flag == '-d':
+            DEBUG = True
+            backend = TraceGS2
+        elif flag == '-c':
+            backend = CompiledGS2
+        elif flag == '-s':
+            backend = SandboxGS2
+        elif flag == '--profile' and len(sys.argv) > 2:
+            backend = ProfileGS2
+            profile = sys.argv.pop(1)
+        else:
+            print >> sys.stderr, usage
+            sys.exit(1)
 
     code = open(sys.argv[1], 'rb').read()
-    stdin = '' if sys.stdin.isatty() else sys.stdin.read()
-    GS2(code, stdin).run()
+    mode = None if sys.stdin.isatty() else stream_mode(code)
+    nbytes = STREAM_THRESHOLD if mode else -1
+    stdin = '' if sys.stdin.isatty() else sys.stdin.read(nbytes)
+    try:
+        if mode and len(stdin) == STREAM_THRESHOLD:
+            # finish the current line, then hand over to the rest of stdin
+            head = cStringIO.StringIO(stdin + sys.stdin.readline())
+            g = backend(code)
+            g.stream(it.chain(head, sys.stdin), mode)
+        else:
+            g = backend(code, stdin)
+            g.run()
+    except ResourceLimit as e:
+        print >> sys.stderr, 'gs2: %s' % e
+        sys.exit(2)
+
+    if profile:
+        with open(profile, 'w') as f:
+            json.dump(g.report(), f, indent=1)
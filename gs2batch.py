@@ -0,0 +1,153 @@
+# gs2 batch runner
+# (c) nooodl 2014
+#
+# usage: python gs2batch.py [-c | -s] [-j workers] [-t seconds] [-m megabytes] [manifest]
+#
+# Runs every job in a JSON-lines manifest (or stdin) on a pool of worker
+# processes that import gs2 once, and writes one JSON line per job, in the
+# same order, to stdout. A job looks like
+#
+#     {"id": 1, "code": "V/...", "stdin": "7\n"}
+#
+# where "code" may be replaced by "file", a path to a compiled program.
+# Since programs and their output are bytes, strings on both sides are
+# latin-1: character n stands for byte n. Results look like
+#
+#     {"id": 1, "status": "ok", "stdout": "...", "stderr": ""}
+#
+# where status is "ok", "error" (the program failed, and quined, or the
+# job itself couldn't be loaded) or "timeout" (stdout then holds whatever
+# it printed before.) With -s, jobs run in gs2's sandbox, and a job that
+# goes over one of its limits gets status "limit", with "limit" naming
+# which one.
+
+import cStringIO
+import getopt
+import json
+import multiprocessing
+import resource
+import signal
+import sys
+
+import gs2
+
+class Timeout(BaseException):
+    # not an Exception, so GS2.run doesn't catch it
+    pass
+
+def alarm(signum, frame):
+    raise Timeout()
+
+def init_worker(memory=None):
+    signal.signal(signal.SIGALRM, alarm)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+def load_job(job):
+    """
+    The code and stdin of a job, as byte strings.
+    """
+    if 'file' in job:
+        with open(job['file'], 'rb') as f:
+            code = f.read()
+    else:
+        code = job['code'].encode('latin-1')
+    return code, job.get('stdin', u'').encode('latin-1')
+
+def run_job(args):
+    """
+    Run one job and return its result. A job that can't be loaded (a
+    missing file or key, a character past latin-1) fails on its own:
+
+    >>> r = run_job(({'id': 2, 'file': '/nonexistent/prog.gs2'}, gs2.GS2, 1.0))
+    >>> r['id'], r['status'], r['stdout'], r['stderr'].split(':')[:2]
+    (2, 'error', u'', [u'gs2batch', u' IOError'])
+    >>> run_job(({'id': 3, 'code': u'\u2603'}, gs2.GS2, 1.0))['status']
+    'error'
+
+    A job stopped part way may have left gs2's module-level state (the
+    prime sieve, say) half updated, so gs2 is reloaded after one:
+
+    >>> _ = signal.signal(signal.SIGALRM, alarm)
+    >>> sieve_bits = gs2.sieve_bits
+    >>> forever = u'\x11\x11\x69'    # 1 1 base
+    >>> run_job(({'id': 4, 'code': forever}, gs2.GS2, 0.05))['status']
+    'timeout'
+    >>> gs2.sieve_bits is sieve_bits
+    False
+    """
+    job, backend, timeout = args
+    result = {'id': job.get('id') if isinstance(job, dict) else None}
+    try:
+        code, stdin = load_job(job)
+    except Exception as e:
+        result.update(status='error', stdout=u'',
+                      stderr=u'gs2batch: %s: %s\n' % (type(e).__name__, e))
+        return result
+
+    out, err = cStringIO.StringIO(), cStringIO.StringIO()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = out, err
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            status = 'ok' if backend(code, stdin).run() else 'error'
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except Timeout:
+        status = 'timeout'
+    except gs2.ResourceLimit as e:
+        status = 'limit'
+        result['limit'] = e.kind
+        print >> err, 'gs2: %s' % e
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    if status == 'timeout' or result.get('limit') == 'memory':
+        reload(gs2)
+
+    result.update(status=status,
+                  stdout=out.getvalue().decode('latin-1'),
+                  stderr=err.getvalue().decode('latin-1'))
+    return result
+
+def run_batch(jobs, backend=gs2.GS2, workers=None, timeout=10.0, memory=None):
+    """
+    Run an iterable of job dicts, yielding result dicts in the same order.
+    memory caps each worker's address space, in bytes.
+    """
+    pool = multiprocessing.Pool(workers, init_worker, (memory,))
+    try:
+        args = ((job, backend, timeout) for job in jobs)
+        for result in pool.imap(run_job, args):
+            yield result
+    finally:
+        pool.terminate()
+
+if __name__ == '__main__':
+    usage = ('usage: python %s [-c | -s] [-j workers] [-t seconds] '
+             '[-m megabytes] [manifest]' % sys.argv[0])
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'csj:t:m:')
+    except getopt.GetoptError:
+        print >> sys.stderr, usage
+        sys.exit(1)
+
+    backend, workers, timeout, memory = gs2.GS2, None, 10.0, None
+    for flag, value in opts:
+        if flag == '-c':
+            backend = gs2.CompiledGS2
+        elif flag == '-s':
+            backend = gs2.SandboxGS2
+        elif flag == '-j':
+            workers = int(value)
+        elif flag == '-t':
+            timeout = float(value)
+        elif flag == '-m':
+            memory = int(value) << 20
+
+    manifest = open(args[0]) if args else sys.stdin
+    jobs = (json.loads(line) for line in manifest if line.strip())
+    for result in run_batch(jobs, backend, workers, timeout, memory):
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
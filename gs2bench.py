@@ -0,0 +1,251 @@
+# gs2 benchmarks
+# (c) nooodl 2014
+
+import json
+import resource
+import struct
+import subprocess
+import sys
+import time
+
+import gs2
+
+# cheap probes spread over the opcode space; each leaves the stack as it
+# found it, so they can be repeated any number of times.
+DISPATCH_PROBES = [
+    ('nop',          ['\x00']),
+    ('0 pop',        ['\x10', '\x50']),
+    ('256 pop',      ['\x1f', '\x50']),
+    ('dup pop',      ['\x40', '\x50']),
+    ('@0 pop',       ['\xa0', '\x50']),
+    ('counter pop',  ['\xb2', '\x50']),
+    ('save-a',       ['\xc8']),
+    ('push-d pop',   ['\xd3', '\x50']),
+]
+
+def bench_dispatch(repeat=20000, rounds=5):
+    """
+    Time each probe and report the cost per evaluated token. With table
+    dispatch these should be roughly equal wherever the opcode lives.
+    """
+    results = []
+    for name, probe in DISPATCH_PROBES:
+        block = gs2.tokenize(''.join(probe) * repeat)
+        best = None
+        for _ in xrange(rounds):
+            g = gs2.GS2('', '')
+            g.stack[:] = [0, 0]
+            g.stack.pop()
+            t0 = time.time()
+            g.evaluate(block)
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+        results.append((name, best * 1e9 / len(block.code)))
+    return results
+
+# {3 range pop} n times: every iteration pops a fresh list into the junk.
+MEMORY_LOOP = '\x08\x13\x2e\x50\x09\x03%s\x32'
+
+def peak_rss(code, stdin=''):
+    """
+    Run code in a fresh interpreter and return its peak RSS, in kilobytes
+    (in bytes on OS X, which is what ru_maxrss reports there.)
+    """
+    child = subprocess.Popen([sys.executable, __file__, '--rss', code.encode('hex')],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    out, _ = child.communicate(stdin)
+    return int(out)
+
+def bench_memory(sizes=(10**4, 10**5, 10**6)):
+    """
+    Peak RSS of a loop that pops n lists. It should stay flat as n grows.
+    """
+    return [(n, peak_rss(MEMORY_LOOP % struct.pack('<l', n))) for n in sizes]
+
+# literals, strings and a block, leaving the stack as it found it
+TOKENIZE_UNIT = ('\x01\x05\x02\x00\x01\x30\x50\x04ab\x07c\x05\x51'
+                 '\x08\x40\x50\x09\x50\x07x\x50')
+
+def bench_tokenize(sizes=(10**4, 10**5, 10**6), rounds=3):
+    """
+    Time tokenizing programs of about n bytes and report the cost per byte,
+    which should stay flat as n grows.
+    """
+    results = []
+    for n in sizes:
+        prog = TOKENIZE_UNIT * (n // len(TOKENIZE_UNIT))
+        best = None
+        for _ in xrange(rounds):
+            t0 = time.time()
+            gs2.tokenize(prog)
+            dt = time.time() - t0
+            best = dt if best is None else min(best, dt)
+        results.append((len(prog), best * 1e9 / len(prog)))
+    return results
+
+def lit(n):
+    return '\x03' + struct.pack('<l', n)
+
+def text(lines):
+    return ''.join('line %d: the quick brown fox %d jumps over %d\n'
+                   % (i, i * 7919 % 10007, i * i % 997) for i in xrange(lines))
+
+# (name, code, lines of stdin) programs that each lean on one hot path.
+# They're meant to run for a good fraction of a second apiece; the stdin is
+# generated by text(), so every run sees the same input.
+CORPUS = [
+    # line-mode: reverse every line
+    ('line-mode',     '\x30\x20', 100000),
+    # pop 300 range { 300 range { over + 3 % } filter length + } map sum
+    ('nested-map',    '\x50' + lit(300) + '\x2e\x08' + lit(300) +
+                      '\x2e\x08\x45\x30\x13\x34\x09\x35\x2e\x30\x09\x34\x64', 0),
+    # pop n range dup 3 step diff n range 2 step and n range or uniq length
+    ('set-ops',       '\x50' + lit(200000) + '\x2e\x40\x13\x34\x31' +
+                      lit(200000) + '\x2e\x12\x34\x35' + lit(200000) +
+                      '\x2e\x36\x90\x2e', 0),
+    # pop n range { 7919 * 10007 % } sort head
+    ('sort-by',       '\x50' + lit(100000) + '\x2e\x08\x02\xef\x1e\x32' +
+                      '\x02\x17\x27\x34\x09\x2f\x21', 0),
+    # pop 300000 0 primes sum  4000000 1 primes length
+    ('primes',        '\x50' + lit(300000) + '\x10\x6c\x64' + lit(4000000) +
+                      '\x11\x6c\x2e', 0),
+    # pop 2000 range { 1000000 dup * + 4 primes length } map sum
+    ('factor',        '\x50' + lit(2000) + '\x2e\x08' + lit(1000000) +
+                      '\x40\x32\x30\x14\x6c\x2e\x09\x34\x64', 0),
+    # line-mode: "[aeiou]" "*" regex-sub
+    ('regex-sub',     '\x30\x04[aeiou]\x07*\x9d', 100000),
+    # "\s+" regex-split length
+    ('regex-split',   '\x04\\s+\x9f\x2e', 100000),
+    # pop 8 range permutations { head 3 = } filter length
+    #     24 range 4 combinations { sum 7 % } filter length
+    ('combinatorics', '\x50\x18\x2e\x93\x08\x21\x13\x71\x09\x35\x2e' +
+                      '\x01\x18\x2e\x14\x96\x08\x64\x17\x34\x09\x35\x2e', 0),
+    # pop 300000 range { + } fold  20000 range { + } scan length
+    ('fold-scan',     '\x50' + lit(300000) + '\x2e\x08\x30\x09\x32' +
+                      lit(20000) + '\x2e\x08\x30\x09\x6d\x2e', 0),
+    # pop 20000 range { uppercase-alphabet 3 range * length + } map sum
+    ('constants',     '\x50' + lit(20000) + '\x2e\x08\x84\x13\x2e\x32\x2e\x30' +
+                      '\x09\x34\x64', 0),
+    # a long program of literals, strings and blocks that leaves no trace
+    ('tokenize',      '\x50' + TOKENIZE_UNIT * 20000, 0),
+]
+
+class CountGS2(gs2.GS2):
+    # counts tokens a block at a time, so the per-token path is unchanged;
+    # a block cut short by exit still counts in full, and a block with
+    # Constants in it counts as the tokens it was written with.
+    tokens = 0
+
+    def evaluate(self, block):
+        self.tokens += len(block.code)
+        gs2.GS2.evaluate(self, block)
+
+def run_case(name):
+    """
+    Run one corpus program start to finish -- tokenize, evaluate, and show
+    the stack -- and return (tokens evaluated, seconds, peak RSS).
+    """
+    code, lines = [(c, i) for n, c, i in CORPUS if n == name][0]
+    g = CountGS2(code, text(lines))
+    t0 = time.time()
+    g.evaluate(gs2.tokenize(code))
+    ''.join(map(gs2.show, g.stack))
+    dt = time.time() - t0
+    return g.tokens, dt, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def bench_corpus(names=None, rounds=3):
+    """
+    Run each corpus program `rounds` times, each in a fresh interpreter so
+    that module-level caches (the sieve, factorizations) start cold, and
+    keep the best time and the smallest peak RSS of each.
+    """
+    results = {}
+    for name, _, _ in CORPUS:
+        if names and name not in names:
+            continue
+        runs = []
+        for _ in xrange(rounds):
+            child = subprocess.Popen([sys.executable, __file__, '--case', name],
+                                     stdout=subprocess.PIPE)
+            runs.append(json.loads(child.communicate()[0]))
+        tokens = runs[0][0]
+        seconds = min(r[1] for r in runs)
+        results[name] = {'tokens': tokens, 'seconds': seconds,
+                         'ops_per_sec': tokens / seconds,
+                         'peak_kb': min(r[2] for r in runs)}
+    return results
+
+# how much slower, or hungrier, than the baseline a case may get before
+# --compare calls it a regression
+TOLERANCE = 0.2
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Return (name, speed ratio, memory ratio, regressed) for every case in
+    both results and baseline. Ratios above 1 are better for speed and
+    worse for memory.
+    """
+    rows = []
+    for name, _, _ in CORPUS:
+        if name not in results or name not in baseline:
+            continue
+        new, old = results[name], baseline[name]
+        speed = new['ops_per_sec'] / old['ops_per_sec']
+        memory = float(new['peak_kb']) / old['peak_kb']
+        rows.append((name, speed, memory,
+                     speed < 1 - tolerance or memory > 1 + tolerance))
+    return rows
+
+if __name__ == '__main__':
+    usage = ('usage: python %s [--save <json file> | --compare <json file>] '
+             '[case ...]' % sys.argv[0])
+    if sys.argv[1:2] == ['--rss']:
+        g = gs2.GS2('', sys.stdin.read())
+        g.evaluate(gs2.tokenize(sys.argv[2].decode('hex')))
+        print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        sys.exit()
+    if sys.argv[1:2] == ['--case']:
+        print json.dumps(run_case(sys.argv[2]))
+        sys.exit()
+
+    save = baseline = None
+    args = sys.argv[1:]
+    while args and args[0].startswith('-'):
+        flag = args.pop(0)
+        if flag == '--save' and args:
+            save = args.pop(0)
+        elif flag == '--compare' and args:
+            with open(args.pop(0)) as f:
+                baseline = json.load(f)
+        else:
+            print >> sys.stderr, usage
+            sys.exit(1)
+    unknown = set(args) - set(name for name, _, _ in CORPUS)
+    if unknown:
+        print >> sys.stderr, 'unknown cases: ' + ' '.join(sorted(unknown))
+        sys.exit(1)
+
+    if not args:
+        for name, ns in bench_dispatch():
+            sys.stdout.write('%-14s %8.1f ns/token\n' % (name, ns))
+        for n, kb in bench_memory():
+            sys.stdout.write('loop %-9d %8d kB peak\n' % (n, kb))
+        for n, ns in bench_tokenize():
+            sys.stdout.write('tokenize %-9d %8.1f ns/byte\n' % (n, ns))
+
+    results = bench_corpus(args)
+    for name, _, _ in CORPUS:
+        if name in results:
+            r = results[name]
+            sys.stdout.write('%-14s %10d ops/s %7.3f s %8d kB peak\n' %
+                             (name, r['ops_per_sec'], r['seconds'], r['peak_kb']))
+    if save:
+        with open(save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if baseline:
+        regressed = False
+        for name, speed, memory, worse in compare(results, baseline):
+            sys.stdout.write('%-14s %6.2fx speed %6.2fx memory%s\n' %
+                             (name, speed, memory, '  REGRESSION' if worse else ''))
+            regressed = regressed or worse
+        sys.exit(1 if regressed else 0)
@@ -1,48 +1,137 @@
 # gs2 compiler (version 0.2)
 # (c) nooodl 2014
 
+import ast
+import getopt
+import os
 import re
 import struct
 import sys
 
+from collections import OrderedDict, namedtuple
+
 if sys.platform == "win32":
-    import os, msvcrt
+    import msvcrt
     msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
 
-mnemonics = {}
-with open('gs2.py') as f:
-    for line in f:
-        if '#=' in line:
+# the optimizer and server import gs2, json and random where they need
+# them, so that a plain compile doesn't pay for loading the interpreter
+import gs2ops
+
+mnemonics = gs2ops.MNEMONICS
+
+GS2_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gs2.py')
+OPS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gs2ops.py')
+
+def scan_ops(source):
+    """
+    Read the opcode table out of gs2.py's source: mnemonics from the #=
+    comments, handlers from the @op decorators, and stack effects from the
+    #: comments on the handlers' def lines. Returns a dict of byte ->
+    (name, mnemonics, effects), where effects is None for syntax.
+    """
+    names = {}
+    primary = {}  # the mnemonics on a handler's own @op line
+    handlers = {}
+    lines = source.split('\n')
+    for n, line in enumerate(lines):
+        if '#=' in line and not line.strip().startswith('#'):
             a, b = line.split('#=')
             a = re.findall(r'\\x(..)', a.strip())
             b = b.strip().split(', ')
             assert len(a) == len(b)
             for i, j in zip(a, b):
-                for k in j.split():
-                    mnemonics[k] = chr(int(i, 16))
-
-mnemonics["'"] = '\xe0'  # block1
-
-for i in xrange(16):
-    mnemonics['@%d' % i]    = chr(0xA0 | i)
-    mnemonics['junk%d' % i] = chr(0xA0 | i)
-for i, c in enumerate('abcd'):
-    mnemonics['save-%s' % c] = chr(0xC8 | i)
-    mnemonics['pop-%s' % c]  = chr(0xCC | i)
-    mnemonics['push-%s' % c] = chr(0xD0 | i)
-    mnemonics['nip-%s' % c]  = chr(0xD4 | i)
-    mnemonics['tuck-%s' % c] = chr(0xD8 | i)
-    mnemonics['show-%s' % c] = chr(0xDC | i)
-for i in xrange(8):
-    mnemonics['b%d'      % (i+1)] = chr(0xE0 | i)
-    mnemonics['block%d'  % (i+1)] = chr(0xE0 | i)
-    mnemonics['m%d'      % (i+1)] = chr(0xE8 | i)
-    mnemonics['map%d'    % (i+1)] = chr(0xE8 | i)
-    mnemonics['f%d'      % (i+1)] = chr(0xF0 | i)
-    mnemonics['filter%d' % (i+1)] = chr(0xF0 | i)
-    if 0xF8 | i < 0xFD:
-        mnemonics['t%d'      % (i+1)] = chr(0xF8 | i)
-        mnemonics['both%d'   % (i+1)] = chr(0xF8 | i)
+                names.setdefault(chr(int(i, 16)), []).extend(j.split())
+                if line.strip().startswith('@op('):
+                    primary[chr(int(i, 16))] = j.split()
+        if line.strip().startswith('@op('):
+            args = line.split('#')[0].strip()[len('@op('):-1]
+            tokens = eval('(lambda *a: a)(%s)' % args)
+            handler, effects = lines[n + 1].split('#:')
+            handler = re.search(r'def op_(\w+)', handler).group(1)
+            effects = effects.strip().split(', ')
+            if len(effects) == 1:
+                effects *= len(tokens)
+            assert len(effects) == len(tokens)
+            for t, e in zip(tokens, effects):
+                handlers[t] = (handler.replace('_', '-'),
+                               tuple(tuple(x.split('>')) for x in e.split()))
+
+    extra = [("'", '\xe0')]  # block1
+    for i in xrange(16):
+        extra.append(('@%d' % i,    chr(0xA0 | i)))
+        extra.append(('junk%d' % i, chr(0xA0 | i)))
+    for i, c in enumerate('abcd'):
+        extra.append(('save-%s' % c, chr(0xC8 | i)))
+        extra.append(('pop-%s' % c,  chr(0xCC | i)))
+        extra.append(('push-%s' % c, chr(0xD0 | i)))
+        extra.append(('nip-%s' % c,  chr(0xD4 | i)))
+        extra.append(('tuck-%s' % c, chr(0xD8 | i)))
+        extra.append(('show-%s' % c, chr(0xDC | i)))
+    for i in xrange(8):
+        extra.append(('b%d'      % (i+1), chr(0xE0 | i)))
+        extra.append(('block%d'  % (i+1), chr(0xE0 | i)))
+        extra.append(('m%d'      % (i+1), chr(0xE8 | i)))
+        extra.append(('map%d'    % (i+1), chr(0xE8 | i)))
+        extra.append(('f%d'      % (i+1), chr(0xF0 | i)))
+        extra.append(('filter%d' % (i+1), chr(0xF0 | i)))
+        if 0xF8 | i < 0xFD:
+            extra.append(('t%d'      % (i+1), chr(0xF8 | i)))
+            extra.append(('both%d'   % (i+1), chr(0xF8 | i)))
+    for k, t in extra:
+        names.setdefault(t, []).append(k)
+
+    ops = {}
+    for t in set(names) | set(handlers):
+        handler, effects = handlers.get(t, (None, None))
+        ms = tuple(names.get(t, ()))
+        name = ([m for m in primary.get(t, ms) if m[0].isalpha()] or
+                [m for m in ms if m[0].isalpha()] or [handler])[0]
+        ops[t] = (name or ms[0], ms, effects)
+    return ops
+
+def generate_ops():
+    """
+    The source of gs2ops.py, as generated from gs2.py.
+    """
+    with open(GS2_FILE) as f:
+        ops = scan_ops(f.read())
+    out = [
+        '# gs2 opcode table',
+        '# (c) nooodl 2014',
+        '#',
+        '# Generated from the comments in gs2.py by',
+        '#',
+        '#     python gs2c.py --ops > gs2ops.py',
+        '#',
+        '# so edit those instead. OPCODES maps each byte to its name, mnemonics and',
+        '# the stack effect of each of its overloads, as (popped, pushed) pairs of',
+        '# types written as explained above OPS in gs2.py. arity is how many values',
+        '# the widest overload pops. Syntax, like { or m1, has neither.',
+        '',
+        'from collections import namedtuple',
+        '',
+        "Opcode = namedtuple('Opcode', 'byte name mnemonics arity effects')",
+        '',
+        'OPCODES = {',
+    ]
+    mnemonics = {}
+    for t in sorted(ops):
+        name, ms, effects = ops[t]
+        arity = None
+        if effects is not None:
+            arity = max(len(popped.strip('*')) for popped, pushed in effects)
+        out.append('    %r: Opcode(%r, %r, %r, %r, %r),' %
+                   (t, t, name, ms, arity, effects))
+        for m in ms:
+            mnemonics[m] = t
+    out.append('}')
+    out.append('')
+    out.append('MNEMONICS = {')
+    for m in sorted(mnemonics):
+        out.append('    %r: %r,' % (m, mnemonics[m]))
+    out.append('}')
+    return '\n'.join(out) + '\n'
 
 def compile_num(i):
     if 0 <= i <= 10:
@@ -67,69 +156,556 @@ def compile_num(i):
     else:
         raise Exception("couldn't compile number: %s" % i)
 
-def compile_gs2(s):
-    s = '\n'.join(l for l in s.split('\n') if l and l[0] != '#')
-    tokens = re.findall(r'"[^"]*"|\S+', s)
-    string_mode = False
-    string_array = False
-    strings = []
-    output_code = []
-
-    for i in tokens:
-        # sys.stderr.write('[%s]\n' % i)
+TOKEN_RE = re.compile(r'"[^"]*"|\S+')
+STRING_RE = re.compile(r'"[^"]*"$')
+
+STRING_OPENS = {
+    '(': 'regular',
+    'w(': 'array',
+    'p(': 'printf',
+    'm(': 'regex-match',
+    's(': 'regex-sub',
+    'f(': 'regex-find',
+    'v(': 'regex-split',
+}
+STRING_CLOSES = {
+    'regular': '\x05',
+    'array': '\x06',
+    'printf': '\x9b',
+    'regex-match': '\x9c',
+    'regex-sub': '\x9d',
+    'regex-find': '\x9e',
+    'regex-split': '\x9f',
+}
+
+# what a source token compiles to, independently of the tokens around it
+CODE, CLOSE, QUOTED, OPEN, WORD, ERROR = range(6)
+
+def classify(i):
+    try:
+        return (CODE, compile_num(int(i)), i)
+    except ValueError: pass
+    except Exception as e:
+        return (ERROR, e, i)
+
+    if i[0] == "'" and len(i) > 1:
+        return (CODE, compile_num(ord(i[1])), i)
+    elif i == ')':
+        return (CLOSE, None, i)
+    elif i[0] == '"':
         try:
-            v = compile_num(int(i))
-            output_code.append(v)
-            continue
-        except ValueError: pass
-
-        if i[0] == "'" and len(i) > 1:
-            v = compile_num(ord(i[1]))
-            output_code.append(v)
-        elif i == ')':
-            string_mode = False
-            s_open  = '\x04'
-            s_close = {
-                'regular': '\x05',
-                'array': '\x06',
-                'printf': '\x9b',
-                'regex-match': '\x9c',
-                'regex-sub': '\x9d',
-                'regex-find': '\x9e',
-                'regex-split': '\x9f',
-            }[string_type]
-            if len(strings) == 1 and len(strings[0]) == 1:
-                output_code.append('\x07' + strings[0])
-            else:
-                output_code.append(s_open + '\x07'.join(strings) + s_close)
-        elif string_mode or i[0] == '"':
-            if i[0] == '"':
-                if string_mode:
-                    strings.append(eval(i))
-                elif len(eval(i)) == 1:
-                    output_code.append('\x07' + eval(i))
+            return (QUOTED, ast.literal_eval(i), i)
+        except Exception as e:
+            return (ERROR, e, i)
+    elif i in STRING_OPENS:
+        return (OPEN, STRING_OPENS[i], i)
+    else:
+        return (WORD, mnemonics.get(i.lower()), i)
+
+def fragment(items):
+    """
+    What a run of classified tokens compiles to outside of a string, if
+    that doesn't depend on what comes before or after it; else None.
+    """
+    code = []
+    for kind, v, i in items:
+        if kind == CODE or (kind == WORD and v is not None):
+            code.append(v)
+        elif kind == QUOTED:
+            code.append(('\x07' + v) if len(v) == 1 else ('\x04' + v + '\x05'))
+        else:
+            return None
+    return ''.join(code)
+
+REGION_CACHE_SIZE = 4096
+
+class Compiler(object):
+    r"""
+    Compiles gs2 assembly like compile_gs2, remembering what each line
+    compiled to, so that recompiling a program after a small edit only
+    tokenizes and compiles the lines that changed. The rest are joined
+    from the cache, or walked token by token where a string spans lines.
+
+    >>> c = Compiler()
+    >>> c.compile('read-num range1\n{ dup * } map') == '\x56\x2f\x08\x40\x32\x09\x34'
+    True
+    >>> c.compile('read-num range1\n{ dup dup * * } map') == '\x56\x2f\x08\x40\x40\x32\x32\x09\x34'
+    True
+    >>> c.hits, c.misses
+    (1, 3)
+    """
+    def __init__(self, size=REGION_CACHE_SIZE):
+        self.size = size
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+
+    def region(self, text):
+        """
+        Classify the tokens of some lines. Returns (tokens, open, code):
+        open is true if a string literal was left open, and code is the
+        lines' fragment (see fragment) or None.
+        """
+        entry = self.cache.pop(text, None)
+        if entry is None:
+            tokens = TOKEN_RE.findall(text)
+            items = map(classify, tokens)
+            left_open = any(t[0] == '"' and not STRING_RE.match(t)
+                            for t in tokens)
+            entry = (items, left_open, fragment(items))
+            self.misses += 1
+            if len(self.cache) >= self.size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+        self.cache[text] = entry
+        return entry
+
+    def compile(self, s):
+        string_mode = False
+        string_type = None
+        strings = []
+        output_code = []
+
+        # lines tokenize the same on their own as in the whole program,
+        # except that a string literal left open runs on into the next one.
+        lines = [l for l in s.split('\n') if l and l[0] != '#']
+        n = 0
+        while n < len(lines):
+            text = lines[n]
+            n += 1
+            items, left_open, code = self.region(text)
+            while left_open and n < len(lines):
+                text += '\n' + lines[n]
+                n += 1
+                items, left_open, code = self.region(text)
+            if code is not None and not string_mode:
+                output_code.append(code)
+                continue
+
+            for kind, v, i in items:
+                if kind == CODE:
+                    output_code.append(v)
+                elif kind == ERROR:
+                    raise v
+                elif kind == CLOSE:
+                    if string_type is None:
+                        raise Exception('unmatched )')
+                    string_mode = False
+                    s_open  = '\x04'
+                    s_close = STRING_CLOSES[string_type]
+                    if len(strings) == 1 and len(strings[0]) == 1:
+                        output_code.append('\x07' + strings[0])
+                    else:
+                        output_code.append(s_open + '\x07'.join(strings) + s_close)
+                elif kind == QUOTED:
+                    if string_mode:
+                        strings.append(v)
+                    elif len(v) == 1:
+                        output_code.append('\x07' + v)
+                    else:
+                        output_code.append('\x04' + v + '\x05')
+                elif string_mode:
+                    strings.append(i)
+                elif kind == OPEN:
+                    string_mode = True
+                    string_type = v
+                    strings = []
+                elif v is not None:
+                    output_code.append(v)
                 else:
-                    output_code.append('\x04' + eval(i) + '\x05')
-            else:
-                strings.append(i)
-        elif i in ['(', 'w(', 'p(', 'm(', 's(', 'f(', 'v(']:
-            string_mode = True
-            string_type = {
-                '(': 'regular',
-                'w(': 'array',
-                'p(': 'printf',
-                'm(': 'regex-match',
-                's(': 'regex-sub',
-                'f(': 'regex-find',
-                'v(': 'regex-split',
-            }[i]
-            strings = []
-        elif i.lower() in mnemonics:
-            output_code.append(mnemonics[i.lower()])
+                    raise Exception('unknown symbol: ' + i)
+        # shortcut: strip leading \x04
+        return ''.join(output_code).lstrip('\x04')
+
+def compile_gs2(s):
+    return Compiler().compile(s)
+
+# A block written out with brackets: open is {, m: or f:, and close is } or
+# '' for a block left open at the end of the program.
+Brackets = namedtuple('Brackets', 'open items close')
+
+def string_hack(code):
+    """
+    Whether tokenize would put a \\x04 in front of code.
+    """
+    import gs2
+    end = gs2.STRING_END.search(code)
+    return bool(end) and code.find('\x04', 0, end.start()) < 0
+
+def parse(code):
+    """
+    Split compiled code into raw tokens the way tokenize does, but keep
+    them as they were written. Returns (mode, tokens), where mode is the
+    mode byte or '', and tokens holds strings of bytes and Brackets.
+    """
+    import gs2
+    if string_hack(code):
+        code = '\x04' + code
+    mode = ''
+    if code[:1] in ('\x30', '\x31', '\x32'):
+        mode, code = code[0], code[1:]
+
+    widths = gs2.TOKEN_WIDTHS
+    blocks = [Brackets(None, [], '')]
+    n = len(code)
+    i = 0
+    while i < n:
+        t = code[i]
+        j = i + 1
+        if t == '\x04':
+            end = gs2.STRING_END.search(code, j)
+            if end: j = end.end()
+        elif t in widths and i + widths[t] <= n:
+            j = i + widths[t]
+        t = code[i:j]
+        i = j
+
+        if t in ('\x08', '\xfe', '\xff'):
+            blocks.append(Brackets(t, [], ''))
+        elif t == '\x09':
+            if len(blocks) == 1:
+                raise ValueError('unmatched }')
+            block = blocks.pop()
+            blocks[-1].items.append(block._replace(close=t))
+        else:
+            blocks[-1].items.append(t)
+    while len(blocks) > 1:
+        block = blocks.pop()
+        blocks[-1].items.append(block)
+    return mode, blocks[0].items
+
+def unparse(tokens):
+    return ''.join(t if isinstance(t, str) else
+                   t.open + unparse(t.items) + t.close for t in tokens)
+
+def flatten(tokens):
+    for t in tokens:
+        if isinstance(t, str):
+            yield t
         else:
-            raise Exception('unknown symbol: ' + i)
-    # shortcut: strip leading \x04
-    return ''.join(output_code).lstrip('\x04')
+            yield t.open
+            for u in flatten(t.items):
+                yield u
+            if t.close:
+                yield t.close
+
+# what a bracketed block leaves after itself, by how it was opened
+FINAL = {'\x08': '\x00', '\xfe': '\x34', '\xff': '\x35'}
+
+def runs(t):
+    """
+    The opcodes that evaluating raw token t runs, for the cost model. Quick
+    blocks leave a nop, map, filter or the like after the block they make.
+    """
+    b = ord(t[0])
+    if len(t) > 1 or b < 0xe0:
+        return t[0]
+    elif t in '\xee\xef':
+        return '\xb1'
+    elif t in '\xf6\xf7':
+        return '\x0e' + ('\x34' if t == '\xf6' else '\x35')
+    return '\x00\x34\x35\x38'[(b >> 3) & 3]
+
+def load_costs(f):
+    """
+    Per-call times of opcodes, from a profile written by gs2.py --profile.
+    Opcodes the profile didn't see cost the average of the ones it did.
+    """
+    import json
+    ops = json.load(f)['ops']
+    costs = dict((o['op'].decode('hex'), o['self_time'] / o['count'])
+                 for o in ops if o['count'])
+    default = sum(costs.values()) / len(costs) if costs else 1.0
+    return dict((chr(i), costs.get(chr(i), default)) for i in xrange(256))
+
+# with no profile, every opcode costs the same
+UNIT_COSTS = dict((chr(i), 1.0) for i in xrange(256))
+
+def cost(tokens, costs):
+    """
+    (bytes, time) for a run of raw tokens.
+    """
+    size = time = 0
+    for t in tokens:
+        if isinstance(t, str):
+            size += len(t)
+            time += sum(costs[o] for o in runs(t))
+        else:
+            s, c = cost(t.items, costs)
+            size += len(t.open) + s + len(t.close)
+            time += c + costs[FINAL[t.open]]
+    return size, time
+
+def pays(new, old, costs, goal):
+    """
+    Whether a rewrite, as returned by rewrite or fuse, is an improvement on
+    the tokens it replaces: smaller (or as small and faster) if goal is
+    'size', else faster (or as fast and smaller.)
+    """
+    size, time = cost(new[1], costs)
+    size0, time0 = cost(old, costs)
+    if goal == 'size':
+        return (size, time) < (size0, time0)
+    return (time, size) < (time0, size0)
+
+def is_push(t):
+    """
+    Whether raw token t only pushes one constant.
+    """
+    import gs2
+    if t in gs2.NUMBERS:
+        return True
+    elif len(t) < 2:
+        return False
+    elif t[0] in '\x01\x02\x03\x07':
+        return True
+    return t[0] == '\x04' and (t[-1] == '\x06' or
+                               (t[-1] == '\x05' and '\x07' not in t))
+
+def is_num(t):
+    return is_push(t) and t[0] not in '\x04\x07'
+
+# ops that fold when everything they pop is a number literal
+FOLD_UNARY = set(t for t, o in gs2ops.OPCODES.iteritems()
+                 if o.effects and ('n', 'n') in o.effects) - set(['%'])
+FOLD_BINARY = set(t for t, o in gs2ops.OPCODES.iteritems()
+                  if o.effects and ('nn', 'n') in o.effects)
+
+def fold(tokens):
+    """
+    What number tokens leave on an empty stack, compiled, if that's a
+    single number; else None. Ops that need more than they were given fail
+    here, and so does anything that gets big.
+    """
+    import gs2
+    g = gs2.SandboxGS2('', '', bits=32)
+    del g.stack[:]
+    try:
+        g.evaluate(gs2.Block(map(gs2.decode, tokens)))
+        if len(g.stack) == 1 and isinstance(g.stack[0], (int, long)):
+            return [compile_num(g.stack[0])]
+    except Exception:
+        pass
+    return None
+
+def rewrite(window):
+    """
+    A replacement for the start of a window of raw tokens, as (how many
+    tokens it replaces, replacement), or None. Every rewrite changes what
+    ends up in the junk, so they're only for programs that never look.
+    """
+    plain = []
+    for t in window:
+        if not isinstance(t, str):
+            break
+        plain.append(t)
+    a, b, c = (plain + [None, None, None])[:3]
+    if a is None:
+        return None
+    if b == '\x50' and (a == '\x40' or is_push(a)):
+        return 2, []                    # dup pop, 1 pop
+    if b in FOLD_UNARY and is_num(a):
+        new = fold([a, b])
+        if new is not None:
+            return 2, new               # 3 square
+    if c in FOLD_BINARY and is_num(a) and is_num(b):
+        new = fold([a, b, c])
+        if new is not None:
+            return 3, new               # 2 3 +
+    return None
+
+# the quick blocks that leave each op after the block
+FUSE = {'\x00': 0xe0, '\x34': 0xe8, '\x35': 0xf0, '\x38': 0xf8}
+
+def fuse(tokens, i):
+    """
+    Fuse the bracketed block at tokens[i], and the op after it, into a
+    quick block, if its body is short and made only of plain tokens. Returns
+    (how many tokens it replaces, replacement) or None.
+    """
+    block = tokens[i]
+    if not block.close or not 1 <= len(block.items) <= 6:
+        return None
+    if not all(isinstance(t, str) and not plain_quick(t) for t in block.items):
+        return None
+    n = len(block.items) - 1
+    op = tokens[i + 1] if i + 1 < len(tokens) else None
+    if block.open == '\x08' and op in ('\x34', '\x35', '\x38'):
+        return 2, block.items + [chr(FUSE[op] | n)]
+    return 1, block.items + [chr(FUSE[FINAL[block.open]] | n)]
+
+def plain_quick(t):
+    return len(t) == 1 and t >= '\xe0'
+
+def peephole(tokens, costs, goal, junk):
+    """
+    Optimize a block's raw tokens, and its nested blocks'. Quick blocks
+    take whatever is evaluated before them, so a block that already has
+    any is left as it is (but for its nested blocks.)
+    """
+    tokens = [t if isinstance(t, str) else
+              t._replace(items=peephole(t.items, costs, goal, junk))
+              for t in tokens]
+    if any(isinstance(t, str) and plain_quick(t) for t in tokens):
+        return tokens
+
+    i = 0
+    while not junk and i < len(tokens):
+        new = rewrite(tokens[i:i + 3])
+        if new and pays(new, tokens[i:i + new[0]], costs, goal):
+            tokens[i:i + new[0]] = new[1]
+            i = max(0, i - 2)   # a fold can make another
+        else:
+            i += 1
+
+    # last, as the quick blocks made here would stop the rewrites above
+    i = 0
+    while i < len(tokens):
+        new = None
+        if not isinstance(tokens[i], str):
+            new = fuse(tokens, i)
+        if new and pays(new, tokens[i:i + new[0]], costs, goal):
+            tokens[i:i + new[0]] = new[1]
+            i += len(new[1])
+        else:
+            i += 1
+    return tokens
+
+def optimize(code, goal='speed', costs=UNIT_COSTS):
+    r"""
+    Rewrite compiled code to be faster (or, if goal is 'size', smaller) by
+    the cost model in costs: fuse blocks into quick blocks, fold constant
+    arithmetic, and drop values that are pushed only to be popped. Programs
+    that read the code back out of register C are left alone, and programs
+    that use the junk only have their blocks fused.
+
+    Dropping a dup pop also drops the error it would raise on an empty
+    stack, and blocks that are compared or shown may look different; check
+    the result with verify.
+
+    >>> optimize(compile_gs2('read-num { dup * } map')) == '\x56\x40\x32\xe9'
+    True
+    >>> optimize(compile_gs2('2 3 + 4 * dup pop 7'))
+    '\x01\x14\x17'
+    >>> optimize(compile_gs2('256 256 *')), optimize(compile_gs2('256 256 *'), 'size')
+    ('\x03\x00\x00\x01\x00', '\x1f\x1f2')
+    >>> optimize(compile_gs2('2 3 + junk0'))
+    '\x12\x130\xa0'
+    """
+    try:
+        mode, tokens = parse(code)
+    except ValueError:
+        return code
+    everything = set(flatten(tokens))
+    if everything & set(['\xd2', '\xda', '\xde']):  # push-c, tuck-c, show-c
+        return code
+    junk = any(len(t) == 1 and '\xa0' <= t <= '\xaf' for t in everything)
+    out = mode + unparse(peephole(tokens, costs, goal, junk))
+
+    # what tokenize would put back, compile_gs2 leaves out
+    if out[:1] == '\x04' and string_hack(out[1:]):
+        out = out[1:]
+    elif string_hack(out):
+        return code
+    return out or '\x00'  # tokenize needs something
+
+# stdin for verify to run programs on
+SAMPLE_INPUTS = ['', 'hello world\nfoo bar\n', '3 4 5', '12\n', 'abc\n\ndef',
+                 '1\n2\n3\n', '-5 10', 'The quick brown fox']
+
+def behaviour(code, stdin):
+    """
+    What running code on stdin prints, or the error it fails with; None if
+    it runs into SandboxGS2's limits.
+    """
+    import gs2, random
+    random.seed(0)
+    g = gs2.SandboxGS2(code, stdin, time=2.0)
+    try:
+        g.evaluate(gs2.tokenize(code))
+        return ''.join(map(gs2.show, g.stack))
+    except gs2.ResourceLimit:
+        return None
+    except Exception as e:
+        return type(e).__name__
+
+def verify(code, optimized, inputs=SAMPLE_INPUTS):
+    """
+    Run both programs on every input and return the first input they
+    behave differently on, or None if there is none.
+
+    >>> verify(compile_gs2('pop dup pop'), '\x50', ['1 2'])
+    '1 2'
+    >>> verify(compile_gs2('dup pop dup'), '\x40', ['1 2'])
+    """
+    for stdin in inputs:
+        a = behaviour(code, stdin)
+        if a is not None and a != behaviour(optimized, stdin):
+            return stdin
+    return None
+
+def serve(requests, replies):
+    """
+    Answer compile requests, one JSON object per line, for as long as they
+    come: {"id": 1, "source": "..."} gets {"id": 1, "code": "..."} or, if
+    it doesn't compile, {"id": 1, "error": "..."}. Code is latin-1, one
+    character per byte (as in gs2batch.py.) A single Compiler serves every
+    request, so an editor sending the whole program on each keystroke only
+    pays for the lines that changed.
+    """
+    import json
+    compiler = Compiler()
+    for line in iter(requests.readline, ''):
+        if not line.strip():
+            continue
+        reply = {}
+        try:
+            request = json.loads(line)
+            reply['id'] = request.get('id')
+            source = request['source'].encode('latin-1')
+            reply['code'] = compiler.compile(source).decode('latin-1')
+        except Exception as e:
+            reply['error'] = str(e) or type(e).__name__
+        replies.write(json.dumps(reply) + '\n')
+        replies.flush()
 
 if __name__ == '__main__':
-    sys.stdout.write(compile_gs2(sys.stdin.read()))
+    usage = ('usage: python %s [--ops | --serve | [-O speed|size] '
+             '[-p <profile json>] [-i <input file>]...]' % sys.argv[0])
+    if sys.argv[1:] == ['--ops']:
+        sys.stdout.write(generate_ops())
+        sys.exit()
+    elif sys.argv[1:] == ['--serve']:
+        serve(sys.stdin, sys.stdout)
+        sys.exit()
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'O:p:i:')
+    except getopt.GetoptError:
+        opts, args = None, True
+    if args or any(f == '-O' and v not in ('speed', 'size') for f, v in opts):
+        print >> sys.stderr, usage
+        sys.exit(1)
+
+    goal = None
+    costs = UNIT_COSTS
+    inputs = list(SAMPLE_INPUTS)
+    for flag, value in opts:
+        if flag == '-O':
+            goal = value
+        elif flag == '-p':
+            with open(value) as f:
+                costs = load_costs(f)
+        elif flag == '-i':
+            with open(value, 'rb') as f:
+                inputs.append(f.read())
+
+    code = compile_gs2(sys.stdin.read())
+    if goal:
+        optimized = optimize(code, goal, costs)
+        stdin = verify(code, optimized, inputs)
+        if stdin is None:
+            code = optimized
+        else:
+            print >> sys.stderr, ('not optimizing: the optimized program '
+                                  'behaves differently on %r' % stdin)
+    sys.stdout.write(code)
@@ -0,0 +1,276 @@
+# gs2 differential fuzzer
+# (c) nooodl 2014
+#
+# usage: python gs2fuzz.py [-r <reference gs2.py>] [-c] [-j workers]
+#                          [-n cases] [-s seed] [-k steps]
+#
+# Generates random programs from the opcode table in gs2ops.py, runs each
+# one under a reference interpreter and a candidate, and reports programs
+# where the two disagree on the final stack, the junk, the registers, the
+# counter or the output, or where only one of them fails. By default the
+# reference is GS2 and the candidate CompiledGS2. With -r, the reference is
+# GS2 from another copy of gs2.py -- say, the one from before a change,
+#
+#     git show HEAD~:gs2.py > /tmp/gs2_old.py
+#     python gs2fuzz.py -r /tmp/gs2_old.py -n 1000000
+#
+# and the candidate is this GS2 (or CompiledGS2, with -c.)
+#
+# Every case is generated from its seed alone, so a mismatch can be rerun
+# with -s <seed> -n 1. Programs that run out of steps or time, or that build
+# something huge, are skipped rather than compared.
+
+import getopt
+import imp
+import multiprocessing
+import random
+import signal
+import sys
+
+import gs2
+import gs2c
+import gs2ops
+from gs2batch import Timeout, init_worker
+
+# everything with a mnemonic except the block brackets, which generate()
+# keeps balanced itself
+OPS = sorted(t for t, o in gs2ops.OPCODES.iteritems()
+             if o.mnemonics and t not in '\x08\x09')
+
+NUMS = [0, 1, 2, 3, 5, 7, 10, 16, 65, 97, 100, 200, 256, 1000, -1, -5, 300]
+STRINGS = ['a', 'b', ' ', '\n', '1', '2', 'x', 'ab', 'hello', '%d', '%s',
+           '\\d', '.', 'a+', '[ab]', '(a)(b)?', '\\s+', ']a', '}\x01b']
+ENDS = '\x05\x06\x9b\x9c\x9d\x9e\x9f'
+INPUTS = ['', 'hello world\nfoo bar\n', '3 4 5', '12\n', 'abc\n\ndef',
+          'aab', '1\n2\n3\n', '-5 10', 'The quick brown fox']
+
+def generate(r, depth=0):
+    """
+    A random program, as a list of tokens with blocks written out as
+    '\\x08' ... '\\x09'.
+    """
+    tokens = []
+    for _ in xrange(r.randint(1, 10)):
+        k = r.random()
+        if k < 0.12:
+            tokens.append(gs2c.compile_num(r.choice(NUMS)))
+        elif k < 0.18:
+            tokens.append('\x07' + r.choice('ab \n1x9'))
+        elif k < 0.26:
+            strings = [r.choice(STRINGS) for _ in xrange(r.randint(1, 3))]
+            tokens.append('\x04' + '\x07'.join(strings) + r.choice(ENDS))
+        elif k < 0.34 and depth < 2:
+            tokens += ['\x08'] + generate(r, depth + 1) + ['\x09']
+        else:
+            tokens.append(r.choice(OPS))
+    if depth == 0 and r.random() < 0.1:
+        tokens.insert(0, r.choice('\x30\x31\x32'))
+    return tokens
+
+def disassemble(tokens):
+    words = []
+    for t in tokens:
+        value = getattr(gs2.decode(t), 'value', None)
+        if t in '\x08\x09':
+            words.append('{' if t == '\x08' else '}')
+        elif t in gs2ops.OPCODES and gs2ops.OPCODES[t].mnemonics:
+            words.append(gs2ops.OPCODES[t].name)
+        elif isinstance(value, int):
+            words.append(str(value))
+        else:
+            words.append(repr(t))
+    return ' '.join(words)
+
+class StepLimit(BaseException):
+    pass
+
+class Skip(Exception):
+    pass
+
+def limited(cls, steps):
+    """
+    A subclass of cls that gives up after evaluating about `steps` tokens.
+    Tokens are counted a block at a time, so cls's own per-token loop still
+    runs untouched.
+    """
+    class Limited(cls):
+        def evaluate(self, block):
+            self.steps = getattr(self, 'steps', 0) + len(block.code)
+            if self.steps > steps:
+                raise StepLimit()
+            cls.evaluate(self, block)
+    return Limited
+
+MAX_ELEMENTS = 100000
+
+def normalize(x, budget):
+    """
+    Make a value comparable across interpreters: byte strings, lazy
+    sequences and lists all become plain lists, and blocks their repr.
+    """
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise Skip()
+    if isinstance(x, (int, long)):
+        return x
+    if isinstance(x, tuple) and hasattr(x, 'code'):
+        return ('block', repr(x))
+    try:
+        return [normalize(y, budget) for y in x]
+    except TypeError:
+        return ('?', repr(x))
+
+def outcome(module, cls, code, stdin, seed):
+    """
+    What running code leaves behind: the error it failed with, or the
+    stack, junk and output it finished with, plus the registers.
+    """
+    random.seed(seed)
+    g = cls(code, stdin)
+    try:
+        g.evaluate(module.tokenize(code))
+        error = None
+    except (MemoryError, OverflowError, RuntimeError):
+        raise Skip()
+    except Exception as e:
+        error = type(e).__name__
+
+    budget = [MAX_ELEMENTS]
+    regs = normalize([g.regs[i] for i in xrange(4)], budget) + [g.counter]
+    if error:
+        return error, regs
+    try:
+        output = ''.join(map(module.show, g.stack))
+    except Exception as e:
+        output = type(e).__name__
+    junk = list(getattr(g.stack, 'junk', []))[-16:]
+    if not gs2.JUNK_REFS.search(code):
+        junk = []  # tokenize folds constants when nothing can see the junk
+    return (None, regs, normalize(list(g.stack), budget),
+            normalize(junk, budget), output)
+
+def compare(code, stdin, seed):
+    """
+    The two outcomes, or None if the program had to be skipped.
+    """
+    signal.setitimer(signal.ITIMER_REAL, TIMEOUT)
+    try:
+        return (outcome(reference_module, reference, code, stdin, seed),
+                outcome(gs2, candidate, code, stdin, seed))
+    except (Skip, StepLimit, Timeout, MemoryError, RuntimeError):
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+def differs(tokens, stdin, seed):
+    result = compare(''.join(tokens), stdin, seed)
+    return result is not None and result[0] != result[1]
+
+def shrink(tokens, stdin, seed):
+    """
+    Drop tokens one at a time for as long as the mismatch survives.
+    """
+    i = 0
+    while i < len(tokens):
+        shorter = tokens[:i] + tokens[i + 1:]
+        if shorter and differs(shorter, stdin, seed):
+            tokens = shorter
+        else:
+            i += 1
+    return tokens
+
+TIMEOUT = 0.5
+
+def init(reference_path, compiled, steps, memory):
+    global reference_module, reference, candidate
+    init_worker(memory)
+    sys.setrecursionlimit(3000)
+    if reference_path:
+        reference_module = imp.load_source('gs2_reference', reference_path)
+        candidate = gs2.CompiledGS2 if compiled else gs2.GS2
+    else:
+        reference_module = gs2
+        candidate = gs2.CompiledGS2
+    reference = limited(reference_module.GS2, steps)
+    candidate = limited(candidate, steps)
+
+def run_seeds(args):
+    """
+    Fuzz seeds start, start+1, ..., start+count-1, returning the number of
+    cases skipped and a report for each mismatch.
+    """
+    start, count = args
+    skipped = 0
+    mismatches = []
+    for seed in xrange(start, start + count):
+        r = random.Random(seed)
+        tokens = generate(r)
+        stdin = r.choice(INPUTS)
+        result = compare(''.join(tokens), stdin, seed)
+        if result is None:
+            skipped += 1
+        elif result[0] != result[1]:
+            tokens = shrink(tokens, stdin, seed)
+            expected, got = compare(''.join(tokens), stdin, seed)
+            mismatches.append({'seed': seed, 'code': ''.join(tokens),
+                               'program': disassemble(tokens), 'stdin': stdin,
+                               'reference': expected, 'candidate': got})
+    return count, skipped, mismatches
+
+def fuzz(cases, seed=0, workers=None, reference_path=None, compiled=False,
+         steps=20000, memory=1 << 30, chunk=500):
+    """
+    Fuzz `cases` seeds on a pool of workers, yielding (cases run, cases
+    skipped, mismatches) for each chunk as it finishes.
+    """
+    pool = multiprocessing.Pool(workers, init,
+                                (reference_path, compiled, steps, memory))
+    try:
+        chunks = [(start, min(chunk, seed + cases - start))
+                  for start in xrange(seed, seed + cases, chunk)]
+        for result in pool.imap_unordered(run_seeds, chunks):
+            yield result
+    finally:
+        pool.terminate()
+
+if __name__ == '__main__':
+    usage = ('usage: python %s [-r <reference gs2.py>] [-c] [-j workers] '
+             '[-n cases] [-s seed] [-k steps]' % sys.argv[0])
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'r:cj:n:s:k:')
+    except getopt.GetoptError:
+        print >> sys.stderr, usage
+        sys.exit(1)
+
+    options = {}
+    cases, seed = 10000, 0
+    for flag, value in opts:
+        if flag == '-r':
+            options['reference_path'] = value
+        elif flag == '-c':
+            options['compiled'] = True
+        elif flag == '-j':
+            options['workers'] = int(value)
+        elif flag == '-n':
+            cases = int(value)
+        elif flag == '-s':
+            seed = int(value)
+        elif flag == '-k':
+            options['steps'] = int(value)
+
+    done = skipped = bad = 0
+    for n, s, mismatches in fuzz(cases, seed, **options):
+        done += n
+        skipped += s
+        for m in mismatches:
+            bad += 1
+            print 'mismatch: seed %d' % m['seed']
+            print '  program   %s' % m['program']
+            print '  code      %r' % m['code']
+            print '  stdin     %r' % m['stdin']
+            print '  reference %r' % (m['reference'],)
+            print '  candidate %r' % (m['candidate'],)
+        sys.stderr.write('\r%d cases, %d skipped, %d mismatches' %
+                         (done, skipped, bad))
+    sys.stderr.write('\n')
+    sys.exit(1 if bad else 0)
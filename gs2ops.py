@@ -0,0 +1,567 @@
+# gs2 opcode table
+# (c) nooodl 2014
+#
+# Generated from the comments in gs2.py by
+#
+#     python gs2c.py --ops > gs2ops.py
+#
+# so edit those instead. OPCODES maps each byte to its name, mnemonics and
+# the stack effect of each of its overloads, as (popped, pushed) pairs of
+# types written as explained above OPS in gs2.py. arity is how many values
+# the widest overload pops. Syntax, like { or m1, has neither.
+
+from collections import namedtuple
+
+Opcode = namedtuple('Opcode', 'byte name mnemonics arity effects')
+
+OPCODES = {
+    '\x00': Opcode('\x00', 'nop', ('nop',), 0, (('', ''),)),
+    '\x01': Opcode('\x01', 'push-num', (), 0, (('', 'n'),)),
+    '\x02': Opcode('\x02', 'push-num', (), 0, (('', 'n'),)),
+    '\x03': Opcode('\x03', 'push-num', (), 0, (('', 'n'),)),
+    '\x04': Opcode('\x04', 'string', (), 0, (('*', '*'),)),
+    '\x07': Opcode('\x07', 'push-char', (), 0, (('', 'l'),)),
+    '\x08': Opcode('\x08', '{', ('{',), None, None),
+    '\t': Opcode('\t', '}', ('}',), None, None),
+    '\n': Opcode('\n', 'new-line', ('new-line',), 0, (('', 'l'),)),
+    '\x0b': Opcode('\x0b', 'empty-list', ('empty-list',), 0, (('', 'l'),)),
+    '\x0c': Opcode('\x0c', 'empty-block', ('empty-block',), 0, (('', 'b'),)),
+    '\r': Opcode('\r', 'space', ('space',), 0, (('', 'l'),)),
+    '\x0e': Opcode('\x0e', 'make-array', ('make-array', 'extract-array', 'dump'), 1, (('*n', 'l'), ('l', '*'))),
+    '\x0f': Opcode('\x0f', 'exit', ('exit',), 0, (('', ''),)),
+    '\x10': Opcode('\x10', 'push-num', (), 0, (('', 'n'),)),
+    '\x11': Opcode('\x11', 'push-num', (), 0, (('', 'n'),)),
+    '\x12': Opcode('\x12', 'push-num', (), 0, (('', 'n'),)),
+    '\x13': Opcode('\x13', 'push-num', (), 0, (('', 'n'),)),
+    '\x14': Opcode('\x14', 'push-num', (), 0, (('', 'n'),)),
+    '\x15': Opcode('\x15', 'push-num', (), 0, (('', 'n'),)),
+    '\x16': Opcode('\x16', 'push-num', (), 0, (('', 'n'),)),
+    '\x17': Opcode('\x17', 'push-num', (), 0, (('', 'n'),)),
+    '\x18': Opcode('\x18', 'push-num', (), 0, (('', 'n'),)),
+    '\x19': Opcode('\x19', 'push-num', (), 0, (('', 'n'),)),
+    '\x1a': Opcode('\x1a', 'push-num', (), 0, (('', 'n'),)),
+    '\x1b': Opcode('\x1b', 'push-num', (), 0, (('', 'n'),)),
+    '\x1c': Opcode('\x1c', 'push-num', (), 0, (('', 'n'),)),
+    '\x1d': Opcode('\x1d', 'push-num', (), 0, (('', 'n'),)),
+    '\x1e': Opcode('\x1e', 'push-num', (), 0, (('', 'n'),)),
+    '\x1f': Opcode('\x1f', 'push-num', (), 0, (('', 'n'),)),
+    ' ': Opcode(' ', 'negate', ('negate', 'reverse', 'eval'), 1, (('n', 'n'), ('l', 'l'), ('b', '*'))),
+    '!': Opcode('!', 'bnot', ('bnot', 'head'), 1, (('n', 'n'), ('s', 'a'))),
+    '"': Opcode('"', 'not', ('not', 'tail'), 1, (('n', 'n'), ('s', 's'))),
+    '#': Opcode('#', 'abs', ('abs', 'init'), 1, (('n', 'n'), ('s', 's'))),
+    '$': Opcode('$', 'digits', ('digits', 'last'), 1, (('n', 'l'), ('l', 'a'))),
+    '%': Opcode('%', 'random', ('random',), 1, (('n', 'n'), ('l', 'a'))),
+    '&': Opcode('&', 'dec', ('dec', 'left-uncons'), 1, (('n', 'n'), ('s', 'sa'))),
+    "'": Opcode("'", 'inc', ('inc', 'right-uncons'), 1, (('n', 'n'), ('s', 'sa'))),
+    '(': Opcode('(', 'sign', ('sign', 'min'), 1, (('n', 'n'), ('l', 'a'))),
+    ')': Opcode(')', 'thousand', ('thousand', 'max'), 1, (('n', 'n'), ('l', 'a'))),
+    '*': Opcode('*', 'double', ('double', 'lines'), 1, (('n', 'n'), ('l', 'l'))),
+    '+': Opcode('+', 'half', ('half', 'unlines'), 1, (('n', 'n'), ('l', 'l'))),
+    ',': Opcode(',', 'square', ('square', 'words'), 1, (('n', 'n'), ('l', 'l'))),
+    '-': Opcode('-', 'sqrt', ('sqrt', 'unwords'), 1, (('n', 'n'), ('l', 'l'))),
+    '.': Opcode('.', 'range', ('range', 'length'), 1, (('n', 'l'), ('s', 'n'))),
+    '/': Opcode('/', 'range1', ('range1', 'sort'), 2, (('n', 'l'), ('l', 'l'), ('lb', 'l'))),
+    '0': Opcode('0', 'add', ('line-mode', '+', 'add', 'catenate'), 2, (('nn', 'n'), ('ll', 'l'), ('bb', 'b'), ('ln', 'l'), ('lb', 'l'), ('nl', 'l'), ('bl', 'l'))),
+    '1': Opcode('1', 'sub', ('word-mode', '-', 'sub', 'diff'), 2, (('nn', 'n'), ('ll', 'l'), ('ln', 'l'), ('lb', 'l'), ('nl', 'l'), ('bl', 'l'))),
+    '2': Opcode('2', 'mul', ('line-mode-skip-first', '*', 'mul', 'join', 'times', 'fold'), 2, (('nn', 'n'), ('ll', 'l'), ('ln', 'l'), ('nl', 'l'), ('bn', '*'), ('nb', '*'), ('lb', '*'), ('bl', '*'))),
+    '3': Opcode('3', 'div', ('/', 'div', 'chunks', 'split', 'each'), 2, (('nn', 'n'), ('ln', 'l'), ('nl', 'l'), ('ll', 'l'), ('sb', '*'), ('bs', '*'))),
+    '4': Opcode('4', 'mod', ('%', 'mod', 'step', 'clean-split', 'map'), 2, (('nn', 'n'), ('ln', 'l'), ('nl', 'l'), ('ll', 'l'), ('sb', 'l'), ('bs', 'l'))),
+    '5': Opcode('5', 'and', ('&', 'and', 'get', 'when', 'filter'), 2, (('nn', 'n'), ('ll', 'l'), ('ln', 'a'), ('nl', 'a'), ('nb', '*'), ('bn', '*'), ('sb', 'l'), ('bs', 'l'))),
+    '6': Opcode('6', 'or', ('|', 'or', 'unless'), 2, (('nn', 'n'), ('ll', 'l'), ('nb', '*'), ('bn', '*'))),
+    '7': Opcode('7', 'xor', ('^', 'xor', 'concatmap'), 2, (('nn', 'n'), ('ll', 'l'), ('lb', 'l'), ('bl', 'l'))),
+    '8': Opcode('8', 'smallest', ('smallest', 'both'), 3, (('aa', 'a'), ('aab', '*'))),
+    '9': Opcode('9', 'biggest', ('biggest',), 2, (('aa', 'a'),)),
+    ':': Opcode(':', 'clamp', ('clamp',), 3, (('aaa', 'a'),)),
+    '<': Opcode('<', 'gcd', ('gcd', 'take'), 2, (('nn', 'n'), ('sn', 's'), ('ns', 's'))),
+    '=': Opcode('=', 'lcm', ('lcm', 'drop'), 2, (('nn', 'n'), ('sn', 's'), ('ns', 's'))),
+    '>': Opcode('>', 'pow', ('pow', 'index'), 2, (('nn', 'n'), ('ln', 'n'), ('nl', 'n'))),
+    '?': Opcode('?', 'log', ('log', 'member'), 2, (('nn', 'n'), ('sa', 'n'), ('as', 'n'))),
+    '@': Opcode('@', 'dup', ('dup',), 1, (('a', 'aa'),)),
+    'A': Opcode('A', 'dup2', ('dup2',), 1, (('a', 'aaa'),)),
+    'B': Opcode('B', 'swap', ('swap',), 2, (('aa', 'aa'),)),
+    'C': Opcode('C', 'rot', ('rot',), 3, (('aaa', 'aaa'),)),
+    'D': Opcode('D', 'rrot', ('rrot',), 3, (('aaa', 'aaa'),)),
+    'E': Opcode('E', 'over', ('over',), 2, (('aa', 'aaa'),)),
+    'F': Opcode('F', 'nip', ('nip',), 2, (('aa', 'a'),)),
+    'G': Opcode('G', 'tuck', ('tuck',), 2, (('aa', 'aaa'),)),
+    'H': Opcode('H', '2dup', ('2dup',), 2, (('aa', 'aaaa'),)),
+    'I': Opcode('I', 'pick', ('pick',), 1, (('*n', '*'),)),
+    'J': Opcode('J', 'roll', ('roll',), 1, (('*n', '*'),)),
+    'K': Opcode('K', 'wrap-stack', ('wrap-stack',), 0, (('*', 'l'),)),
+    'L': Opcode('L', 'leave-top', ('leave-top',), 1, (('*a', 'a'),)),
+    'M': Opcode('M', 'itemize', ('itemize',), 1, (('a', 'l'),)),
+    'N': Opcode('N', 'rrange', ('rrange',), 1, (('n', 'l'),)),
+    'O': Opcode('O', 'crange', ('crange',), 2, (('nn', 'l'),)),
+    'P': Opcode('P', 'pop', ('pop',), 1, (('a', ''),)),
+    'Q': Opcode('Q', 'pop2', ('pop2',), 2, (('aa', ''),)),
+    'R': Opcode('R', 'show', ('show',), 1, (('a', 'l'),)),
+    'S': Opcode('S', 'map-show', ('map-show',), 1, (('l', 'l'),)),
+    'T': Opcode('T', 'show-lines', ('show-lines',), 1, (('l', 'l'),)),
+    'U': Opcode('U', 'show-words', ('show-words',), 1, (('l', 'l'),)),
+    'V': Opcode('V', 'read-num', ('read-num',), 1, (('l', 'n'),)),
+    'W': Opcode('W', 'read-nums', ('read-nums',), 1, (('l', 'l'),)),
+    'X': Opcode('X', 'show-line', ('show-line',), 1, (('a', 'l'),)),
+    'Y': Opcode('Y', 'show-space', ('show-space',), 1, (('a', 'l'),)),
+    'Z': Opcode('Z', 'show-comma', ('show-comma',), 1, (('l', 'l'),)),
+    '[': Opcode('[', 'show-python', ('show-python',), 1, (('l', 'l'),)),
+    '\\': Opcode('\\', 'ljust', ('ljust',), 3, (('ln', 'l'), ('bn', 'l'), ('ann', 'l'))),
+    ']': Opcode(']', 'center', ('center',), 3, (('ln', 'l'), ('bn', 'l'), ('ann', 'l'))),
+    '^': Opcode('^', 'rjust', ('rjust',), 3, (('ln', 'l'), ('bn', 'l'), ('ann', 'l'))),
+    '_': Opcode('_', 'inspect', ('inspect',), 1, (('a', 'l'),)),
+    '`': Opcode('`', 'logical-and', ('logical-and',), 2, (('aa', 'a'),)),
+    'a': Opcode('a', 'logical-or', ('logical-or',), 2, (('aa', 'a'),)),
+    'b': Opcode('b', 'divides', ('divides', 'left-cons'), 2, (('nn', 'n'), ('la', 'l'))),
+    'c': Opcode('c', 'divmod', ('divmod', 'group'), 2, (('nn', 'nn'), ('l', 'l'))),
+    'd': Opcode('d', 'sum', ('sum', 'even'), 1, (('n', 'n'), ('l', 'n'))),
+    'e': Opcode('e', 'product', ('product', 'odd'), 1, (('n', 'n'), ('l', 'n'))),
+    'f': Opcode('f', 'fizzbuzz', ('fizzbuzz',), 0, (('', 'l'),)),
+    'g': Opcode('g', 'popcnt', ('popcnt', 'right-cons'), 2, (('n', 'n'), ('al', 'l'))),
+    'h': Opcode('h', 'hello', ('hello',), 1, (('', 'l'), ('n', 'l'))),
+    'i': Opcode('i', 'base', ('base',), 2, (('nn', 'l'), ('ln', 'n'))),
+    'j': Opcode('j', 'binary', ('binary',), 1, (('n', 'l'), ('l', 'n'))),
+    'k': Opcode('k', 'is-prime', ('is-prime',), 1, (('n', 'n'), ('l', 'l'))),
+    'l': Opcode('l', 'primes', ('primes',), 2, (('nn', '*'),)),
+    'm': Opcode('m', 'scan', ('scan',), 2, (('lb', 'l'),)),
+    'p': Opcode('p', 'lt', ('lt', '<'), 2, (('aa', 'n'),)),
+    'q': Opcode('q', 'eq', ('eq', '='), 2, (('aa', 'n'),)),
+    'r': Opcode('r', 'gt', ('gt', '>'), 2, (('aa', 'n'),)),
+    's': Opcode('s', 'ge', ('ge', '>='), 2, (('aa', 'n'),)),
+    't': Opcode('t', 'ne', ('ne', '!='), 2, (('aa', 'n'),)),
+    'u': Opcode('u', 'le', ('le', '<='), 2, (('aa', 'n'),)),
+    'v': Opcode('v', 'cmp', ('cmp',), 2, (('aa', 'n'),)),
+    'w': Opcode('w', 'is-sorted', ('is-sorted',), 2, (('l', 'n'), ('lb', 'n'))),
+    'x': Opcode('x', 'shift-left', ('shift-left', 'inits'), 2, (('nn', 'n'), ('l', 'l'))),
+    'y': Opcode('y', 'shift-right', ('shift-right', 'tails'), 2, (('nn', 'n'), ('l', 'l'))),
+    'z': Opcode('z', 'digit-left', ('digit-left', 'enumerate'), 2, (('nn', 'n'), ('l', 'l'))),
+    '{': Opcode('{', 'digit-right', ('digit-right',), 2, (('nn', 'n'),)),
+    '|': Opcode('|', 'power-of-2', ('power-of-2',), 1, (('n', 'n'),)),
+    '}': Opcode('}', 'power-of-10', ('power-of-10',), 1, (('n', 'n'),)),
+    '~': Opcode('~', 'sub-power-of-2', ('sub-power-of-2',), 1, (('n', 'n'),)),
+    '\x7f': Opcode('\x7f', 'sub-power-of-10', ('sub-power-of-10',), 1, (('n', 'n'),)),
+    '\x80': Opcode('\x80', 'pair', ('pair',), 2, (('aa', 'l'),)),
+    '\x81': Opcode('\x81', 'copies', ('copies',), 2, (('an', 'l'),)),
+    '\x82': Opcode('\x82', 'take-end', ('take-end',), 2, (('ln', 'l'), ('nl', 'l'))),
+    '\x83': Opcode('\x83', 'cartesian-product', ('cartesian-product',), 2, (('ll', 's'),)),
+    '\x84': Opcode('\x84', 'uppercase-alphabet', ('uppercase-alphabet',), 0, (('', 'l'),)),
+    '\x85': Opcode('\x85', 'lowercase-alphabet', ('lowercase-alphabet',), 0, (('', 'l'),)),
+    '\x86': Opcode('\x86', 'ascii-digits', ('ascii-digits',), 0, (('', 'l'),)),
+    '\x87': Opcode('\x87', 'printable-ascii', ('printable-ascii',), 0, (('', 'l'),)),
+    '\x88': Opcode('\x88', 'is-alnum', ('is-alnum',), 1, (('l', 'n'),)),
+    '\x89': Opcode('\x89', 'is-alpha', ('is-alpha',), 1, (('l', 'n'),)),
+    '\x8a': Opcode('\x8a', 'is-digit', ('is-digit',), 1, (('l', 'n'),)),
+    '\x8b': Opcode('\x8b', 'is-lower', ('is-lower',), 1, (('l', 'n'),)),
+    '\x8c': Opcode('\x8c', 'is-space', ('is-space',), 1, (('l', 'n'),)),
+    '\x8d': Opcode('\x8d', 'is-upper', ('is-upper',), 1, (('l', 'n'),)),
+    '\x8e': Opcode('\x8e', 'is-printable', ('is-printable',), 1, (('l', 'n'),)),
+    '\x8f': Opcode('\x8f', 'is-hexdigit', ('is-hexdigit',), 1, (('l', 'n'),)),
+    '\x90': Opcode('\x90', 'uniq', ('uniq', 'nub'), 1, (('l', 'l'),)),
+    '\x91': Opcode('\x91', 'compress', ('compress',), 2, (('ll', 'l'),)),
+    '\x92': Opcode('\x92', 'select', ('select',), 2, (('ll', 'l'),)),
+    '\x93': Opcode('\x93', 'permutations', ('permutations',), 2, (('l', 's'), ('ln', 's'))),
+    '\x94': Opcode('\x94', 'fold-product', ('fold-product',), 1, (('l', 's'),)),
+    '\x95': Opcode('\x95', 'repeat-product', ('repeat-product',), 2, (('ln', 's'),)),
+    '\x96': Opcode('\x96', 'combinations', ('combinations',), 2, (('ln', 's'),)),
+    '\x97': Opcode('\x97', 'combinations-with-replacement', ('combinations-with-replacement',), 2, (('ln', 's'),)),
+    '\x98': Opcode('\x98', 'pairwise', ('pairwise',), 1, (('l', 'l'),)),
+    '\x99': Opcode('\x99', 'flatten', ('flatten',), 1, (('l', 'l'),)),
+    '\x9a': Opcode('\x9a', 'transpose', ('transpose',), 1, (('l', 'l'),)),
+    '\xa0': Opcode('\xa0', 'junk0', ('@0', 'junk0'), 0, (('', 'a'),)),
+    '\xa1': Opcode('\xa1', 'junk1', ('@1', 'junk1'), 0, (('', 'a'),)),
+    '\xa2': Opcode('\xa2', 'junk2', ('@2', 'junk2'), 0, (('', 'a'),)),
+    '\xa3': Opcode('\xa3', 'junk3', ('@3', 'junk3'), 0, (('', 'a'),)),
+    '\xa4': Opcode('\xa4', 'junk4', ('@4', 'junk4'), 0, (('', 'a'),)),
+    '\xa5': Opcode('\xa5', 'junk5', ('@5', 'junk5'), 0, (('', 'a'),)),
+    '\xa6': Opcode('\xa6', 'junk6', ('@6', 'junk6'), 0, (('', 'a'),)),
+    '\xa7': Opcode('\xa7', 'junk7', ('@7', 'junk7'), 0, (('', 'a'),)),
+    '\xa8': Opcode('\xa8', 'junk8', ('@8', 'junk8'), 0, (('', 'a'),)),
+    '\xa9': Opcode('\xa9', 'junk9', ('@9', 'junk9'), 0, (('', 'a'),)),
+    '\xaa': Opcode('\xaa', 'junk10', ('@10', 'junk10'), 0, (('', 'a'),)),
+    '\xab': Opcode('\xab', 'junk11', ('@11', 'junk11'), 0, (('', 'a'),)),
+    '\xac': Opcode('\xac', 'junk12', ('@12', 'junk12'), 0, (('', 'a'),)),
+    '\xad': Opcode('\xad', 'junk13', ('@13', 'junk13'), 0, (('', 'a'),)),
+    '\xae': Opcode('\xae', 'junk14', ('@14', 'junk14'), 0, (('', 'a'),)),
+    '\xaf': Opcode('\xaf', 'junk15', ('@15', 'junk15'), 0, (('', 'a'),)),
+    '\xb0': Opcode('\xb0', 'zip', ('zip',), 2, (('ll', 'l'),)),
+    '\xb1': Opcode('\xb1', 'zipwith', ('zipwith',), 3, (('llb', 'l'),)),
+    '\xb2': Opcode('\xb2', 'counter', ('counter',), 0, (('', 'n'),)),
+    '\xc8': Opcode('\xc8', 'save-a', ('save-a',), 1, (('a', 'a'),)),
+    '\xc9': Opcode('\xc9', 'save-b', ('save-b',), 1, (('a', 'a'),)),
+    '\xca': Opcode('\xca', 'save-c', ('save-c',), 1, (('a', 'a'),)),
+    '\xcb': Opcode('\xcb', 'save-d', ('save-d',), 1, (('a', 'a'),)),
+    '\xcc': Opcode('\xcc', 'pop-a', ('pop-a',), 1, (('a', ''),)),
+    '\xcd': Opcode('\xcd', 'pop-b', ('pop-b',), 1, (('a', ''),)),
+    '\xce': Opcode('\xce', 'pop-c', ('pop-c',), 1, (('a', ''),)),
+    '\xcf': Opcode('\xcf', 'pop-d', ('pop-d',), 1, (('a', ''),)),
+    '\xd0': Opcode('\xd0', 'push-a', ('push-a',), 0, (('', 'a'),)),
+    '\xd1': Opcode('\xd1', 'push-b', ('push-b',), 0, (('', 'a'),)),
+    '\xd2': Opcode('\xd2', 'push-c', ('push-c',), 0, (('', 'a'),)),
+    '\xd3': Opcode('\xd3', 'push-d', ('push-d',), 0, (('', 'a'),)),
+    '\xd4': Opcode('\xd4', 'nip-a', ('nip-a',), 2, (('aa', 'a'),)),
+    '\xd5': Opcode('\xd5', 'nip-b', ('nip-b',), 2, (('aa', 'a'),)),
+    '\xd6': Opcode('\xd6', 'nip-c', ('nip-c',), 2, (('aa', 'a'),)),
+    '\xd7': Opcode('\xd7', 'nip-d', ('nip-d',), 2, (('aa', 'a'),)),
+    '\xd8': Opcode('\xd8', 'tuck-a', ('tuck-a',), 1, (('a', 'aa'),)),
+    '\xd9': Opcode('\xd9', 'tuck-b', ('tuck-b',), 1, (('a', 'aa'),)),
+    '\xda': Opcode('\xda', 'tuck-c', ('tuck-c',), 1, (('a', 'aa'),)),
+    '\xdb': Opcode('\xdb', 'tuck-d', ('tuck-d',), 1, (('a', 'aa'),)),
+    '\xdc': Opcode('\xdc', 'show-a', ('show-a',), 0, (('', 'l'),)),
+    '\xdd': Opcode('\xdd', 'show-b', ('show-b',), 0, (('', 'l'),)),
+    '\xde': Opcode('\xde', 'show-c', ('show-c',), 0, (('', 'l'),)),
+    '\xdf': Opcode('\xdf', 'show-d', ('show-d',), 0, (('', 'l'),)),
+    '\xe0': Opcode('\xe0', 'b1', ("'", 'b1', 'block1'), None, None),
+    '\xe1': Opcode('\xe1', 'b2', ('b2', 'block2'), None, None),
+    '\xe2': Opcode('\xe2', 'b3', ('b3', 'block3'), None, None),
+    '\xe3': Opcode('\xe3', 'b4', ('b4', 'block4'), None, None),
+    '\xe4': Opcode('\xe4', 'b5', ('b5', 'block5'), None, None),
+    '\xe5': Opcode('\xe5', 'b6', ('b6', 'block6'), None, None),
+    '\xe6': Opcode('\xe6', 'b7', ('b7', 'block7'), None, None),
+    '\xe7': Opcode('\xe7', 'b8', ('b8', 'block8'), None, None),
+    '\xe8': Opcode('\xe8', 'm1', ('m1', 'map1'), None, None),
+    '\xe9': Opcode('\xe9', 'm2', ('m2', 'map2'), None, None),
+    '\xea': Opcode('\xea', 'm3', ('m3', 'map3'), None, None),
+    '\xeb': Opcode('\xeb', 'm4', ('m4', 'map4'), None, None),
+    '\xec': Opcode('\xec', 'm5', ('m5', 'map5'), None, None),
+    '\xed': Opcode('\xed', 'm6', ('m6', 'map6'), None, None),
+    '\xee': Opcode('\xee', 'z1', ('z1', 'zipwith1', 'm7', 'map7'), None, None),
+    '\xef': Opcode('\xef', 'z2', ('z2', 'zipwith2', 'm8', 'map8'), None, None),
+    '\xf0': Opcode('\xf0', 'f1', ('f1', 'filter1'), None, None),
+    '\xf1': Opcode('\xf1', 'f2', ('f2', 'filter2'), None, None),
+    '\xf2': Opcode('\xf2', 'f3', ('f3', 'filter3'), None, None),
+    '\xf3': Opcode('\xf3', 'f4', ('f4', 'filter4'), None, None),
+    '\xf4': Opcode('\xf4', 'f5', ('f5', 'filter5'), None, None),
+    '\xf5': Opcode('\xf5', 'f6', ('f6', 'filter6'), None, None),
+    '\xf6': Opcode('\xf6', 'dm1', ('dm1', 'dump-map1', 'f7', 'filter7'), None, None),
+    '\xf7': Opcode('\xf7', 'df1', ('df1', 'dump-filter1', 'f8', 'filter8'), None, None),
+    '\xf8': Opcode('\xf8', 't1', ('t1', 'both1'), None, None),
+    '\xf9': Opcode('\xf9', 't2', ('t2', 'both2'), None, None),
+    '\xfa': Opcode('\xfa', 't3', ('t3', 'both3'), None, None),
+    '\xfb': Opcode('\xfb', 't4', ('t4', 'both4'), None, None),
+    '\xfc': Opcode('\xfc', 't5', ('t5', 'both5'), None, None),
+    '\xfe': Opcode('\xfe', 'm:', ('m:',), None, None),
+    '\xff': Opcode('\xff', 'f:', ('f:',), None, None),
+}
+
+MNEMONICS = {
+    '!=': 't',
+    '%': '4',
+    '&': '5',
+    "'": '\xe0',
+    '*': '2',
+    '+': '0',
+    '-': '1',
+    '/': '3',
+    '2dup': 'H',
+    '<': 'p',
+    '<=': 'u',
+    '=': 'q',
+    '>': 'r',
+    '>=': 's',
+    '@0': '\xa0',
+    '@1': '\xa1',
+    '@10': '\xaa',
+    '@11': '\xab',
+    '@12': '\xac',
+    '@13': '\xad',
+    '@14': '\xae',
+    '@15': '\xaf',
+    '@2': '\xa2',
+    '@3': '\xa3',
+    '@4': '\xa4',
+    '@5': '\xa5',
+    '@6': '\xa6',
+    '@7': '\xa7',
+    '@8': '\xa8',
+    '@9': '\xa9',
+    '^': '7',
+    'abs': '#',
+    'add': '0',
+    'and': '5',
+    'ascii-digits': '\x86',
+    'b1': '\xe0',
+    'b2': '\xe1',
+    'b3': '\xe2',
+    'b4': '\xe3',
+    'b5': '\xe4',
+    'b6': '\xe5',
+    'b7': '\xe6',
+    'b8': '\xe7',
+    'base': 'i',
+    'biggest': '9',
+    'binary': 'j',
+    'block1': '\xe0',
+    'block2': '\xe1',
+    'block3': '\xe2',
+    'block4': '\xe3',
+    'block5': '\xe4',
+    'block6': '\xe5',
+    'block7': '\xe6',
+    'block8': '\xe7',
+    'bnot': '!',
+    'both': '8',
+    'both1': '\xf8',
+    'both2': '\xf9',
+    'both3': '\xfa',
+    'both4': '\xfb',
+    'both5': '\xfc',
+    'cartesian-product': '\x83',
+    'catenate': '0',
+    'center': ']',
+    'chunks': '3',
+    'clamp': ':',
+    'clean-split': '4',
+    'cmp': 'v',
+    'combinations': '\x96',
+    'combinations-with-replacement': '\x97',
+    'compress': '\x91',
+    'concatmap': '7',
+    'copies': '\x81',
+    'counter': '\xb2',
+    'crange': 'O',
+    'dec': '&',
+    'df1': '\xf7',
+    'diff': '1',
+    'digit-left': 'z',
+    'digit-right': '{',
+    'digits': '$',
+    'div': '3',
+    'divides': 'b',
+    'divmod': 'c',
+    'dm1': '\xf6',
+    'double': '*',
+    'drop': '=',
+    'dump': '\x0e',
+    'dump-filter1': '\xf7',
+    'dump-map1': '\xf6',
+    'dup': '@',
+    'dup2': 'A',
+    'each': '3',
+    'empty-block': '\x0c',
+    'empty-list': '\x0b',
+    'enumerate': 'z',
+    'eq': 'q',
+    'eval': ' ',
+    'even': 'd',
+    'exit': '\x0f',
+    'extract-array': '\x0e',
+    'f1': '\xf0',
+    'f2': '\xf1',
+    'f3': '\xf2',
+    'f4': '\xf3',
+    'f5': '\xf4',
+    'f6': '\xf5',
+    'f7': '\xf6',
+    'f8': '\xf7',
+    'f:': '\xff',
+    'filter': '5',
+    'filter1': '\xf0',
+    'filter2': '\xf1',
+    'filter3': '\xf2',
+    'filter4': '\xf3',
+    'filter5': '\xf4',
+    'filter6': '\xf5',
+    'filter7': '\xf6',
+    'filter8': '\xf7',
+    'fizzbuzz': 'f',
+    'flatten': '\x99',
+    'fold': '2',
+    'fold-product': '\x94',
+    'gcd': '<',
+    'ge': 's',
+    'get': '5',
+    'group': 'c',
+    'gt': 'r',
+    'half': '+',
+    'head': '!',
+    'hello': 'h',
+    'inc': "'",
+    'index': '>',
+    'init': '#',
+    'inits': 'x',
+    'inspect': '_',
+    'is-alnum': '\x88',
+    'is-alpha': '\x89',
+    'is-digit': '\x8a',
+    'is-hexdigit': '\x8f',
+    'is-lower': '\x8b',
+    'is-prime': 'k',
+    'is-printable': '\x8e',
+    'is-sorted': 'w',
+    'is-space': '\x8c',
+    'is-upper': '\x8d',
+    'itemize': 'M',
+    'join': '2',
+    'junk0': '\xa0',
+    'junk1': '\xa1',
+    'junk10': '\xaa',
+    'junk11': '\xab',
+    'junk12': '\xac',
+    'junk13': '\xad',
+    'junk14': '\xae',
+    'junk15': '\xaf',
+    'junk2': '\xa2',
+    'junk3': '\xa3',
+    'junk4': '\xa4',
+    'junk5': '\xa5',
+    'junk6': '\xa6',
+    'junk7': '\xa7',
+    'junk8': '\xa8',
+    'junk9': '\xa9',
+    'last': '$',
+    'lcm': '=',
+    'le': 'u',
+    'leave-top': 'L',
+    'left-cons': 'b',
+    'left-uncons': '&',
+    'length': '.',
+    'line-mode': '0',
+    'line-mode-skip-first': '2',
+    'lines': '*',
+    'ljust': '\\',
+    'log': '?',
+    'logical-and': '`',
+    'logical-or': 'a',
+    'lowercase-alphabet': '\x85',
+    'lt': 'p',
+    'm1': '\xe8',
+    'm2': '\xe9',
+    'm3': '\xea',
+    'm4': '\xeb',
+    'm5': '\xec',
+    'm6': '\xed',
+    'm7': '\xee',
+    'm8': '\xef',
+    'm:': '\xfe',
+    'make-array': '\x0e',
+    'map': '4',
+    'map-show': 'S',
+    'map1': '\xe8',
+    'map2': '\xe9',
+    'map3': '\xea',
+    'map4': '\xeb',
+    'map5': '\xec',
+    'map6': '\xed',
+    'map7': '\xee',
+    'map8': '\xef',
+    'max': ')',
+    'member': '?',
+    'min': '(',
+    'mod': '4',
+    'mul': '2',
+    'ne': 't',
+    'negate': ' ',
+    'new-line': '\n',
+    'nip': 'F',
+    'nip-a': '\xd4',
+    'nip-b': '\xd5',
+    'nip-c': '\xd6',
+    'nip-d': '\xd7',
+    'nop': '\x00',
+    'not': '"',
+    'nub': '\x90',
+    'odd': 'e',
+    'or': '6',
+    'over': 'E',
+    'pair': '\x80',
+    'pairwise': '\x98',
+    'permutations': '\x93',
+    'pick': 'I',
+    'pop': 'P',
+    'pop-a': '\xcc',
+    'pop-b': '\xcd',
+    'pop-c': '\xce',
+    'pop-d': '\xcf',
+    'pop2': 'Q',
+    'popcnt': 'g',
+    'pow': '>',
+    'power-of-10': '}',
+    'power-of-2': '|',
+    'primes': 'l',
+    'printable-ascii': '\x87',
+    'product': 'e',
+    'push-a': '\xd0',
+    'push-b': '\xd1',
+    'push-c': '\xd2',
+    'push-d': '\xd3',
+    'random': '%',
+    'range': '.',
+    'range1': '/',
+    'read-num': 'V',
+    'read-nums': 'W',
+    'repeat-product': '\x95',
+    'reverse': ' ',
+    'right-cons': 'g',
+    'right-uncons': "'",
+    'rjust': '^',
+    'roll': 'J',
+    'rot': 'C',
+    'rrange': 'N',
+    'rrot': 'D',
+    'save-a': '\xc8',
+    'save-b': '\xc9',
+    'save-c': '\xca',
+    'save-d': '\xcb',
+    'scan': 'm',
+    'select': '\x92',
+    'shift-left': 'x',
+    'shift-right': 'y',
+    'show': 'R',
+    'show-a': '\xdc',
+    'show-b': '\xdd',
+    'show-c': '\xde',
+    'show-comma': 'Z',
+    'show-d': '\xdf',
+    'show-line': 'X',
+    'show-lines': 'T',
+    'show-python': '[',
+    'show-space': 'Y',
+    'show-words': 'U',
+    'sign': '(',
+    'smallest': '8',
+    'sort': '/',
+    'space': '\r',
+    'split': '3',
+    'sqrt': '-',
+    'square': ',',
+    'step': '4',
+    'sub': '1',
+    'sub-power-of-10': '\x7f',
+    'sub-power-of-2': '~',
+    'sum': 'd',
+    'swap': 'B',
+    't1': '\xf8',
+    't2': '\xf9',
+    't3': '\xfa',
+    't4': '\xfb',
+    't5': '\xfc',
+    'tail': '"',
+    'tails': 'y',
+    'take': '<',
+    'take-end': '\x82',
+    'thousand': ')',
+    'times': '2',
+    'transpose': '\x9a',
+    'tuck': 'G',
+    'tuck-a': '\xd8',
+    'tuck-b': '\xd9',
+    'tuck-c': '\xda',
+    'tuck-d': '\xdb',
+    'uniq': '\x90',
+    'unless': '6',
+    'unlines': '+',
+    'unwords': '-',
+    'uppercase-alphabet': '\x84',
+    'when': '5',
+    'word-mode': '1',
+    'words': ',',
+    'wrap-stack': 'K',
+    'xor': '7',
+    'z1': '\xee',
+    'z2': '\xef',
+    'zip': '\xb0',
+    'zipwith': '\xb1',
+    'zipwith1': '\xee',
+    'zipwith2': '\xef',
+    '{': '\x08',
+    '|': '6',
+    '}': '\t',
+}